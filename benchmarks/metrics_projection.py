@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark for building the metrics dictionaries of SourceMeter csv rows.
+
+It generates a synthetic Method csv file and compares the rows per second of
+    - deepcopy: csv.DictReader + sanitize_metrics_dictionary(copy.deepcopy(row)) (previous implementation)
+    - projection: rows of read_projected_rows + metrics() from the projection of the header
+
+Usage: python benchmarks/metrics_projection.py [--rows 1000000] [--csv path]
+"""
+import argparse
+import copy
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from mecoshark.resultparser.projection import read_projected_rows
+from mecoshark.resultparser.sourcemeterparser import SourcemeterParser
+
+METHOD_HEADER = ['ID', 'Name', 'LongName', 'Parent', 'Component', 'Path', 'Line', 'Column', 'EndLine', 'EndColumn',
+                 'HCPL', 'HDIF', 'HEFF', 'HNDB', 'HPL', 'HPV', 'HTRP', 'HVOL', 'MIMS', 'MI', 'MISEI', 'MISM', 'McCC',
+                 'NL', 'NLE', 'NII', 'NOI', 'CD', 'CLOC', 'DLOC', 'TCD', 'TCLOC', 'LLOC', 'LOC', 'NOS', 'NUMPAR',
+                 'TLLOC', 'TLOC', 'TNOS', 'WarningBlocker', 'WarningCritical', 'WarningInfo', 'WarningMajor',
+                 'WarningMinor']
+
+
+def write_method_csv(path, rows):
+    rnd = random.Random(0)
+    metric_count = METHOD_HEADER.index('WarningBlocker') - METHOD_HEADER.index('HCPL')
+
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(METHOD_HEADER)
+        for i in range(rows):
+            metrics = ['%0.6g' % (rnd.random() * 100) if j % 3 else str(rnd.randint(0, 50))
+                       for j in range(metric_count)]
+            writer.writerow(['L%d' % (1000 + i), 'm%d' % i, 'org.example.Cls.m%d()V' % i, 'L100', 'L2',
+                             '/tmp/project/src/org/example/Cls.java', str(i), '5', str(i + 10), '6'] +
+                            metrics + ['0', '0', str(i % 3), '0', '1'])
+
+
+def deepcopy_path(path):
+    with open(path) as csvfile:
+        for row in csv.DictReader(csvfile):
+            SourcemeterParser.sanitize_metrics_dictionary(copy.deepcopy(row))
+
+
+def projection_path(path):
+    for row in read_projected_rows(path):
+        row.metrics()
+
+
+def measure(name, function, path, rows):
+    start = time.perf_counter()
+    function(path)
+    duration = time.perf_counter() - start
+    print('%-12s %8.2f s %12.0f rows/s' % (name, duration, rows / duration))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark for building the metrics of SourceMeter csv rows.')
+    parser.add_argument('--rows', help='Number of rows of the synthetic Method csv file.', type=int, default=1000000)
+    parser.add_argument('--csv', help='Path of the synthetic Method csv file. It is created if it does not exist.',
+                        default=None)
+    args = parser.parse_args()
+
+    path = args.csv
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), 'mecoshark-benchmark-%d-Method.csv' % args.rows)
+
+    if not os.path.exists(path):
+        print('Writing %d rows to %s' % (args.rows, path))
+        write_method_csv(path, args.rows)
+
+    measure('deepcopy', deepcopy_path, path, args.rows)
+    measure('projection', projection_path, path, args.rows)
+
+
+if __name__ == '__main__':
+    main()
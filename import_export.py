@@ -0,0 +1,51 @@
+import logging
+import os
+import sys
+
+from mongoengine import connect
+from mongoengine.connection import get_db
+from pycoshark.utils import create_mongodb_uri_string, get_base_argparser
+
+from main import setup_logging
+from mecoshark.resultparser.export import MANIFEST_FILE, import_export
+
+
+def start():
+    """
+    Loads the exports of revisions (see :class:`~mecoshark.resultparser.export.Export`) into the database.
+    The export directory can either be the export of one revision or contain the exports of several revisions.
+    """
+    setup_logging()
+    logger = logging.getLogger("mecoshark_main")
+
+    parser = get_base_argparser('Loads the states that were exported by mecoSHARK into the database.', '1.0.0')
+    parser.add_argument('--export-dir', help='Directory of the export.', required=True)
+    parser.add_argument('--batch-size', help='Number of documents that are written in one bulk write.', type=int,
+                        default=10000)
+
+    try:
+        args = parser.parse_args()
+    except Exception as e:
+        logger.error(e)
+        sys.exit(1)
+
+    if os.path.exists(os.path.join(args.export_dir, MANIFEST_FILE)):
+        paths = [args.export_dir]
+    else:
+        paths = sorted(os.path.join(args.export_dir, name) for name in os.listdir(args.export_dir)
+                       if os.path.exists(os.path.join(args.export_dir, name, MANIFEST_FILE)))
+
+    if not paths:
+        logger.error("No complete export found in %s" % args.export_dir)
+        sys.exit(1)
+
+    uri = create_mongodb_uri_string(args.db_user, args.db_password, args.db_hostname, args.db_port,
+                                    args.db_authentication, args.ssl)
+    connect(args.db_database, host=uri)
+
+    for path in paths:
+        import_export(get_db(), path, args.batch_size)
+
+
+if __name__ == "__main__":
+    start()
@@ -4,7 +4,10 @@ import logging.config
 import os
 import sys
 
+from mecoshark.checkout import CheckoutManager
 from mecoshark.mecosharkapp import MecoSHARK
+from mecoshark.resultcache import ResultCache
+from mecoshark.scheduler import RevisionScheduler
 from pycoshark.utils import get_base_argparser
 
 
@@ -71,11 +74,102 @@ def start():
     parser.add_argument('-o', '--output', help='Directory, which can be used as output.',
                         required=True, type=writable_dir)
     parser.add_argument('-pn', '--project_name', help='Name of the Project.')
-    parser.add_argument('-r', '--revision', help='Hash of the revision.', required=True)
+    revision_group = parser.add_mutually_exclusive_group(required=True)
+    revision_group.add_argument('-r', '--revision', help='Hash of the revision.')
+    revision_group.add_argument('--revisions', help='Process several revisions in one process (batch mode): comma '
+                                                    'separated list of revision hashes or a revision range (e.g., '
+                                                    'a..b). The revisions are checked out in the input path.')
+    parser.add_argument('--workers', help='Number of revisions of --revisions that are processed at the same time. '
+                                          'Every worker process has its own clone and output directory in the '
+                                          'output directory (0: process the revisions one after another in this '
+                                          'process).', type=int, default=0)
+    parser.add_argument('--max-analyzers', help='Maximal number of workers that execute SourceMeter at the same time '
+                                                '(default: number of workers).', type=int, default=None)
+    parser.add_argument('--max-writers', help='Maximal number of workers that write to the database at the same time '
+                                              '(default: number of workers).', type=int, default=None)
+    parser.add_argument('--status-file', help='File to which the status and the timings of every revision of '
+                                              '--revisions are appended as json lines (with --workers).',
+                        default=None)
+    parser.add_argument('--checkout', help='Materialize the revisions in the scratch directory instead of analyzing '
+                                           'the input path: worktree (git worktree add, reused between revisions) '
+                                           'or archive (extracted git archive, nothing is written to the '
+                                           'repository). The git metadata is not part of the analyzed tree.',
+                        choices=['worktree', 'archive'], default=None)
+    parser.add_argument('--scratch-dir', help='Directory in which the revisions are materialized with --checkout '
+                                              '(e.g., in /dev/shm, default: the directory checkouts next to the '
+                                              'output directory). It must not be inside the output directory, as the '
+                                              'processors clean it up.', default=None)
+    parser.add_argument('--sparse', help='Only materialize the source files of the languages of the processors '
+                                         'that are executed (with --checkout). The languages are detected from the '
+                                         'extensions of the files of the revision.', action='store_true')
+    parser.add_argument('--threads', help='Number of threads of SourceMeter (default: the CPUs that are available to '
+                                          'this process, considering its affinity and cgroup quota, divided by the '
+                                          'number of concurrent analyzers).', type=int, default=None)
+    parser.add_argument('--concurrent-analyzers', help='Number of analyzers that run at the same time on this host, '
+                                                       'among which the CPUs are divided (default: 1, or '
+                                                       '--max-analyzers with --workers).', type=int, default=None)
+    parser.add_argument('--result-cache', help='Directory in which the results of SourceMeter are cached by the tree '
+                                               'of the revision, the analyzer and its templates. SourceMeter is not '
+                                               'executed for a revision with the same tree as a cached one.',
+                        default=None)
+    parser.add_argument('--incremental-modules', help='Analyze the top-level modules of a multi-module Java project '
+                                                      'on their own and merge their results. Only the modules whose '
+                                                      'tree is not in the result cache (usually the modules that '
+                                                      'changed since the parent revision) are analyzed (with '
+                                                      '--result-cache). The sizes and counts (e.g., TLOC) of packages '
+                                                      'that are split over modules and of the system are summed over '
+                                                      'the modules. '
+                                                      'Coupling metrics and clones across modules differ from an '
+                                                      'analysis of the whole project.', action='store_true')
     parser.add_argument('-u', '--repository_url', help='URL of the project (e.g., GIT Url).', required=True)
     parser.add_argument('--debug', help='Specifies the debug level', choices=['INFO', 'DEBUG', 'WARNING', 'ERROR'],
                         default='DEBUG')
     parser.add_argument('--makefile-contents', help='Makefile contents', default=None)
+    parser.add_argument('--batch-size', help='Number of code entity states that are written to the database in one '
+                                             'bulk write.', type=int, default=1000)
+    parser.add_argument('--no-resolve-ids', help='Write the states one after another and wait for the ids of their '
+                                                 'parents instead of resolving all ids before writing.',
+                        dest='resolve_ids', action='store_false')
+    parser.add_argument('--restrict-file-lookup', help='Only query the stored files whose paths are in the input '
+                                                       'path instead of all files of the vcs system.',
+                        action='store_true')
+    parser.add_argument('--file-batch-size', help='Batch size of the cursor that queries the stored files.', type=int,
+                        default=None)
+    parser.add_argument('--no-git-index', help='Traverse the input path to find the input files instead of listing '
+                                               'the files of the revision from git.',
+                        dest='use_git_index', action='store_false')
+    parser.add_argument('--parse-workers', help='Number of processes that parse the SourceMeter csv files '
+                                                'concurrently (0: parse them one after another). Ignored with '
+                                                '--workers, as the workers can not start processes.', type=int,
+                        default=0)
+    parser.add_argument('--ingest-mode', help='full: write all states of the revision. delta: only write the states '
+                                              'that changed compared to the parent revision and record from which '
+                                              'revision the unchanged ones are inherited. carry-forward: copy the '
+                                              'states of the files that did not change since the parent revision on '
+                                              'the server (needs MongoDB 4.4) and only write the states of the '
+                                              'changed files. The copied states keep the values of the parent '
+                                              'revision, also for the metrics that depend on other files (e.g., '
+                                              'coupling or incoming invocations), as they are not recomputed.',
+                        choices=['full', 'delta', 'carry-forward'], default='full')
+    parser.add_argument('--delta-chain-limit', help='Maximal number of revisions whose written states make up the '
+                                                    'states of a revision in delta mode.', type=int, default=50)
+    parser.add_argument('--pipeline-depth', help='Read the SourceMeter csv files in a separate thread that queues at '
+                                                 'most this many batches for the database writer (0: read and write '
+                                                 'one after another).', type=int, default=0)
+    parser.add_argument('--journal', help='Keep the results of SourceMeter and record the written batches in a '
+                                          'journal in the output directory, so that a restarted run for the same '
+                                          'revision skips the analysis and the batches that were written.',
+                        action='store_true')
+    parser.add_argument('--export-dir', help='Export the states and clone instances to compressed files in this '
+                                             'directory instead of writing them to the database (load them with '
+                                             'import_export.py).', default=None)
+    parser.add_argument('--export-format', help='Format of the exported files: json (mongoimport) or bson '
+                                                '(mongorestore).', choices=['json', 'bson'], default='json')
+    parser.add_argument('--metrics-dir', help='Additionally write the metrics of the code entity states to one table '
+                                              'per type of the states in this directory (needs pyarrow).',
+                        default=None)
+    parser.add_argument('--metrics-format', help='Format of the metric tables: parquet or arrow (Arrow IPC file).',
+                        choices=['parquet', 'arrow'], default='parquet')
 
     try:
         args = parser.parse_args()
@@ -83,13 +177,75 @@ def start():
         logger.error(e)
         sys.exit(1)
 
+    if args.sparse and args.checkout is None and not (args.revisions and args.workers > 0):
+        logger.error("--sparse needs the revisions to be materialized with --checkout")
+        sys.exit(1)
+
+    if args.incremental_modules and args.result_cache is None:
+        logger.error("--incremental-modules needs the results of the modules to be cached with --result-cache")
+        sys.exit(1)
+
     logger.debug("Got the following parameters. Input: %s, Output: %s, Project name: %s, Revision: %s, URL: %s, Makefile-contents: %s" %
                  (args.input, args.output, args.project_name, args.revision, args.repository_url, args.makefile_contents))
 
+    parser_options = {
+        'batch_size': args.batch_size,
+        'resolve_ids': args.resolve_ids,
+        'ingest_mode': args.ingest_mode,
+        'delta_chain_limit': args.delta_chain_limit,
+        'parse_workers': args.parse_workers,
+        'use_git_index': args.use_git_index,
+        'restrict_file_lookup': args.restrict_file_lookup,
+        'file_batch_size': args.file_batch_size,
+        'journal': args.journal,
+        'pipeline_depth': args.pipeline_depth,
+        'export_dir': args.export_dir,
+        'export_format': args.export_format,
+        'metrics_dir': args.metrics_dir,
+        'metrics_format': args.metrics_format,
+        'threads': args.threads,
+        'incremental_modules': args.incremental_modules,
+    }
+    if args.result_cache is not None:
+        parser_options['result_cache'] = ResultCache(args.result_cache)
+    if args.concurrent_analyzers is not None:
+        parser_options['concurrent_analyzers'] = args.concurrent_analyzers
+
+    if args.revisions and args.workers > 0:
+        app_arguments = {
+            'project_name': args.project_name, 'revision': None, 'url': args.repository_url,
+            'makefile_contents': args.makefile_contents, 'db_name': args.db_database, 'db_host': args.db_hostname,
+            'db_port': args.db_port, 'db_user': args.db_user, 'db_password': args.db_password,
+            'db_authentication': args.db_authentication, 'debug_level': args.debug, 'ssl_enabled': args.ssl,
+            'parser_options': parser_options, 'sparse': args.sparse,
+        }
+        scheduler = RevisionScheduler(args.input, os.path.join(args.scratch_dir or args.output, 'workers'),
+                                      app_arguments, args.workers, args.max_analyzers, args.max_writers,
+                                      args.status_file, args.checkout or 'worktree')
+        results = scheduler.run(MecoSHARK.list_revisions(args.input, args.revisions))
+        if not any(result['status'] == 'processed' for result in results):
+            sys.exit(1)
+        return
+
+    checkouts = None
+    if args.checkout is not None:
+        checkouts = CheckoutManager(args.input, args.scratch_dir or os.path.join(os.path.dirname(args.output),
+                                                                                 'checkouts'), args.checkout)
+
     mecoshark = MecoSHARK(args.input, args.output, args.project_name, args.revision, args.repository_url, args.makefile_contents, args.db_database,
                           args.db_hostname, args.db_port, args.db_user, args.db_password, args.db_authentication,
-                          args.debug, args.ssl)
-    mecoshark.process_revision()
+                          args.debug, args.ssl, parser_options, checkouts, args.sparse)
+
+    try:
+        if args.revisions:
+            results = mecoshark.process_revisions(MecoSHARK.list_revisions(args.input, args.revisions))
+            if not any(results.values()):
+                sys.exit(1)
+        else:
+            mecoshark.process_revision()
+    finally:
+        if checkouts is not None:
+            checkouts.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,196 @@
+import contextlib
+import logging
+import os
+import shutil
+import subprocess
+import timeit
+
+logger = logging.getLogger('mecoshark_main')
+
+# Ways to materialize a revision: linked worktree of the repository or extracted git archive
+CHECKOUT_MODES = ('worktree', 'archive')
+
+
+class CheckoutManager(object):
+    """
+    Materializes revisions of a repository in a scratch directory (e.g., in /dev/shm) instead of copying the whole
+    repository with its history. A revision is either checked out in a linked worktree of the repository
+    (git worktree add, which only writes the files of the revision and a .git file that points to the repository) or
+    extracted from the tar stream of git archive (no git metadata at all, nothing is written to the repository).
+    The git metadata stays in the repository, i.e., it is not part of the analyzed tree.
+
+    Released checkouts are kept in a pool and reused for the next revision: a worktree is reset to the revision
+    (git checkout -f and git clean), an archive directory is emptied and the revision is extracted into it.
+
+    A revision can be materialized sparsely, i.e., only the files that match the given git pathspecs (e.g., the
+    source files of the analyzed languages, see :func:`~mecoshark.languages.get_pathspecs`) are written.
+
+    :property repository_path: path to the repository
+    :property scratch_dir: directory in which the checkouts are created
+    :property mode: worktree or archive
+    :property checkouts: paths of all checkouts that were created
+    :property idle: paths of the checkouts that can be reused
+    """
+    def __init__(self, repository_path, scratch_dir, mode='worktree'):
+        """
+        Initialization
+
+        :param repository_path: path to the repository
+        :param scratch_dir: directory in which the checkouts are created
+        :param mode: worktree or archive
+        """
+        if mode not in CHECKOUT_MODES:
+            raise ValueError("Unknown checkout mode %s" % mode)
+
+        self.repository_path = os.path.abspath(repository_path)
+        self.scratch_dir = os.path.abspath(scratch_dir)
+        self.mode = mode
+        self.checkouts = []
+        self.idle = []
+        os.makedirs(self.scratch_dir, exist_ok=True)
+
+    def acquire(self, revision, pathspecs=None):
+        """
+        Materializes the revision in an idle checkout or in a new one
+
+        :param revision: revision hash
+        :param pathspecs: git pathspecs of the files that are materialized (None: all files). Every pathspec must\
+        match a file of the revision
+        :return: path to the checkout
+        """
+        start_time = timeit.default_timer()
+        if self.idle:
+            path = self.idle.pop()
+            self.reset(path, revision, pathspecs)
+        else:
+            path = os.path.join(self.scratch_dir, 'checkout-%d-%d' % (os.getpid(), len(self.checkouts)))
+            self.create(path, revision, pathspecs)
+            self.checkouts.append(path)
+
+        logger.info("Materialized revision %s in %s (%s) in %0.5f s" % (revision, path, self.mode,
+                                                                       timeit.default_timer() - start_time))
+        return path
+
+    def release(self, path):
+        """
+        Returns a checkout to the pool, so that it is reused
+
+        :param path: path to the checkout
+        """
+        self.idle.append(path)
+
+    @contextlib.contextmanager
+    def checkout(self, revision, pathspecs=None):
+        """
+        Context manager that materializes the revision and releases the checkout afterwards
+
+        :param revision: revision hash
+        :param pathspecs: git pathspecs of the files that are materialized (None: all files)
+        :return: path to the checkout
+        """
+        path = self.acquire(revision, pathspecs)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def create(self, path, revision, pathspecs=None):
+        """
+        Creates a checkout of the revision
+
+        :param path: path to the checkout
+        :param revision: revision hash
+        :param pathspecs: git pathspecs of the files that are materialized (None: all files)
+        """
+        shutil.rmtree(path, True)
+        if self.mode == 'worktree':
+            if pathspecs is None:
+                self.git('worktree', 'add', '--detach', '--force', '--quiet', path, revision)
+            else:
+                self.git('worktree', 'add', '--detach', '--force', '--quiet', '--no-checkout', path, revision)
+                self.checkout_sparse(path, revision, pathspecs)
+        else:
+            os.makedirs(path)
+            self.extract(path, revision, pathspecs)
+
+    def reset(self, path, revision, pathspecs=None):
+        """
+        Materializes another revision in an existing checkout. Files that are not part of the revision (e.g.,\
+        files that were created by the analysis) are removed.
+
+        :param path: path to the checkout
+        :param revision: revision hash
+        :param pathspecs: git pathspecs of the files that are materialized (None: all files)
+        """
+        if self.mode == 'worktree':
+            if pathspecs is None:
+                subprocess.check_call(['git', '-C', path, 'checkout', '-f', '--detach', '--quiet', revision])
+                subprocess.check_call(['git', '-C', path, 'clean', '-ffdxq'])
+            else:
+                self.checkout_sparse(path, revision, pathspecs)
+        else:
+            for name in os.listdir(path):
+                entry = os.path.join(path, name)
+                if os.path.isdir(entry) and not os.path.islink(entry):
+                    shutil.rmtree(entry)
+                else:
+                    os.remove(entry)
+            self.extract(path, revision, pathspecs)
+
+    def checkout_sparse(self, path, revision, pathspecs):
+        """
+        Checks out the files of the revision that match the pathspecs in a worktree. All other files are removed:\
+        the index is emptied, so that git clean removes all files, and only the matching files are checked out.
+
+        :param path: path to the worktree
+        :param revision: revision hash
+        :param pathspecs: git pathspecs of the files that are materialized
+        """
+        subprocess.check_call(['git', '-C', path, 'read-tree', '--empty'])
+        subprocess.check_call(['git', '-C', path, 'clean', '-ffdxq'])
+        subprocess.check_call(['git', '-C', path, 'update-ref', '--no-deref', 'HEAD', revision])
+        if pathspecs:
+            subprocess.check_call(['git', '-C', path, 'checkout', '--quiet', revision, '--'] + list(pathspecs))
+
+    def extract(self, path, revision, pathspecs=None):
+        """
+        Extracts the files of the revision into the (empty) directory by streaming the output of git archive into tar
+
+        :param path: path to the directory
+        :param revision: revision hash
+        :param pathspecs: git pathspecs of the files that are extracted (None: all files)
+        """
+        if pathspecs is not None and not pathspecs:
+            return
+
+        command = ['git', '-C', self.repository_path, 'archive', '--format=tar', revision]
+        if pathspecs is not None:
+            command += ['--'] + list(pathspecs)
+        archive = subprocess.Popen(command, stdout=subprocess.PIPE)
+        try:
+            subprocess.check_call(['tar', '-x', '-C', path], stdin=archive.stdout)
+        finally:
+            archive.stdout.close()
+            if archive.wait() != 0:
+                raise subprocess.CalledProcessError(archive.returncode, 'git archive %s' % revision)
+
+    def git(self, *arguments):
+        """
+        Executes a git command in the repository
+
+        :param arguments: arguments of the git command
+        """
+        subprocess.check_call(['git', '-C', self.repository_path] + list(arguments))
+
+    def close(self):
+        """
+        Deletes all checkouts (and the worktrees from the repository)
+        """
+        for path in self.checkouts:
+            shutil.rmtree(path, True)
+
+        if self.mode == 'worktree' and self.checkouts:
+            self.git('worktree', 'prune')
+
+        self.checkouts = []
+        self.idle = []
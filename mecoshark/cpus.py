@@ -0,0 +1,111 @@
+import logging
+import math
+import os
+
+logger = logging.getLogger('processor')
+
+# Mount point of the cgroup file system
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+
+def get_available_cpus():
+    """
+    Gets the number of CPUs on which this process may run (its CPU affinity, e.g., set by taskset or a cpuset)
+
+    :return: number of CPUs
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def read_cgroup_paths(proc_cgroup='/proc/self/cgroup'):
+    """
+    Reads the cgroups of this process
+
+    :param proc_cgroup: path to the cgroup file of the process
+    :return: dictionary with the controller as key (empty string for cgroup v2) and the path of the cgroup as value
+    """
+    paths = {}
+    try:
+        with open(proc_cgroup) as cgroup_file:
+            for line in cgroup_file:
+                parts = line.strip().split(':', 2)
+                if len(parts) == 3:
+                    for controller in parts[1].split(','):
+                        paths[controller] = parts[2]
+    except OSError:
+        pass
+    return paths
+
+
+def read_file(path):
+    """
+    Reads the content of a (cgroup) file
+
+    :param path: path to the file
+    :return: stripped content or None, if the file can not be read
+    """
+    try:
+        with open(path) as cgroup_file:
+            return cgroup_file.read().strip()
+    except OSError:
+        return None
+
+
+def get_cgroup_cpu_limit(root=CGROUP_ROOT, proc_cgroup='/proc/self/cgroup'):
+    """
+    Gets the CPU quota of the cgroup of this process (e.g., set by docker --cpus), for cgroup v2 from cpu.max and for
+    cgroup v1 from cpu.cfs_quota_us and cpu.cfs_period_us. The cgroup of the process is tried first, then the root
+    of the mount point (in a container, the cgroup of the container is usually mounted there).
+
+    :param root: mount point of the cgroup file system
+    :param proc_cgroup: path to the cgroup file of the process
+    :return: number of CPUs the quota allows (e.g., 1.5) or None, if there is no quota
+    """
+    cgroups = read_cgroup_paths(proc_cgroup)
+
+    # cgroup v2
+    for path in [cgroups.get('', None), '/']:
+        if path is None:
+            continue
+        cpu_max = read_file(os.path.join(root, path.lstrip('/'), 'cpu.max'))
+        if cpu_max is not None:
+            quota, period = (cpu_max.split() + ['100000'])[:2]
+            if quota == 'max':
+                return None
+            return int(quota) / int(period)
+
+    # cgroup v1
+    for directory in ['cpu', 'cpu,cpuacct', 'cpuacct,cpu']:
+        for path in [cgroups.get('cpu', None), '/']:
+            if path is None:
+                continue
+            cgroup_path = os.path.join(root, directory, path.lstrip('/'))
+            quota = read_file(os.path.join(cgroup_path, 'cpu.cfs_quota_us'))
+            period = read_file(os.path.join(cgroup_path, 'cpu.cfs_period_us'))
+            if quota is not None and period is not None:
+                if int(quota) <= 0:
+                    return None
+                return int(quota) / int(period)
+    return None
+
+
+def get_thread_count(concurrent_analyzers=1):
+    """
+    Gets the number of threads an analyzer should use: the CPUs that are available to this process (affinity and
+    cgroup quota, rounded up) are divided among the analyzers that run at the same time on this host.
+
+    :param concurrent_analyzers: number of analyzers that run at the same time (e.g., the workers of the\
+    :class:`~mecoshark.scheduler.RevisionScheduler`)
+    :return: number of threads (at least 1)
+    """
+    cpus = get_available_cpus()
+    quota = get_cgroup_cpu_limit()
+    if quota is not None:
+        cpus = min(cpus, int(math.ceil(quota)))
+
+    threads = max(1, cpus // max(concurrent_analyzers, 1))
+    logger.debug("Using %d threads (%d CPUs, cgroup quota: %s, %d concurrent analyzers)" % (
+        threads, cpus, quota, concurrent_analyzers))
+    return threads
@@ -0,0 +1,100 @@
+import os
+
+# Extensions of source files with their language, like sloccount assigns them (file_extensions in break_filelist).
+# Header files are assigned to the language h, which is resolved to a C language by detect_languages
+FILE_EXTENSIONS = {
+    'c': 'ansic', 'ec': 'ansic', 'ecp': 'ansic', 'pgc': 'ansic',
+    'C': 'cpp', 'cpp': 'cpp', 'cxx': 'cpp', 'cc': 'cpp', 'pcc': 'cpp',
+    'm': 'objc',
+    'cs': 'cs',
+    'h': 'h', 'H': 'h', 'hpp': 'h', 'hh': 'h',
+    'ada': 'ada', 'adb': 'ada', 'ads': 'ada', 'pad': 'ada',
+    'f': 'fortran', 'F': 'fortran', 'f77': 'fortran', 'F77': 'fortran',
+    'f90': 'f90', 'F90': 'f90',
+    'cob': 'cobol', 'cbl': 'cobol', 'COB': 'cobol', 'CBL': 'cobol',
+    'p': 'pascal', 'pas': 'pascal', 'pp': 'pascal', 'dpr': 'pascal',
+    'py': 'python',
+    's': 'asm', 'S': 'asm', 'asm': 'asm',
+    'sh': 'sh', 'bash': 'sh',
+    'csh': 'csh', 'tcsh': 'csh',
+    'java': 'java',
+    'lisp': 'lisp', 'el': 'lisp', 'scm': 'lisp', 'sc': 'lisp', 'lsp': 'lisp', 'cl': 'lisp', 'jl': 'lisp',
+    'tcl': 'tcl', 'tk': 'tcl', 'itk': 'tcl',
+    'exp': 'exp',
+    'pl': 'perl', 'pm': 'perl', 'perl': 'perl', 'ph': 'perl',
+    'awk': 'awk',
+    'sed': 'sed',
+    'y': 'yacc',
+    'l': 'lex',
+    'sql': 'sql',
+    'php': 'php', 'php3': 'php', 'php4': 'php', 'php5': 'php', 'php6': 'php',
+    'inc': 'inc',
+    'm3': 'modula3', 'i3': 'modula3', 'mg': 'modula3', 'ig': 'modula3',
+    'ml': 'ml', 'mli': 'ml', 'mly': 'ml', 'mll': 'ml',
+    'rb': 'ruby',
+    'hs': 'haskell', 'lhs': 'haskell',
+    'jsp': 'jsp',
+}
+
+# Languages whose source files include header files
+HEADER_LANGUAGES = ('ansic', 'cpp', 'objc')
+
+
+def get_extension(path):
+    """
+    Gets the extension of a file
+
+    :param path: path to the file
+    :return: extension without the dot or None, if the file has no extension
+    """
+    name = os.path.basename(path)
+    if '.' not in name.lstrip('.'):
+        return None
+    return name.rsplit('.', 1)[1]
+
+
+def detect_languages(paths):
+    """
+    Detects the programming languages of the given files by their extensions with the rules of sloccount (see\
+    :func:`~mecoshark.mecosharkapp.MecoSHARK.detect_languages`), e.g., for the files of a revision that is not
+    checked out. Header files are counted for C++, if there are C++ files, otherwise for C.
+
+    :param paths: paths of the files
+    :return: dictionary with the language as key and its part of all source files as value
+    """
+    counts = {}
+    headers = 0
+    for path in paths:
+        language = FILE_EXTENSIONS.get(get_extension(path), None)
+        if language == 'h':
+            headers += 1
+        elif language is not None:
+            counts[language] = counts.get(language, 0) + 1
+
+    if headers:
+        language = 'cpp' if 'cpp' in counts else 'ansic'
+        counts[language] = counts.get(language, 0) + headers
+
+    all_files = sum(counts.values())
+    if not all_files:
+        return {}
+    return {language: count / all_files for language, count in counts.items()}
+
+
+def get_pathspecs(languages, paths):
+    """
+    Creates the git pathspecs that match the source files of the given languages (including the header files of C
+    languages). Only extensions that occur in the given paths are used, as git fails for a pathspec that does not
+    match any file.
+
+    :param languages: languages (e.g., the supported languages of the processors)
+    :param paths: paths of the files of the revision
+    :return: sorted list of pathspecs (e.g., :(glob)**/*.java)
+    """
+    languages = set(languages)
+    if languages.intersection(HEADER_LANGUAGES):
+        languages.add('h')
+
+    extensions = {get_extension(path) for path in paths}
+    return sorted(':(glob)**/*.' + extension for extension, language in FILE_EXTENSIONS.items()
+                  if language in languages and extension in extensions)
@@ -1,3 +1,4 @@
+import contextlib
 import logging
 import subprocess
 import shutil
@@ -5,8 +6,11 @@ import sys
 import os
 import timeit
 
-from mongoengine import connect
+from mongoengine import connect, DoesNotExist
 
+from mecoshark.languages import detect_languages, get_pathspecs
+from mecoshark.resultparser.inputfiles import list_git_files
+from mecoshark.resultparser.repository import RepositoryContext
 from mecoshark.utils import find_correct_processor
 from pycoshark.utils import create_mongodb_uri_string
 
@@ -19,7 +23,8 @@ class MecoSHARK(object):
     """
 
     def __init__(self, input_path, output, project_name, revision, url, makefile_contents, db_name, db_host, db_port, db_user, db_password,
-                 db_authentication, debug_level, ssl_enabled):
+                 db_authentication, debug_level, ssl_enabled, parser_options=None, checkouts=None,
+                 sparse=False):
         """
         Main runner of the mecoshark app
 
@@ -36,6 +41,14 @@ class MecoSHARK(object):
         :param db_password: password for the mongodb user
         :param db_authentication: name of the database that is used as authentication
         :param debug_level: debug level like defined in :mod:`logging`
+        :param ssl_enabled: needs to be set if the database uses a ssl connection
+        :param parser_options: dictionary of keyword arguments that are passed to\
+        :class:`~mecoshark.resultparser.sourcemeterparser.SourcemeterParser` (e.g., export_dir, so that\
+        :func:`process_revision` exports the states to files instead of writing them to the database)
+        :param checkouts: :class:`~mecoshark.checkout.CheckoutManager` of the repository at the input path. If it is\
+        given, the revisions are materialized in its scratch directory and analyzed there instead of in the input path
+        :param sparse: if True, only the source files of the languages of the processors that are executed are\
+        materialized (see :func:`materialized`). Needs a checkout manager
 
         .. WARNING:: URL must be the same as the url that was stored in the mongodb by vcsSHARK!
         """
@@ -48,6 +61,12 @@ class MecoSHARK(object):
         self.makefile_contents = makefile_contents
         self.revision = revision
         self.url = url
+        self.parser_options = parser_options or {}
+        self.repository_path = self.input_path
+        self.checkouts = checkouts
+        self.sparse = sparse
+        if checkouts is not None:
+            self.parser_options['repository_path'] = self.repository_path
 
         uri = create_mongodb_uri_string(db_user, db_password, db_host, db_port, db_authentication, ssl_enabled)
         # connect to mongodb
@@ -58,12 +77,29 @@ class MecoSHARK(object):
         Processes a revision. First the language is detected, that the system uses, after that
         the correct processors are found, which can be used for this language and the process method is called.
         """
-        languages = self.detect_languages()
+        with self.materialized(self.revision) as languages:
+            processed = self.run_processors(languages)
+
+        # SmartSHARK needs an error in its std.err, but we say the whole execution failed only if all processors
+        # that were executed are failing
+        if not processed:
+            sys.stderr.write("fatal error. All processors failed!\n")
+            sys.exit(1)
+
+    def run_processors(self, languages=None):
+        """
+        Detects the languages of the revision and executes the processors for them.
+
+        :param languages: languages of the revision (see :func:`detect_languages`), if they were detected before
+        :return: False, if all processors that were executed failed
+        """
+        if languages is None:
+            languages = self.detect_languages()
 
         # Measure execution time
         start_time = timeit.default_timer()
 
-        processors = find_correct_processor(languages, self.output_path, self.input_path)
+        processors = find_correct_processor(languages, self.output_path, self.input_path, self.parser_options)
         non_working_processors = 0
         for processor in processors:
             logger.info("Executing: %s" % processor.__class__.__name__)
@@ -73,15 +109,134 @@ class MecoSHARK(object):
                 logger.error(e)
                 non_working_processors += 1
 
-            # SmartSHARK needs an error in its std.err, but we say the whole execution failed only if all processors
-            # that were executed are failing
-            if len(processors) == non_working_processors:
-                sys.stderr.write("fatal error. All processors failed!\n")
-                sys.exit(1)
-
         elapsed = timeit.default_timer() - start_time
         logger.info("Execution time: %0.5f s" % elapsed)
 
+        return not processors or len(processors) != non_working_processors
+
+    def process_revisions(self, revisions):
+        """
+        Processes several revisions of the repository one after another in this process (batch mode). The revisions
+        are checked out in the input path. The connection, the imported processors and a
+        :class:`~mecoshark.resultparser.repository.RepositoryContext` (vcs system, commit ids of all revisions and the
+        stored files, which are looked up incrementally) are shared by all revisions.
+        A revision that fails does not stop the batch.
+
+        :param revisions: list of revision hashes (in the order in which they are processed)
+        :return: dictionary with the revision hash as key and True (processed) or False (failed) as value
+        """
+        self.open_context(revisions)
+
+        results = {}
+        for revision in revisions:
+            logger.info("Processing revision %s (%d of %d)" % (revision, len(results) + 1, len(revisions)))
+            results[revision] = self.run_revision(revision)
+
+        logger.info("Processed %d of %d revisions" % (sum(results.values()), len(revisions)))
+        return results
+
+    def open_context(self, revisions=()):
+        """
+        Creates the :class:`~mecoshark.resultparser.repository.RepositoryContext` that is shared by the parsers of\
+        all revisions that are processed by this instance and resolves the commits of the given revisions.
+
+        :param revisions: list of revision hashes that are processed
+        """
+        try:
+            context = RepositoryContext(self.project_name, self.url)
+        except DoesNotExist:
+            logger.error("VCSSystem with the url %s does not exist in the database! Execute vcsSHARK first!" % self.url)
+            sys.exit(1)
+        context.resolve_commits(revisions)
+        self.parser_options['context'] = context
+
+    def run_revision(self, revision):
+        """
+        Checks out a revision in the input path (or materializes it, see :func:`materialized`) and executes the\
+        processors for it. A failure (any error of the checkout, the processors or the parser) is written to stderr,\
+        but does not stop the process.
+
+        :param revision: revision hash
+        :return: True, if the revision was processed
+        """
+        self.revision = revision
+        try:
+            if self.checkouts is None:
+                self.checkout(revision)
+            with self.materialized(revision) as languages:
+                processed = self.run_processors(languages)
+        except (Exception, SystemExit) as e:
+            logger.error("Processing revision %s failed: %s" % (revision, e))
+            processed = False
+
+        if not processed:
+            sys.stderr.write("error. Processing revision %s failed!\n" % revision)
+        return processed
+
+    @contextlib.contextmanager
+    def materialized(self, revision):
+        """
+        Context manager that materializes the revision with the checkout manager and sets the input path to the\
+        checkout while it is active. Without a checkout manager, the revision must be checked out in the input path.
+
+        If sparse is set, the languages are detected from the extensions of the files of the revision in git (see\
+        :func:`~mecoshark.languages.detect_languages`), as the materialized files do not represent the revision\
+        anymore. Only the source files of the languages of the processors that are executed for them are\
+        materialized. This does not work for processors that need other files (e.g., build files).
+
+        :param revision: revision hash
+        :return: languages of the revision (None, if they were not detected)
+        """
+        if self.checkouts is None:
+            yield None
+            return
+
+        languages = None
+        pathspecs = None
+        if self.sparse:
+            files = list_git_files(self.repository_path, revision)
+            if files is None:
+                raise subprocess.CalledProcessError(1, 'git ls-tree %s' % revision)
+
+            languages = detect_languages(files)
+            logger.info("Found the following languages: " + ','.join(languages))
+            processors = find_correct_processor(languages, self.output_path, self.repository_path,
+                                                self.parser_options)
+            pathspecs = get_pathspecs({language for processor in processors
+                                       for language in processor.supported_languages}, files)
+            logger.debug("Materializing the files that match %s" % ', '.join(pathspecs))
+
+        with self.checkouts.checkout(revision, pathspecs) as path:
+            self.input_path = path
+            try:
+                yield languages
+            finally:
+                self.input_path = self.repository_path
+
+    def checkout(self, revision):
+        """
+        Checks out the revision in the input path
+
+        :param revision: revision hash
+        """
+        subprocess.check_call(['git', '-C', self.input_path, 'checkout', '-f', '--quiet', revision])
+
+    @staticmethod
+    def list_revisions(input_path, revisions):
+        """
+        Lists the revisions of a comma separated list of revision hashes or of a revision range (e.g., a..b, all\
+        revisions that are reachable from b, but not from a, oldest first).
+
+        :param input_path: path to the repository
+        :param revisions: comma separated list of revisions or revision range
+        :return: list of revision hashes
+        """
+        if '..' in revisions:
+            output = subprocess.check_output(['git', '-C', input_path, 'rev-list', '--reverse', revisions])
+            return output.decode('ascii').split()
+
+        return [revision.strip() for revision in revisions.split(',') if revision.strip()]
+
     def detect_languages(self):
         """
         Detects programming languages used in the input path
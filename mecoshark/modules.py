@@ -0,0 +1,256 @@
+import csv
+import glob
+import logging
+import os
+
+from mecoshark.languages import get_extension
+
+logger = logging.getLogger('processor')
+
+# Build files that mark a top-level directory as a module of a multi-module project
+BUILD_FILES = ('pom.xml', 'build.gradle', 'build.gradle.kts', 'build.xml')
+
+# Types of the result files whose rows can occur in the results of several modules (e.g., a package that is split
+# over modules or the <System> component). They are merged by their LongName
+SHARED_TYPES = ('Component', 'Package')
+
+# Value of the Parent column of the rows that do not have a parent
+LOGICAL_ROOT = '__LogicalRoot__'
+
+# Metrics of the rows of the shared types that are sums over their content (sizes and counts, e.g., TLOC, TNCL and
+# TNM) and therefore summed over the modules. The other metrics (e.g., the ratios AD and TCD) are the ones of the
+# first module
+ADDITIVE_METRICS = ('CLOC', 'LLOC', 'LOC', 'TCLOC', 'TLLOC', 'TLOC', 'CI', 'CCL', 'LDC', 'LLDC', 'NA', 'NCL', 'NEN',
+                    'NG', 'NIN', 'NM', 'NPA', 'NPKG', 'NPM', 'NS', 'TNA', 'TNCL', 'TNDI', 'TNEN', 'TNFI', 'TNG', 'TNIN',
+                    'TNM', 'TNOS', 'TNPA', 'TNPCL', 'TNPEN', 'TNPIN', 'TNPKG', 'TNPM', 'TNS', 'WarningBlocker',
+                    'WarningCritical', 'WarningInfo', 'WarningMajor', 'WarningMinor')
+
+
+def find_modules(paths, extension='java'):
+    """
+    Finds the top-level modules of a multi-module project: top-level directories with a build file (see\
+    :data:`BUILD_FILES`) that contain source files. The modules can only be analyzed on their own, if all source
+    files are in a module.
+
+    :param paths: paths of the files of the revision (e.g., listed by\
+    :func:`~mecoshark.resultparser.inputfiles.list_git_files`)
+    :param extension: extension of the source files
+    :return: sorted list of the names of the modules or None, if there are no modules or a source file is not in a\
+    module
+    """
+    build_directories = set()
+    source_parts = []
+    for path in paths:
+        parts = path.strip('/').split('/')
+        if len(parts) == 2 and parts[1] in BUILD_FILES:
+            build_directories.add(parts[0])
+        if get_extension(path) == extension:
+            source_parts.append(parts)
+
+    modules = set()
+    for parts in source_parts:
+        if len(parts) < 2 or parts[0] not in build_directories:
+            return None
+        modules.add(parts[0])
+    return sorted(modules) or None
+
+
+def map_changed_files(changed_files, modules):
+    """
+    Maps the changed files of a revision to the modules that contain them
+
+    :param changed_files: paths of the changed files (e.g., listed by\
+    :func:`~mecoshark.resultparser.inputfiles.list_changed_files`)
+    :param modules: names of the modules
+    :return: set of the names of the changed modules
+    """
+    modules = set(modules)
+    changed_modules = set()
+    for path in changed_files:
+        module = path.strip('/').split('/')[0]
+        if module in modules:
+            changed_modules.add(module)
+    return changed_modules
+
+
+def find_result_files(results_path):
+    """
+    Finds the csv files of the results of SourceMeter (<projectname>-<type>.csv)
+
+    :param results_path: directory with the results
+    :return: dictionary with the type (e.g., Class) as key and the path as value
+    """
+    result_files = {}
+    for path in glob.glob(os.path.join(results_path, '*-*.csv')):
+        result_files[os.path.basename(path)[:-len('.csv')].rsplit('-', 1)[1]] = path
+    return result_files
+
+
+def replace_prefix(value, old_prefix, new_prefix):
+    """
+    Replaces the prefix of a value, if it starts with it
+
+    :param value: value (e.g., a path)
+    :param old_prefix: prefix that is replaced
+    :param new_prefix: prefix that replaces it
+    :return: value with the new prefix
+    """
+    if value.startswith(old_prefix):
+        return new_prefix + value[len(old_prefix):]
+    return value
+
+
+def add_values(value, other):
+    """
+    Adds two values of a csv file. Empty values are ignored.
+
+    :param value: value (string)
+    :param other: value that is added (string)
+    :return: sum as string (an integer, if both values are integers)
+    """
+    if not other:
+        return value
+    if not value:
+        return other
+
+    try:
+        return str(int(value) + int(other))
+    except ValueError:
+        return repr(float(value) + float(other))
+
+
+class ModuleResultMerger(object):
+    """
+    Merges the results of SourceMeter for the modules of a revision into the results of one analysis, so that the\
+    :class:`~mecoshark.resultparser.sourcemeterparser.SourcemeterParser` ingests them as usual.
+
+    The IDs of the rows (e.g., L103, F0, C1_0) are only unique in the results of one module. They are prefixed with
+    the index of the module (e.g., M1.L103) and the references to them (Parent and Component) are remapped the same
+    way. Rows of the shared types (see :data:`SHARED_TYPES`) whose LongName was merged from another module before are
+    dropped and their IDs are remapped to the ID of the merged row. Their additive metrics (see\
+    :data:`ADDITIVE_METRICS`) are added to the merged row, e.g., the TLOC of a package that is split over modules or\
+    of the <System> component is the sum over the modules. The rows of the shared types are written when the merger\
+    is closed. The results of every module contain the absolute path that was analyzed, which is replaced by the input\
+    path.
+
+    .. WARNING:: The metrics that depend on other modules (e.g., coupling metrics) and the clones across modules\
+       differ from the ones of an analysis of the whole revision.
+
+    :property merged_path: directory of the merged results
+    :property projectname: name of the project (prefix of the merged files)
+    :property input_path: path to the revision that is used as input
+    :property shared_ids: dictionary with the tuple of the type and the LongName of a merged row of a shared type as\
+    key and its (remapped) ID as value
+    :property writers: dictionary with the type as key and the tuple of the file and its :class:`csv.DictWriter` as\
+    value
+    :property shared_rows: dictionary with the (remapped) ID of a merged row of a shared type as key and the tuple of\
+    its type and the row as value
+    :property modules: number of modules that were merged
+    """
+    def __init__(self, merged_path, projectname, input_path):
+        """
+        Initialization
+
+        :param merged_path: directory of the merged results (is created)
+        :param projectname: name of the project (prefix of the merged files)
+        :param input_path: path to the revision that is used as input
+        """
+        self.merged_path = merged_path
+        self.projectname = projectname
+        self.input_path = input_path.rstrip('/')
+        self.shared_ids = {}
+        self.writers = {}
+        self.shared_rows = {}
+        self.modules = 0
+        os.makedirs(self.merged_path, exist_ok=True)
+
+    def add(self, results_path, analyzed_path):
+        """
+        Merges the results of a module
+
+        :param results_path: directory with the results of the module
+        :param analyzed_path: path of the revision in which the module was analyzed
+        """
+        prefix = 'M%d.' % self.modules
+        old_path = analyzed_path.rstrip('/') + '/'
+        new_path = self.input_path + '/'
+        result_files = find_result_files(results_path)
+
+        # Rows of the shared types that were merged from another module are dropped
+        ids = {}
+        for result_type in SHARED_TYPES:
+            if result_type not in result_files:
+                continue
+
+            with open(result_files[result_type]) as csv_file:
+                for row in csv.DictReader(csv_file):
+                    key = (result_type, replace_prefix(row['LongName'], old_path, new_path))
+                    if key in self.shared_ids:
+                        ids[row['ID']] = self.shared_ids[key]
+                    else:
+                        self.shared_ids[key] = prefix + row['ID']
+
+        def remap(row_id):
+            return ids.get(row_id, prefix + row_id)
+
+        for result_type, path in sorted(result_files.items()):
+            with open(path) as csv_file:
+                reader = csv.DictReader(csv_file)
+                writer = self.get_writer(result_type, reader.fieldnames)
+                for row in reader:
+                    if row['ID'] in ids:
+                        merged_row = self.shared_rows[ids[row['ID']]][1]
+                        for name in ADDITIVE_METRICS:
+                            if name in merged_row:
+                                merged_row[name] = add_values(merged_row[name], row.get(name, None))
+                        continue
+
+                    row = {name: replace_prefix(value or '', old_path, new_path) for name, value in row.items()}
+                    row['ID'] = remap(row['ID'])
+                    if row.get('Parent', '') and row['Parent'] != LOGICAL_ROOT:
+                        row['Parent'] = remap(row['Parent'])
+                    if row.get('Component', ''):
+                        row['Component'] = ','.join(remap(component_id.strip())
+                                                    for component_id in row['Component'].split(','))
+
+                    if result_type in SHARED_TYPES:
+                        self.shared_rows[row['ID']] = (result_type, row)
+                    else:
+                        writer.writerow(row)
+
+        pmd_files = glob.glob(os.path.join(results_path, '*-PMD.txt'))
+        if pmd_files:
+            with open(pmd_files[0]) as pmd_file, \
+                    open(os.path.join(self.merged_path, '%s-PMD.txt' % self.projectname), 'a') as merged_file:
+                for line in pmd_file:
+                    merged_file.write(replace_prefix(line, old_path, new_path))
+
+        self.modules += 1
+
+    def get_writer(self, result_type, fieldnames):
+        """
+        Gets the writer of the merged file of a type. The header is taken from the first module with this type
+
+        :param result_type: type (e.g., Class)
+        :param fieldnames: columns of the file of the module
+        :return: :class:`csv.DictWriter`
+        """
+        if result_type not in self.writers:
+            merged_file = open(os.path.join(self.merged_path, '%s-%s.csv' % (self.projectname, result_type)), 'w',
+                               newline='')
+            writer = csv.DictWriter(merged_file, fieldnames or ['ID'], restval='', extrasaction='ignore')
+            writer.writeheader()
+            self.writers[result_type] = (merged_file, writer)
+        return self.writers[result_type][1]
+
+    def close(self):
+        """
+        Writes the rows of the shared types and closes the merged files
+        """
+        for result_type, row in self.shared_rows.values():
+            self.writers[result_type][1].writerow(row)
+        self.shared_rows = {}
+
+        for merged_file, _ in self.writers.values():
+            merged_file.close()
+        self.writers = {}
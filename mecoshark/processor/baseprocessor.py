@@ -1,17 +1,45 @@
 import abc
+import contextlib
 import os
 import string
 import stat
 
+from mecoshark.cpus import get_thread_count
+from mecoshark.resultparser.journal import IngestJournal
+
+# Directory of SourceMeter (OpenStaticAnalyzer) and the executables of its analyzers
+SOURCEMETER_PATH = os.path.dirname(os.path.realpath(__file__))+'/../../external/openStaticAnalyzer/'
+JAVA_SOURCEMETER = os.path.join(SOURCEMETER_PATH, 'Java/OpenStaticAnalyzerJava')
+PYTHON_SOURCEMETER = os.path.join(SOURCEMETER_PATH, 'Python/OpenStaticAnalyzerPython')
+C_SOURCEMETER = os.path.join(SOURCEMETER_PATH, 'CPP/SourceMeterCPP')
+
+
 class BaseProcessor(metaclass=abc.ABCMeta):
     """ Main app for the mecoshark plugin
 
     :param output_path: path to an output directory, where files can be stored
     :param input_path: path to the revision that is used as input
+    :param parser_options: dictionary of keyword arguments that are passed to the parser
 
     :property input_path: path to the revisionn that is used as input
     :property output_path: path to an output directory, where files can be stored
     :property projectname: name of the project (last part of input path)
+    :property parser_options: dictionary of keyword arguments that are passed to\
+    :class:`~mecoshark.resultparser.sourcemeterparser.SourcemeterParser`
+    :property journal: if the ingest is recorded in a journal (option journal, see\
+    :class:`~mecoshark.resultparser.journal.IngestJournal`)
+    :property limits: dictionary with the name of a resource (analyzer or writer) as key and the\
+    :class:`~mecoshark.scheduler.ResourceLimit` that limits how many processes use it at the same time as value\
+    (option limits, set by the :class:`~mecoshark.scheduler.RevisionScheduler`)
+    :property threads: number of threads of SourceMeter (option threads, None: derived from the available CPUs, see\
+    :func:`~mecoshark.cpus.get_thread_count`)
+    :property concurrent_analyzers: number of analyzers that run at the same time on the host (option\
+    concurrent_analyzers), among which the available CPUs are divided
+    :property result_cache: :class:`~mecoshark.resultcache.ResultCache` in which the results of SourceMeter are\
+    looked up and stored (option result_cache, None: no cache)
+    :property incremental_modules: if the top-level modules of a multi-module project are analyzed on their own and\
+    their results are merged, so that only the modules that changed since a cached revision are analyzed (option\
+    incremental_modules, only supported by the Java processor, see :mod:`mecoshark.modules`)
     """
     @abc.abstractproperty
     def enabled(self):
@@ -41,10 +69,17 @@ class BaseProcessor(metaclass=abc.ABCMeta):
         """
         return
 
-    def __init__(self, output_path, input_path):
+    def __init__(self, output_path, input_path, parser_options=None):
         self.output_path = output_path
         self.input_path = input_path
         self.projectname = os.path.basename(os.path.normpath(input_path))
+        self.parser_options = dict(parser_options or {})
+        self.journal = self.parser_options.pop('journal', False)
+        self.limits = self.parser_options.pop('limits', {})
+        self.threads = self.parser_options.pop('threads', None)
+        self.concurrent_analyzers = self.parser_options.pop('concurrent_analyzers', 1)
+        self.result_cache = self.parser_options.pop('result_cache', None)
+        self.incremental_modules = self.parser_options.pop('incremental_modules', False)
 
     @abc.abstractmethod
     def process(self, project_name, revision, url, options, debug_level):
@@ -60,34 +95,109 @@ class BaseProcessor(metaclass=abc.ABCMeta):
         """
         return
 
-    def prepare_template(self, template):
+    def open_journal(self, revision):
+        """
+        Opens the journal of the revision in the output path, if the journal is enabled. The journals of the processors\
+        are kept apart by their first supported language, as several processors can analyze the same revision
+
+        :param revision: revision_hash of the revision
+        :return: :class:`~mecoshark.resultparser.journal.IngestJournal` or None
+        """
+        if not self.journal:
+            return None
+
+        return IngestJournal(os.path.join(self.output_path, 'journal', self.supported_languages[0], revision))
+
+    def find_cached_results(self, revision, analyzer, templates, path=None, lookup=True):
+        """
+        Looks up the results of the revision in the result cache, if it is enabled
+
+        :param revision: revision_hash of the revision
+        :param analyzer: path to the executable of the analyzer
+        :param templates: paths to the templates with which the analyzer is executed
+        :param path: path of the directory of the revision that is analyzed on its own (e.g., a module). None: the\
+        whole revision
+        :param lookup: if the results are looked up. False: only the key is created (e.g., if the path is known to\
+        have changed)
+        :return: tuple of the key of the revision (None, if the results can not be cached) and the cached results\
+        (tuple of the path to the results and the analyzed path, or None, if they are not cached)
+        """
+        if self.result_cache is None:
+            return None, None
+
+        key = self.result_cache.get_key(self.get_repository_path(), revision, analyzer, templates, path)
+        if key is None or not lookup:
+            return key, None
+        return key, self.result_cache.lookup(key)
+
+    def get_repository_path(self):
+        """
+        Gets the path to the git repository of the revision
+
+        :return: repository_path option or the input path, if it is not set
+        """
+        return self.parser_options.get('repository_path', None) or self.input_path
+
+    def cache_results(self, key, results_path, revision):
+        """
+        Stores the results of the analysis of the input path in the result cache (if the key is not None)
+
+        :param key: key of the revision (see :func:`find_cached_results`)
+        :param results_path: directory with the results of SourceMeter
+        :param revision: revision_hash of the revision
+        """
+        if key is not None:
+            self.result_cache.store(key, results_path, self.input_path, revision)
+
+    @contextlib.contextmanager
+    def limited(self, resource):
+        """
+        Context manager that waits until the resource can be used, if its use is limited (see\
+        :class:`~mecoshark.scheduler.ResourceLimit`)
+
+        :param resource: name of the resource (analyzer: execution of SourceMeter, writer: ingest of the results)
+        """
+        limit = self.limits.get(resource, None)
+        if limit is None:
+            yield
+            return
+
+        with limit:
+            yield
+
+    def prepare_template(self, template, input_path=None, projectname=None, results_path=None):
         """
         Copies the template from the template folder to the output_path and sets access rights.
 
-        Several variables (marked with $<name>) are substituted, so that the template can be used right away
+        Several variables (marked with $<name>) are substituted, so that the template can be used right away. The
+        number of threads ($threads) is the threads option or derived from the CPUs that are available to this
+        process and the number of concurrent analyzers (see :func:`~mecoshark.cpus.get_thread_count`).
 
         :param template: path to the template
+        :param input_path: path that is analyzed ($input, default: the input path)
+        :param projectname: name of the analyzed project ($projectname, default: the projectname)
+        :param results_path: directory in which the results are stored ($results, default: the output path)
         :return:
         """
-        sourcemeter_path = os.path.dirname(os.path.realpath(__file__))+'/../../external/openStaticAnalyzer/'
-        java_sourcemeter = os.path.join(sourcemeter_path, 'Java/OpenStaticAnalyzerJava')
-        python_sourcemeter = os.path.join(sourcemeter_path, 'Python/OpenStaticAnalyzerPython')
-        c_sourcemeter = os.path.join(sourcemeter_path, 'CPP/SourceMeterCPP')
-        maven_path = os.path.join(sourcemeter_path, 'maven3.2.5/bin/mvn')
-        ant = os.path.join(sourcemeter_path, 'ant1.9.7/bin/ant')
+        input_path = input_path or self.input_path
+        maven_path = os.path.join(SOURCEMETER_PATH, 'maven3.2.5/bin/mvn')
+        ant = os.path.join(SOURCEMETER_PATH, 'ant1.9.7/bin/ant')
 
-        maven_pom = os.path.join(self.input_path, 'pom.xml')
-        ant_build = os.path.join(self.input_path, 'build.xml')
+        maven_pom = os.path.join(input_path, 'pom.xml')
+        ant_build = os.path.join(input_path, 'build.xml')
 
         with open(template, 'r') as myTemplate:
             data = myTemplate.read()
 
+        threads = self.threads if self.threads else get_thread_count(self.concurrent_analyzers)
+
         data_template = string.Template(data)
         out = data_template.safe_substitute(mavenpath=maven_path, mavenpom=maven_pom, antbuild=ant_build,
-                                            javaSourcemeter=java_sourcemeter,
-                                            results=self.output_path, projectname=self.projectname, input=self.input_path,
-                                            pythonSourcemeter=python_sourcemeter,
-                                            cSourcemeter=c_sourcemeter, ant=ant)
+                                            javaSourcemeter=JAVA_SOURCEMETER,
+                                            results=results_path or self.output_path,
+                                            projectname=projectname or self.projectname, input=input_path,
+                                            pythonSourcemeter=PYTHON_SOURCEMETER,
+                                            cSourcemeter=C_SOURCEMETER, ant=ant, threads=threads)
 
         output_path = os.path.join(self.output_path, os.path.basename(os.path.normpath(template)))
         with open(output_path, 'w') as myTemplate:
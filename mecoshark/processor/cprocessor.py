@@ -33,8 +33,8 @@ class CProcessor(BaseProcessor):
         """
         return 0.05
 
-    def __init__(self, output_path, input_path):
-        super().__init__(output_path, input_path)
+    def __init__(self, output_path, input_path, parser_options=None):
+        super().__init__(output_path, input_path, parser_options)
         return
 
     def execute_sourcemeter(self, makefile_contents=None):
@@ -103,11 +103,15 @@ class CProcessor(BaseProcessor):
         :param debug_level: debugging_level
         """
         logger.setLevel(debug_level)
-        self.execute_sourcemeter(makefile_contents)
+        if self.journal:
+            logger.warning("The journal is not supported by the C processor, the ingest is not recorded.")
+        with self.limited('analyzer'):
+            self.execute_sourcemeter(makefile_contents)
         output_path = os.path.join(self.output_path, self.projectname, 'cpp')
         output_path = os.path.join(output_path, os.listdir(output_path)[0])
 
-        parser = SourcemeterParser(output_path, self.input_path, url, revision, debug_level)
-        parser.store_data()
+        parser = SourcemeterParser(output_path, self.input_path, url, revision, debug_level, **self.parser_options)
+        with self.limited('writer'):
+            parser.store_data()
 
         shutil.rmtree(os.path.join(self.output_path, self.projectname), True)
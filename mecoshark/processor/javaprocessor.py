@@ -5,7 +5,9 @@ import subprocess
 
 import sys
 
-from mecoshark.processor.baseprocessor import BaseProcessor
+from mecoshark.modules import ModuleResultMerger, find_modules, map_changed_files
+from mecoshark.processor.baseprocessor import BaseProcessor, JAVA_SOURCEMETER
+from mecoshark.resultparser.inputfiles import list_changed_files, list_git_files
 from mecoshark.resultparser.sourcemeterparser import SourcemeterParser
 
 logger = logging.getLogger('processor')
@@ -36,8 +38,8 @@ class JavaProcessor(BaseProcessor):
         """
         return 0.05
 
-    def __init__(self, output_path, input_path):
-        super().__init__(output_path, input_path)
+    def __init__(self, output_path, input_path, parser_options=None):
+        super().__init__(output_path, input_path, parser_options)
         return
 
     def execute_sourcemeter(self):
@@ -106,14 +108,104 @@ class JavaProcessor(BaseProcessor):
         if not self.is_output_produced():
             raise FileNotFoundError('Problem in using mecoshark! No output was produced!')
 
-    def is_output_produced(self):
+    def execute_module(self, module, template):
+        """
+        Executes sourcemeter for the java language on the directory of a module
+
+        :param module: name of the module (top-level directory of the input path)
+        :param template: path to the template of the directory-based analysis
+        :return: directory with the results of the module
+        """
+        results_path = os.path.join(self.output_path, self.projectname, 'modules')
+        project_path = os.path.join(results_path, module)
+        shutil.rmtree(project_path, True)
+        os.makedirs(results_path, exist_ok=True)
+
+        logger.info("Analyzing module %s..." % module)
+        self.prepare_template(template, input_path=os.path.join(self.input_path.rstrip('/'), module),
+                              projectname=module, results_path=results_path)
+        try:
+            subprocess.run(os.path.join(self.output_path, os.path.basename(template)), shell=True)
+        except Exception:
+            pass
+
+        if not self.is_output_produced(project_path):
+            raise FileNotFoundError('Problem in using mecoshark! No output was produced for module %s!' % module)
+
+        meco_path = os.path.join(project_path, 'java')
+        return os.path.join(meco_path, os.listdir(meco_path)[0])
+
+    def find_modules(self, revision):
+        """
+        Finds the top-level modules of the revision, if the incremental mode is enabled (see\
+        :func:`~mecoshark.modules.find_modules`)
+
+        :param revision: revision_hash of the revision
+        :return: sorted list of the names of the modules or None, if the revision is analyzed as a whole
+        """
+        if not self.incremental_modules:
+            return None
+
+        files = list_git_files(self.get_repository_path(), revision)
+        if files is None:
+            logger.warning("Could not list the files of revision %s from git. Analyzing it as a whole." % revision)
+            return None
+
+        modules = find_modules(files)
+        if modules is None:
+            logger.info("Revision %s has Java files outside of modules. Analyzing it as a whole." % revision)
+        return modules
+
+    def analyze_modules(self, revision, modules, templates):
+        """
+        Analyzes the modules of the revision and merges their results. The modules that the revision changes compared\
+        to its first parent (git diff) are analyzed right away. The results of the other modules are looked up in the\
+        result cache by the tree of the module, so that they are only analyzed if no revision with the same tree was\
+        cached. If the changed files can not be listed, all modules are looked up.
+
+        :param revision: revision_hash of the revision
+        :param modules: names of the modules
+        :param templates: paths to the templates with which the analyzer is executed (the first one is executed)
+        :return: directory with the merged results
+        """
+        repository_path = self.get_repository_path()
+        changed_files = list_changed_files(repository_path, revision + '^', revision)
+        changed_modules = set()
+        if changed_files is not None:
+            changed_modules = map_changed_files(changed_files, modules)
+            logger.info("Revision %s changes %d of %d modules: %s" % (revision, len(changed_modules), len(modules),
+                                                                     ', '.join(sorted(changed_modules))))
+
+        shutil.rmtree(os.path.join(self.output_path, self.projectname), True)
+        merger = ModuleResultMerger(os.path.join(self.output_path, self.projectname, 'java', 'merged'),
+                                    self.projectname, self.input_path)
+        try:
+            for module in modules:
+                key, cached_results = self.find_cached_results(revision, JAVA_SOURCEMETER, templates, module,
+                                                               lookup=module not in changed_modules)
+                if cached_results is not None:
+                    merger.add(*cached_results)
+                    continue
+
+                with self.limited('analyzer'):
+                    results_path = self.execute_module(module, templates[0])
+                self.cache_results(key, results_path, revision)
+                merger.add(results_path, self.input_path)
+        finally:
+            merger.close()
+
+        shutil.rmtree(os.path.join(self.output_path, self.projectname, 'modules'), True)
+        return merger.merged_path
+
+    def is_output_produced(self, project_path=None):
         """
         Checks if output was produced for the process
 
+        :param project_path: directory with the results of the project (default: projectname in the output path)
         :return: boolean
         """
 
-        output_path = os.path.join(self.output_path, self.projectname, 'java')
+        output_path = os.path.join(project_path or os.path.join(self.output_path, self.projectname), 'java')
 
         if not os.path.exists(output_path):
             return False
@@ -132,7 +224,9 @@ class JavaProcessor(BaseProcessor):
         See: :func:`~mecoshark.processor.baseprocessor.BaseProcessor.process`
 
         Processes the given revision.
-        1) executes sourcemeter
+        1) executes sourcemeter (or takes the results that were kept in the journal by a former run or the results of\
+        a revision with the same tree from the result cache). In the incremental mode, the modules are analyzed on\
+        their own and their results are merged (see :func:`analyze_modules`)
         2) creates :class:`~mecoshark.resultparser.sourcemeterparser.SourcemeterParser` instance
         3) calls :func:`~mecoshark.resultparser.sourcemeterparser.SourcemeterParser.store_data`
 
@@ -144,12 +238,39 @@ class JavaProcessor(BaseProcessor):
         """
 
         logger.setLevel(debug_level)
-        self.execute_sourcemeter()
-        meco_path = os.path.join(self.output_path, self.projectname, 'java')
-        output_path = os.path.join(meco_path, os.listdir(meco_path)[0])
-
-        parser = SourcemeterParser(output_path, self.input_path, project_name, url, revision, debug_level)
-        parser.store_data()
+        journal = self.open_journal(revision)
+        analyzed_path = self.input_path
+        if journal is not None and journal.has_results():
+            logger.info("Using the results of the analysis of a former run")
+            output_path = journal.results_path
+        else:
+            template_path = os.path.dirname(os.path.realpath(__file__)) + '/../../templates'
+            templates = [os.path.join(template_path, 'analyze-dir.sh')]
+            modules = self.find_modules(revision)
+            if modules is not None:
+                output_path = self.analyze_modules(revision, modules, templates)
+                if journal is not None:
+                    output_path = journal.keep_results(output_path)
+            else:
+                key, cached_results = self.find_cached_results(revision, JAVA_SOURCEMETER, templates)
+                if cached_results is not None:
+                    output_path, analyzed_path = cached_results
+                else:
+                    with self.limited('analyzer'):
+                        self.execute_sourcemeter()
+                    meco_path = os.path.join(self.output_path, self.projectname, 'java')
+                    output_path = os.path.join(meco_path, os.listdir(meco_path)[0])
+                    self.cache_results(key, output_path, revision)
+                    if journal is not None:
+                        output_path = journal.keep_results(output_path)
+
+        parser = SourcemeterParser(output_path, self.input_path, project_name, url, revision, debug_level,
+                                   journal=journal, analyzed_path=analyzed_path, **self.parser_options)
+        with self.limited('writer'):
+            parser.store_data()
+
+        if journal is not None:
+            journal.complete()
 
         # delete directory
         shutil.rmtree(os.path.join(self.output_path, self.projectname), True)
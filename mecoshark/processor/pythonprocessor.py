@@ -3,7 +3,7 @@ import os
 import shutil
 import subprocess
 
-from mecoshark.processor.baseprocessor import BaseProcessor
+from mecoshark.processor.baseprocessor import BaseProcessor, PYTHON_SOURCEMETER
 from mecoshark.resultparser.sourcemeterparser import SourcemeterParser
 
 logger = logging.getLogger("processor")
@@ -34,8 +34,8 @@ class PythonProcessor(BaseProcessor):
         """
         return 0.05
 
-    def __init__(self, output_path, input_path):
-        super().__init__(output_path, input_path)
+    def __init__(self, output_path, input_path, parser_options=None):
+        super().__init__(output_path, input_path, parser_options)
         return
 
     def execute_sourcemeter(self):
@@ -43,7 +43,7 @@ class PythonProcessor(BaseProcessor):
         Executes sourcemeter for a python project
         """
         # Clean output directory
-        shutil.rmtree(self.output_path, self.projectname, True)
+        shutil.rmtree(os.path.join(self.output_path, self.projectname), True)
         os.makedirs(self.output_path, exist_ok=True)
         template_path = os.path.dirname(os.path.realpath(__file__)) + '/../../templates'
 
@@ -80,7 +80,8 @@ class PythonProcessor(BaseProcessor):
         See: :func:`~mecoshark.processor.baseprocessor.BaseProcessor.process`
 
         Processes the given revision.
-        1) executes sourcemeter
+        1) executes sourcemeter (or takes the results that were kept in the journal by a former run or the results of\
+        a revision with the same tree from the result cache)
         2) creates :class:`~mecoshark.resultparser.sourcemeterparser.SourcemeterParser` instance
         3) calls :func:`~mecoshark.resultparser.sourcemeterparser.SourcemeterParser.store_data`
 
@@ -90,12 +91,34 @@ class PythonProcessor(BaseProcessor):
         :param debug_level: debugging_level
         """
         logger.setLevel(debug_level)
-        self.execute_sourcemeter()
-        meco_path = os.path.join(self.output_path, self.projectname, 'python')
-
-        output_path = os.path.join(meco_path, os.listdir(meco_path)[0])
-
-        parser = SourcemeterParser(output_path, self.input_path, project_name, url, revision, debug_level)
-        parser.store_data()
-
-        shutil.rmtree(os.path.join(self.output_path), True)
+        journal = self.open_journal(revision)
+        analyzed_path = self.input_path
+        if journal is not None and journal.has_results():
+            logger.info("Using the results of the analysis of a former run")
+            output_path = journal.results_path
+        else:
+            template_path = os.path.dirname(os.path.realpath(__file__)) + '/../../templates'
+            templates = [os.path.join(template_path, 'analyze_python.sh'),
+                         os.path.join(template_path, 'external-filter-python.txt')]
+            key, cached_results = self.find_cached_results(revision, PYTHON_SOURCEMETER, templates)
+            if cached_results is not None:
+                output_path, analyzed_path = cached_results
+            else:
+                with self.limited('analyzer'):
+                    self.execute_sourcemeter()
+                meco_path = os.path.join(self.output_path, self.projectname, 'python')
+
+                output_path = os.path.join(meco_path, os.listdir(meco_path)[0])
+                self.cache_results(key, output_path, revision)
+                if journal is not None:
+                    output_path = journal.keep_results(output_path)
+
+        parser = SourcemeterParser(output_path, self.input_path, project_name, url, revision, debug_level,
+                                   journal=journal, analyzed_path=analyzed_path, **self.parser_options)
+        with self.limited('writer'):
+            parser.store_data()
+
+        if journal is not None:
+            journal.complete()
+
+        shutil.rmtree(os.path.join(self.output_path, self.projectname), True)
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import uuid
+
+logger = logging.getLogger('processor')
+
+# File of a cache entry that describes it. An entry without it is not complete
+ENTRY_FILE = 'entry.json'
+
+# Directory of a cache entry that contains the results of the analyzer
+RESULTS_DIR = 'results'
+
+
+def get_file_stamp(path):
+    """
+    Gets a stamp of a file that changes if the file is replaced (e.g., by another version of the analyzer)
+
+    :param path: path to the file
+    :return: string with the real path, the size and the modification time of the file
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return '%s:missing' % path
+    return '%s:%d:%d' % (os.path.realpath(path), stat.st_size, int(stat.st_mtime))
+
+
+def get_tree_id(repository_path, revision, path=None):
+    """
+    Gets the id of the tree of a revision. Revisions with the same tree (e.g., a revert of a revert or a merge that
+    does not change anything) have byte-identical files.
+
+    :param repository_path: path to the repository
+    :param revision: revision hash
+    :param path: path of a directory relative to the repository (e.g., a module), whose tree is used instead of the\
+    tree of the whole revision
+    :return: hash of the tree or None, if git fails
+    """
+    tree = revision + ':' + path.strip('/') if path is not None else revision + '^{tree}'
+    try:
+        output = subprocess.check_output(['git', '-C', repository_path, 'rev-parse', '--verify', '--quiet',
+                                          tree], stderr=subprocess.DEVNULL)
+    except (subprocess.CalledProcessError, OSError):
+        return None
+    return output.decode('ascii').strip()
+
+
+class ResultCache(object):
+    """
+    Content-addressed cache of the results of SourceMeter. An entry is keyed by the tree of the analyzed revision,
+    the analyzer (its executable) and the templates with which it is executed (i.e., its flags). If a revision has
+    the same tree as a revision that was analyzed before, the results of the former analysis are used for it instead
+    of executing SourceMeter again. The results are ingested for the commit of the new revision as usual.
+
+    The results contain the absolute path of the analyzed input, which is stored with the entry, so that the
+    parser can strip it (see analyzed_path of :class:`~mecoshark.resultparser.sourcemeterparser.SourcemeterParser`).
+    Entries are written to a temporary directory and renamed, so that several processes can share the cache.
+
+    :property path: directory of the cache
+    """
+    def __init__(self, path):
+        """
+        Initialization
+
+        :param path: directory of the cache
+        """
+        self.path = path
+        os.makedirs(self.path, exist_ok=True)
+
+    def get_key(self, repository_path, revision, analyzer, templates, path=None):
+        """
+        Gets the key of the results of a revision
+
+        :param repository_path: path to the repository
+        :param revision: revision hash
+        :param analyzer: path to the executable of the analyzer
+        :param templates: paths to the templates with which the analyzer is executed
+        :param path: path of the directory of the revision that is analyzed on its own (e.g., a module, see\
+        :mod:`mecoshark.modules`). None: the whole revision
+        :return: key (hex digest) or None, if the tree of the revision is not known
+        """
+        tree_id = get_tree_id(repository_path, revision, path)
+        if tree_id is None:
+            return None
+
+        parts = [tree_id, get_file_stamp(analyzer)]
+        if path is not None:
+            parts.append(path.strip('/'))
+
+        sha = hashlib.sha1()
+        sha.update(json.dumps(parts).encode('utf-8'))
+        for template in templates:
+            with open(template, 'rb') as template_file:
+                sha.update(template_file.read())
+        return sha.hexdigest()
+
+    def get_entry_path(self, key):
+        """
+        Gets the directory of an entry
+
+        :param key: key of the entry
+        :return: path
+        """
+        return os.path.join(self.path, key[:2], key)
+
+    def lookup(self, key):
+        """
+        Looks up the results of a key
+
+        :param key: key of the entry
+        :return: tuple of the path to the results and the analyzed path or None, if there is no (complete) entry
+        """
+        entry_path = self.get_entry_path(key)
+        try:
+            with open(os.path.join(entry_path, ENTRY_FILE)) as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+
+        logger.info("Found results of the analysis of revision %s in the cache (%s)" % (entry['revision'], key))
+        return os.path.join(entry_path, RESULTS_DIR), entry['analyzed_path']
+
+    def store(self, key, results_path, analyzed_path, revision):
+        """
+        Copies the results of an analysis into the cache
+
+        :param key: key of the entry
+        :param results_path: directory with the results of the analyzer
+        :param analyzed_path: path that was analyzed
+        :param revision: revision hash of the analyzed revision
+        """
+        entry_path = self.get_entry_path(key)
+        if os.path.exists(entry_path):
+            return
+
+        temporary_path = os.path.join(self.path, 'tmp-%s' % uuid.uuid4().hex)
+        try:
+            shutil.copytree(results_path, os.path.join(temporary_path, RESULTS_DIR))
+            with open(os.path.join(temporary_path, ENTRY_FILE), 'w') as entry_file:
+                json.dump({'revision': revision, 'analyzed_path': analyzed_path}, entry_file)
+
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            os.rename(temporary_path, entry_path)
+            logger.info("Stored the results of the analysis of revision %s in the cache (%s)" % (revision, key))
+        except OSError as e:
+            # e.g., another process stored the entry in the meantime
+            logger.debug("Could not store the results in the cache: %s" % e)
+        finally:
+            shutil.rmtree(temporary_path, True)
@@ -0,0 +1,147 @@
+import logging
+import timeit
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger("sourcemeter_parser")
+
+
+class BulkWriter(object):
+    """
+    Accumulates upserts for one collection and sends them as batches via
+    :func:`pymongo.collection.Collection.bulk_write` instead of issuing one round-trip per document.
+
+    :property collection: :class:`pymongo.collection.Collection` to which the upserts are written
+    :property id_field: field (e.g., s_key) or tuple of fields (e.g., a compound shard key) that identifies a\
+    document. Used to coalesce upserts and to resolve ids
+    :property batch_size: number of upserts that are collected before they are written
+    :property ordered: if the bulk write should be ordered
+    :property operations: pending operations as list of (query, set dictionary, keys, document id)
+    :property positions: dictionary with the value of the id_field as key and the position in operations as value
+    :property pending_keys: dictionary with the key of pending operations as key and the value of the id_field as value
+    :property write_time: seconds spent in the database (bulk writes and id queries)
+    """
+    def __init__(self, collection, id_field='s_key', batch_size=1000, ordered=False):
+        """
+        Initialization
+
+        :param collection: :class:`pymongo.collection.Collection` to which the upserts are written
+        :param id_field: field or tuple of fields that identifies a document
+        :param batch_size: number of upserts that are collected before they are written
+        :param ordered: if the bulk write should be ordered. As upserts with the same id_field value are coalesced\
+        into one operation, an unordered write is safe for documents that do not depend on each other.
+        """
+        self.collection = collection
+        self.id_field = id_field
+        self.batch_size = batch_size
+        self.ordered = ordered
+
+        self.operations = []
+        self.positions = {}
+        self.pending_keys = {}
+        self.write_time = 0.0
+
+    def is_pending(self, key):
+        """
+        Checks if an upsert with the given key was not yet written
+
+        :param key: key that was given to :func:`upsert`
+        :return: boolean
+        """
+        return key in self.pending_keys
+
+    def upsert(self, query, fields, key=None, document_id=None):
+        """
+        Adds an upsert. If the batch is full, all pending upserts are written.
+        Upserts with the same id_field value as a pending one are merged into it, so that the last one wins (like it
+        would be the case for sequential upserts).
+
+        :param query: query that identifies the document. Must contain the id_field
+        :param fields: dictionary of fields that should be set
+        :param key: key (e.g., the ID of the csv row) under which the id of the document is returned after it was\
+        written. If it is None, the id is not resolved.
+        :param document_id: id (:class:`bson.objectid.ObjectId`) that the document gets if it is inserted. Needed if\
+        the id was assigned before the document is written.
+        :return: dictionary with key as key and the document id as value for all written documents (empty if\
+        nothing was written)
+        """
+        identifier = self.get_identifier(query)
+
+        if identifier in self.positions:
+            pending_fields, keys = self.operations[self.positions[identifier]][1:3]
+            pending_fields.update(fields)
+        else:
+            keys = []
+            self.positions[identifier] = len(self.operations)
+            self.operations.append((query, dict(fields), keys, document_id))
+
+        if key is not None:
+            keys.append(key)
+            self.pending_keys[key] = identifier
+
+        if len(self.operations) >= self.batch_size:
+            return self.flush()
+        return {}
+
+    def get_identifier(self, document):
+        """
+        Gets the value of the id_field of a query or document (tuple of values for multiple fields)
+
+        :param document: query or document
+        :return: value of the id_field
+        """
+        if isinstance(self.id_field, str):
+            return document[self.id_field]
+        return tuple(document[field] for field in self.id_field)
+
+    def flush(self):
+        """
+        Writes all pending upserts and resolves the ids of the written documents.
+        Ids of inserted documents are taken from the result of the bulk write, ids of updated documents are queried
+        with one $in query on the id_field (or one $or query of the upserts for multiple fields).
+
+        :return: dictionary with the key as key and the document id as value
+        """
+        if not self.operations:
+            return {}
+
+        requests = []
+        for query, fields, keys, document_id in self.operations:
+            update = {'$set': fields}
+            if document_id is not None:
+                update['$setOnInsert'] = {'_id': document_id}
+            requests.append(UpdateOne(query, update, upsert=True))
+
+        start_time = timeit.default_timer()
+        result = self.collection.bulk_write(requests, ordered=self.ordered)
+        logger.debug("Wrote %d upserts to %s" % (len(requests), self.collection.name))
+
+        ids = {}
+        unresolved = {}
+        for position, (query, fields, keys, document_id) in enumerate(self.operations):
+            if not keys:
+                continue
+
+            if position in result.upserted_ids:
+                for key in keys:
+                    ids[key] = result.upserted_ids[position]
+            else:
+                unresolved[self.get_identifier(query)] = (query, keys)
+
+        if unresolved:
+            if isinstance(self.id_field, str):
+                query = {self.id_field: {'$in': list(unresolved)}}
+                projection = {self.id_field: 1}
+            else:
+                query = {'$or': [query for query, keys in unresolved.values()]}
+                projection = {field: 1 for field in self.id_field}
+
+            for document in self.collection.find(query, projection):
+                for key in unresolved[self.get_identifier(document)][1]:
+                    ids[key] = document['_id']
+        self.write_time += timeit.default_timer() - start_time
+
+        self.operations = []
+        self.positions = {}
+        self.pending_keys = {}
+        return ids
@@ -0,0 +1,248 @@
+import logging
+
+from pymongo.errors import OperationFailure
+from pycoshark.mongomodels import CodeEntityState, CodeGroupState
+
+logger = logging.getLogger("sourcemeter_parser")
+
+# SHA-1 of the UTF-8 encoding of a string as hex digest (like hashlib.sha1(value.encode('utf-8')).hexdigest()), which
+# is used by the server to calculate the s_keys of the copied states. Returns null for null.
+SHA1_FUNCTION = """function(value) {
+    if (value === null || value === undefined) {
+        return null;
+    }
+    var bytes = unescape(encodeURIComponent(value));
+    var length = bytes.length;
+    var words = [];
+    var i;
+    for (i = 0; i < length; i++) {
+        words[i >> 2] |= bytes.charCodeAt(i) << (24 - (i % 4) * 8);
+    }
+    words[length >> 2] |= 0x80 << (24 - (length % 4) * 8);
+    words[(((length + 8) >> 6) + 1) * 16 - 1] = length * 8;
+
+    var h = [0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476, 0xC3D2E1F0];
+    var w = [];
+    for (var block = 0; block < words.length; block += 16) {
+        var a = h[0], b = h[1], c = h[2], d = h[3], e = h[4];
+        for (i = 0; i < 80; i++) {
+            if (i < 16) {
+                w[i] = words[block + i] | 0;
+            } else {
+                var x = w[i - 3] ^ w[i - 8] ^ w[i - 14] ^ w[i - 16];
+                w[i] = (x << 1) | (x >>> 31);
+            }
+            var f, k;
+            if (i < 20) {
+                f = (b & c) | (~b & d); k = 0x5A827999;
+            } else if (i < 40) {
+                f = b ^ c ^ d; k = 0x6ED9EBA1;
+            } else if (i < 60) {
+                f = (b & c) | (b & d) | (c & d); k = 0x8F1BBCDC;
+            } else {
+                f = b ^ c ^ d; k = 0xCA62C1D6;
+            }
+            var t = (((a << 5) | (a >>> 27)) + f + e + k + w[i]) | 0;
+            e = d; d = c; c = (b << 30) | (b >>> 2); b = a; a = t;
+        }
+        h[0] = (h[0] + a) | 0; h[1] = (h[1] + b) | 0; h[2] = (h[2] + c) | 0; h[3] = (h[3] + d) | 0;
+        h[4] = (h[4] + e) | 0;
+    }
+
+    var digest = '';
+    for (i = 0; i < 5; i++) {
+        digest += ('00000000' + (h[i] >>> 0).toString(16)).slice(-8);
+    }
+    return digest;
+}"""
+
+
+def sha1_expression(value):
+    """
+    Creates the aggregation expression that calculates the SHA-1 hex digest of a string expression.
+
+    :param value: aggregation expression of the string
+    :return: aggregation expression ($function)
+    """
+    return {'$function': {'body': SHA1_FUNCTION, 'args': [value], 'lang': 'js'}}
+
+
+def entity_state_key_expression(long_name, commit_id, file_id):
+    """
+    Creates the aggregation expression that calculates the s_key of a code entity state (see\
+    :func:`~pycoshark.utils.get_code_entity_state_identifier`).
+
+    :param long_name: aggregation expression of the long name
+    :param commit_id: id of the commit of the state
+    :param file_id: aggregation expression of the file id
+    :return: aggregation expression
+    """
+    return sha1_expression({'$concat': [long_name, str(commit_id), {'$toString': file_id}]})
+
+
+def group_state_key_expression(long_name, commit_id):
+    """
+    Creates the aggregation expression that calculates the s_key of a code group state (see\
+    :func:`~pycoshark.utils.get_code_group_state_identifier`).
+
+    :param long_name: aggregation expression of the long name
+    :param commit_id: id of the commit of the state
+    :return: aggregation expression
+    """
+    return sha1_expression({'$concat': [long_name, str(commit_id)]})
+
+
+class CarryForward(object):
+    """
+    Copies the code entity states of files that did not change compared to the parent commit into the analyzed commit.
+    The states are copied by the server with aggregations that write their results with $merge, so that the states
+    of unchanged files never go over the wire.
+
+    The copy is done in two steps:
+
+    1. :func:`copy_states` copies the states of the parent commit in the given files with the new commit_id and
+       s_key. As the ids of the referenced states of the analyzed commit are not known yet, the s_keys of the
+       referenced states are stored in the temporary fields carried_parent_key and carried_group_keys.
+    2. :func:`resolve_references` sets ce_parent_id and cg_ids of the copied states to the ids of the states with
+       these s_keys (i.e., after the code group states of the analyzed commit were written) and removes the
+       temporary fields.
+
+    Both steps merge on s_key, the shard key of the code entity states. If a step fails, the copied states that
+    still have the temporary fields are removed (see :func:`remove_copied_states`).
+
+    .. NOTE:: Needs MongoDB 4.4 or newer ($function and $merge into the aggregated collection).
+
+    :property parent_commit_id: id of the parent commit whose states are copied
+    :property commit_id: id of the analyzed commit
+    """
+
+    def __init__(self, parent_commit_id, commit_id):
+        """
+        Initialization
+
+        :param parent_commit_id: id of the parent commit whose states are copied
+        :param commit_id: id of the analyzed commit
+        """
+        self.parent_commit_id = parent_commit_id
+        self.commit_id = commit_id
+
+    def get_copy_pipeline(self, file_ids):
+        """
+        Creates the aggregation pipeline that copies the states of the parent commit in the given files.
+
+        :param file_ids: ids of the files whose states are copied
+        :return: list of stages
+        """
+        entity_collection = CodeEntityState._get_collection().name
+        group_collection = CodeGroupState._get_collection().name
+
+        group_name = {'$let': {
+            'vars': {'index': {'$indexOfArray': ['$carried_groups._id', '$$group_id']}},
+            'in': {'$cond': [{'$gte': ['$$index', 0]}, {'$arrayElemAt': ['$carried_groups.long_name', '$$index']},
+                             None]},
+        }}
+        parent_key = {'$let': {
+            'vars': {'parent': {'$arrayElemAt': ['$carried_parent', 0]}},
+            'in': entity_state_key_expression('$$parent.long_name', self.commit_id, '$$parent.file_id'),
+        }}
+
+        return [
+            {'$match': {'commit_id': self.parent_commit_id, 'file_id': {'$in': file_ids}}},
+            {'$lookup': {'from': entity_collection, 'localField': 'ce_parent_id', 'foreignField': '_id',
+                         'as': 'carried_parent'}},
+            {'$lookup': {'from': group_collection, 'localField': 'cg_ids', 'foreignField': '_id',
+                         'as': 'carried_groups'}},
+            {'$set': {
+                'commit_id': self.commit_id,
+                's_key': entity_state_key_expression('$long_name', self.commit_id, '$file_id'),
+                'carried_parent_key': parent_key,
+                'carried_group_keys': {'$map': {
+                    'input': {'$ifNull': ['$cg_ids', []]},
+                    'as': 'group_id',
+                    'in': group_state_key_expression(group_name, self.commit_id),
+                }},
+            }},
+            {'$unset': ['_id', 'carried_parent', 'carried_groups']},
+            {'$merge': {'into': entity_collection, 'on': 's_key', 'whenMatched': 'replace',
+                        'whenNotMatched': 'insert'}},
+        ]
+
+    def get_resolve_pipeline(self):
+        """
+        Creates the aggregation pipeline that resolves the references of the copied states.
+
+        :return: list of stages
+        """
+        entity_collection = CodeEntityState._get_collection().name
+        group_collection = CodeGroupState._get_collection().name
+
+        group_id = {'$let': {
+            'vars': {'index': {'$indexOfArray': ['$carried_groups.s_key', '$$group_key']}},
+            'in': {'$cond': [{'$gte': ['$$index', 0]}, {'$arrayElemAt': ['$carried_groups._id', '$$index']}, None]},
+        }}
+
+        return [
+            {'$match': {'commit_id': self.commit_id, 'carried_group_keys': {'$exists': True}}},
+            {'$lookup': {'from': entity_collection, 'localField': 'carried_parent_key', 'foreignField': 's_key',
+                         'as': 'carried_parent'}},
+            {'$lookup': {'from': group_collection, 'localField': 'carried_group_keys', 'foreignField': 's_key',
+                         'as': 'carried_groups'}},
+            {'$project': {
+                's_key': '$s_key',
+                'ce_parent_id': {'$cond': [
+                    {'$eq': [{'$ifNull': ['$carried_parent_key', None]}, None]},
+                    None,
+                    {'$ifNull': [{'$arrayElemAt': ['$carried_parent._id', 0]}, None]},
+                ]},
+                'cg_ids': {'$filter': {
+                    'input': {'$map': {'input': '$carried_group_keys', 'as': 'group_key', 'in': group_id}},
+                    'as': 'group_id',
+                    'cond': {'$ne': ['$$group_id', None]},
+                }},
+            }},
+            {'$merge': {'into': entity_collection, 'on': 's_key', 'whenNotMatched': 'discard', 'whenMatched': [
+                {'$set': {'ce_parent_id': '$$new.ce_parent_id', 'cg_ids': '$$new.cg_ids'}},
+                {'$unset': ['carried_parent_key', 'carried_group_keys']},
+            ]}},
+        ]
+
+    def copy_states(self, file_ids, query_size):
+        """
+        Copies the code entity states of the parent commit in the given files into the analyzed commit (step 1).
+
+        :param file_ids: ids of the unchanged files
+        :param query_size: maximal number of file ids that are put into one aggregation
+        :return: True, if the states were copied. False, if the server does not support the aggregation (the states\
+        that were copied before are removed)
+        """
+        collection = CodeEntityState._get_collection()
+        try:
+            for start in range(0, len(file_ids), query_size):
+                collection.aggregate(self.get_copy_pipeline(file_ids[start:start + query_size]))
+        except OperationFailure as e:
+            logger.warning("Could not copy the states of the unchanged files on the server: %s" % e)
+            self.remove_copied_states()
+            return False
+        return True
+
+    def resolve_references(self):
+        """
+        Resolves the references of the copied states to the states of the analyzed commit (step 2). Must be called
+        after all code group states of the analyzed commit were written. If the server fails, the copied states are
+        removed and the error is raised, so that a rerun of the revision starts from scratch.
+        """
+        try:
+            CodeEntityState._get_collection().aggregate(self.get_resolve_pipeline())
+        except OperationFailure as e:
+            logger.error("Could not resolve the references of the copied states on the server: %s" % e)
+            self.remove_copied_states()
+            raise
+
+    def remove_copied_states(self):
+        """
+        Removes the copied states of the analyzed commit whose references were not resolved yet (i.e., that still\
+        have the temporary fields)
+        """
+        result = CodeEntityState._get_collection().delete_many({'commit_id': self.commit_id,
+                                                                 'carried_group_keys': {'$exists': True}})
+        logger.info("Removed %d copied states" % result.deleted_count)
@@ -0,0 +1,301 @@
+import logging
+
+from mongoengine import Document, ObjectIdField, ListField, IntField
+from pycoshark.mongomodels import CodeEntityState, CodeGroupState
+
+logger = logging.getLogger("sourcemeter_parser")
+
+
+class CodeStateInheritance(Document):
+    """
+    Records for a commit that was ingested in delta mode from which states it inherits the states that were not
+    written for it. The states of the commit are the states of all commits in chain_commit_ids (oldest first): the
+    states of a later commit replace the ones with the same identity (long name and file) of an earlier one, and the
+    states in the removed ids of a commit are not part of it anymore.
+
+    .. NOTE:: The references (ce_parent_id, cg_ids, cg_parent_ids) of an inherited state point to the states of the\
+    commit in which it was written. They need to be resolved via the long name of the referenced state.
+
+    :property commit_id: id of the commit
+    :property parent_commit_id: id of the parent commit from which the unchanged states are inherited (None, if all\
+    states were written)
+    :property chain_commit_ids: ids of the commits whose written states make up the states of this commit
+    :property removed_ce_ids: ids of the code entity states of the parent commit that are not part of this commit
+    :property removed_cg_ids: ids of the code group states of the parent commit that are not part of this commit
+    :property written_ces: number of code entity states that were written for this commit
+    :property inherited_ces: number of code entity states that were inherited from the parent commit
+    :property written_cgs: number of code group states that were written for this commit
+    :property inherited_cgs: number of code group states that were inherited from the parent commit
+    """
+    meta = {
+        'collection': 'code_state_inheritance',
+        'indexes': [
+            'commit_id',
+        ],
+        'shard_key': ('commit_id',),
+    }
+
+    commit_id = ObjectIdField(required=True, unique=True)
+    parent_commit_id = ObjectIdField()
+    chain_commit_ids = ListField(ObjectIdField())
+    removed_ce_ids = ListField(ObjectIdField())
+    removed_cg_ids = ListField(ObjectIdField())
+    written_ces = IntField()
+    inherited_ces = IntField()
+    written_cgs = IntField()
+    inherited_cgs = IntField()
+
+
+class DeltaBaseline(object):
+    """
+    States of the parent commit against which the states of the analyzed commit are compared in delta mode.
+    Only states whose metrics, positions, type or references (by long name) changed are written, all others are
+    inherited from the parent commit.
+
+    :property chain_commit_ids: ids of the commits whose written states make up the states of the parent commit
+    :property entity_states: dictionary with (long name, file id) as key and the projected code entity state of the\
+    parent commit as value
+    :property group_states: dictionary with the long name as key and the projected code group state of the parent\
+    commit as value
+    :property state_names: dictionary with the id of a loaded state as key and its long name as value
+    :property row_names: dictionary with the ID of a row of the analyzed commit as key and its long name as value
+    :property seen_entity_states: keys of the code entity states of the analyzed commit
+    :property seen_group_states: keys of the code group states of the analyzed commit
+    :property removed_entity_ids: ids of code entity states of the parent commit in files that are not part of the\
+    analyzed commit
+    :property inherited_entity_states: number of code entity states that were inherited
+    :property inherited_group_states: number of code group states that were inherited
+    :property inherited_entity_ids: ids of the code entity states that were inherited
+    :property commit_has_states: if states of the analyzed commit were already stored (e.g., by a former run)
+    :property stale_state_keys: s_keys of states of the analyzed commit that were stored before, but are inherited\
+    now. Only collected if commit_has_states is set
+    """
+
+    # Fields of the code entity states that are compared
+    ENTITY_FIELDS = {'long_name': 1, 'file_id': 1, 'commit_id': 1, 'ce_type': 1, 'metrics': 1, 'start_line': 1,
+                     'end_line': 1, 'start_column': 1, 'end_column': 1, 'ce_parent_id': 1, 'cg_ids': 1, 'linter': 1}
+
+    # Fields of the code group states that are compared
+    GROUP_FIELDS = {'long_name': 1, 'commit_id': 1, 'cg_type': 1, 'metrics': 1, 'cg_parent_ids': 1}
+
+    def __init__(self, chain_commit_ids):
+        """
+        Initialization
+
+        :param chain_commit_ids: ids of the commits whose written states make up the states of the parent commit\
+        (oldest first)
+        """
+        self.chain_commit_ids = chain_commit_ids
+        self.entity_states = {}
+        self.group_states = {}
+        self.state_names = {}
+        self.row_names = {}
+        self.seen_entity_states = set()
+        self.seen_group_states = set()
+        self.removed_entity_ids = []
+        self.inherited_entity_states = 0
+        self.inherited_group_states = 0
+        self.inherited_entity_ids = set()
+        self.commit_has_states = False
+        self.stale_state_keys = []
+
+    def load(self, file_ids, query_size):
+        """
+        Loads the states of the parent commit. The code entity states are only loaded for the given files, of all
+        other files only the ids are loaded, as they are removed in the analyzed commit. The files of the states of the
+        chain are listed with an aggregation, so that the removed files are known without putting all file ids into
+        one query. The states are queried commit by commit (oldest first) with at most query_size file ids per query
+        and folded while the cursors are iterated (see :func:`fold_states`), so that only the folded states are kept
+        in memory.
+
+        :param file_ids: ids of the files of the analyzed commit
+        :param query_size: maximal number of file ids that are put into one $in query
+        """
+        if not self.chain_commit_ids:
+            return
+
+        removed_ids = {}
+        for document in CodeStateInheritance._get_collection().find({'commit_id': {'$in': self.chain_commit_ids}}):
+            removed_ids[document['commit_id']] = set(document.get('removed_ce_ids', [])) | \
+                                                 set(document.get('removed_cg_ids', []))
+
+        entity_collection = CodeEntityState._get_collection()
+        group_collection = CodeGroupState._get_collection()
+        chain_file_ids = {document['_id'] for document in entity_collection.aggregate([
+            {'$match': {'commit_id': {'$in': self.chain_commit_ids}}},
+            {'$group': {'_id': '$file_id'}},
+        ])}
+        removed_file_ids = sorted(chain_file_ids.difference(file_ids))
+
+        def get_entity_key(document):
+            return document['long_name'], document['file_id']
+
+        removed_states = {}
+        for commit_id in self.chain_commit_ids:
+            commit_removed_ids = removed_ids.get(commit_id, set())
+            self.fold_states(self.entity_states, self.find_states(entity_collection, commit_id, file_ids, query_size,
+                                                                  self.ENTITY_FIELDS),
+                             commit_removed_ids, get_entity_key)
+            self.fold_states(self.group_states, self.find_states(group_collection, commit_id, None, query_size,
+                                                                 self.GROUP_FIELDS),
+                             commit_removed_ids, lambda document: document['long_name'])
+            self.fold_states(removed_states, self.find_states(entity_collection, commit_id, removed_file_ids,
+                                                              query_size, {'long_name': 1, 'file_id': 1}, False),
+                             commit_removed_ids, get_entity_key)
+        self.removed_entity_ids = [document['_id'] for document in removed_states.values()]
+
+        logger.info("Loaded %d code entity states and %d code group states of the parent commit" %
+                    (len(self.entity_states), len(self.group_states)))
+
+    def find_states(self, collection, commit_id, file_ids, query_size, fields, record_names=True):
+        """
+        Queries the written states of a commit of the chain. The long names of the states are recorded in\
+        state_names, as inherited states may reference them.
+
+        :param collection: collection of the states
+        :param commit_id: id of the commit of the chain
+        :param file_ids: ids of the files of the states, which are queried in chunks of query_size (None: all states\
+        of the commit)
+        :param query_size: maximal number of file ids that are put into one $in query
+        :param fields: projection of the states
+        :param record_names: if the long names of the states are recorded
+        :return: generator of the projected states
+        """
+        if file_ids is None:
+            queries = [{'commit_id': commit_id}]
+        else:
+            queries = [{'commit_id': commit_id, 'file_id': {'$in': file_ids[start:start + query_size]}}
+                       for start in range(0, len(file_ids), query_size)]
+
+        for query in queries:
+            for document in collection.find(query, fields):
+                if record_names:
+                    self.state_names[document['_id']] = document['long_name']
+                yield document
+
+    @staticmethod
+    def fold_states(states, documents, removed_ids, get_key):
+        """
+        Folds the written states of a commit of the chain into the states of the commits before it (in place): the\
+        removed states of the commit are dropped and its written states replace the ones with the same key.
+
+        :param states: dictionary with the key as key and the projected state as value
+        :param documents: projected states written for the commit
+        :param removed_ids: set of the ids of the states that were removed in the commit
+        :param get_key: function that returns the key (identity) of a state
+        """
+        if removed_ids:
+            for key in [key for key, state in states.items() if state['_id'] in removed_ids]:
+                del states[key]
+
+        for document in documents:
+            states[get_key(document)] = document
+
+    def get_names(self, state_ids):
+        """
+        Gets the sorted long names of the loaded states with the given ids
+
+        :param state_ids: ids of the states
+        :return: sorted list of long names
+        """
+        return sorted(self.state_names.get(state_id, state_id) for state_id in state_ids)
+
+    def get_row_names(self, row_ids):
+        """
+        Gets the sorted long names of the rows with the given IDs
+
+        :param row_ids: IDs of the rows
+        :return: sorted list of long names
+        """
+        return sorted(self.row_names.get(row_id, row_id) for row_id in row_ids)
+
+    def match_entity_state(self, row_id, fields, parent_row_id, group_row_ids):
+        """
+        Checks if the code entity state of a row is unchanged compared to the parent commit.
+
+        :param row_id: ID of the row
+        :param fields: dictionary with the fields of the state (long_name, file_id, ce_type, start_line, end_line,\
+        start_column, end_column), the metrics under the key metrics and, for a file state, its PMD warnings under\
+        the key linter
+        :param parent_row_id: ID of the row of the parent entity (None, if it has no parent entity)
+        :param group_row_ids: IDs of the rows of the groups (packages, components) of the state
+        :return: id of the state of the parent commit if it is unchanged, otherwise None
+        """
+        key = (fields['long_name'], fields['file_id'])
+        self.row_names[row_id] = fields['long_name']
+        self.seen_entity_states.add(key)
+
+        state = self.entity_states.get(key, None)
+        if state is None:
+            return None
+
+        for name in ('ce_type', 'start_line', 'end_line', 'start_column', 'end_column'):
+            if state.get(name, None) != fields[name]:
+                return None
+
+        # A state without metrics (e.g., of an attribute) is stored without the metrics field
+        if (state.get('metrics', None) or {}) != fields['metrics']:
+            return None
+
+        # The linter results of a file state are set after the states are written, so they must not change
+        if 'linter' in fields and (state.get('linter', None) or []) != fields['linter']:
+            return None
+
+        parent_name = self.state_names.get(state['ce_parent_id']) if state.get('ce_parent_id') else None
+        if parent_name != (self.row_names.get(parent_row_id) if parent_row_id is not None else None):
+            return None
+
+        if self.get_names(state.get('cg_ids', [])) != self.get_row_names(group_row_ids):
+            return None
+
+        self.inherited_entity_states += 1
+        self.inherited_entity_ids.add(state['_id'])
+        return state['_id']
+
+    def is_inherited_entity_state(self, state_id):
+        """
+        Checks if a code entity state was inherited from the parent commit, i.e., it belongs to a commit of the chain
+
+        :param state_id: id of the state
+        :return: boolean
+        """
+        return state_id in self.inherited_entity_ids
+
+    def match_group_state(self, row_id, fields, parent_row_ids):
+        """
+        Checks if the code group state of a row is unchanged compared to the parent commit.
+
+        :param row_id: ID of the row
+        :param fields: dictionary with the fields of the state (long_name, cg_type) and the metrics under the key\
+        metrics
+        :param parent_row_ids: IDs of the rows of the parent groups of the state
+        :return: id of the state of the parent commit if it is unchanged, otherwise None
+        """
+        key = fields['long_name']
+        self.row_names[row_id] = key
+        self.seen_group_states.add(key)
+
+        state = self.group_states.get(key, None)
+        if state is None:
+            return None
+
+        if state.get('cg_type', None) != fields['cg_type'] or (state.get('metrics', None) or {}) != fields['metrics']:
+            return None
+
+        if self.get_names(state.get('cg_parent_ids', [])) != self.get_row_names(parent_row_ids):
+            return None
+
+        self.inherited_group_states += 1
+        return state['_id']
+
+    def get_removed_ids(self):
+        """
+        Gets the ids of the states of the parent commit that are not part of the analyzed commit.
+
+        :return: tuple of the list of code entity state ids and the list of code group state ids
+        """
+        removed_entity_ids = [state['_id'] for key, state in self.entity_states.items()
+                              if key not in self.seen_entity_states]
+        removed_group_ids = [state['_id'] for key, state in self.group_states.items()
+                             if key not in self.seen_group_states]
+        return self.removed_entity_ids + removed_entity_ids, removed_group_ids
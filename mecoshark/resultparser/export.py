@@ -0,0 +1,337 @@
+import gzip
+import json
+import logging
+import os
+import timeit
+
+import bson
+from bson import ObjectId, json_util
+from pymongo import UpdateOne
+
+logger = logging.getLogger("sourcemeter_parser")
+
+# Formats of the exported files with the extension of the files as value
+EXPORT_FORMATS = {
+    'json': '.json.gz',
+    'bson': '.bson.gz',
+}
+
+# Name of the file that lists the exported files of a revision
+MANIFEST_FILE = 'manifest.json'
+
+
+def to_document(query, fields, document_id):
+    """
+    Creates the document that an upsert would insert. Dotted field names (e.g., metrics.LOC) are nested.
+
+    :param query: query of the upsert
+    :param fields: dictionary of fields that are set
+    :param document_id: id of the document
+    :return: document
+    """
+    document = {'_id': document_id}
+    document.update(query)
+    for name, value in fields.items():
+        if '.' in name:
+            parent, child = name.split('.', 1)
+            document.setdefault(parent, {})[child] = value
+        else:
+            document[name] = value
+    return document
+
+
+def to_fields(document, nested_fields=('metrics',)):
+    """
+    Creates the dictionary of fields that are set for an exported document (inverse of :func:`to_document`), so that
+    the metrics of a stored state are updated metric by metric like in a live run.
+
+    :param document: exported document without its id
+    :param nested_fields: fields whose values are set field by field
+    :return: dictionary of fields
+    """
+    fields = {}
+    for name, value in document.items():
+        if name in nested_fields and isinstance(value, dict):
+            for child, child_value in value.items():
+                fields['{}.{}'.format(name, child)] = child_value
+        else:
+            fields[name] = value
+    return fields
+
+
+class ExportFile(object):
+    """
+    Gzip compressed file of exported documents. In the json format, every document is one line of MongoDB extended
+    json (like mongoexport writes it, i.e., it can be loaded with mongoimport). In the bson format, the documents are
+    concatenated (like mongodump writes them, i.e., it can be loaded with mongorestore --gzip).
+
+    :property path: path to the file
+    :property file_format: json or bson
+    :property documents: number of written documents
+    """
+    def __init__(self, path, file_format):
+        """
+        Initialization
+
+        :param path: path to the file
+        :param file_format: json or bson
+        """
+        self.path = path
+        self.file_format = file_format
+        self.documents = 0
+        self.handle = gzip.open(path, 'wb')
+
+    def write(self, document):
+        """
+        Writes a document
+
+        :param document: document
+        """
+        if self.file_format == 'bson':
+            self.handle.write(bson.encode(document))
+        else:
+            self.handle.write(json_util.dumps(document, json_options=json_util.RELAXED_JSON_OPTIONS).encode('utf-8'))
+            self.handle.write(b'\n')
+        self.documents += 1
+
+    def close(self):
+        """
+        Closes the file
+        """
+        self.handle.close()
+
+
+def read_export_file(path):
+    """
+    Reads the documents of an exported file
+
+    :param path: path to the file (the format is taken from the extension)
+    :return: generator of documents
+    """
+    with gzip.open(path, 'rb') as handle:
+        if path.endswith(EXPORT_FORMATS['bson']):
+            for document in bson.decode_file_iter(handle):
+                yield document
+        else:
+            for line in handle:
+                if line.strip():
+                    yield json_util.loads(line.decode('utf-8'))
+
+
+class ExportWriter(object):
+    """
+    Writer with the interface of :class:`~mecoshark.resultparser.bulkwriter.BulkWriter` that writes the documents of
+    the upserts into an :class:`ExportFile` instead of the database. Documents that were not assigned an id get a new
+    one, so that the ids in the export are final.
+
+    :property export_file: :class:`ExportFile` to which the documents are written
+    :property id_field: field or tuple of fields that identifies a document
+    :property write_time: seconds spent writing the documents
+    """
+    def __init__(self, export_file, id_field='s_key'):
+        """
+        Initialization
+
+        :param export_file: :class:`ExportFile` to which the documents are written
+        :param id_field: field or tuple of fields that identifies a document
+        """
+        self.export_file = export_file
+        self.id_field = id_field
+        self.write_time = 0.0
+
+    def is_pending(self, key):
+        """
+        See :func:`~mecoshark.resultparser.bulkwriter.BulkWriter.is_pending`. Documents are written right away.
+
+        :param key: key that was given to :func:`upsert`
+        :return: False
+        """
+        return False
+
+    def upsert(self, query, fields, key=None, document_id=None):
+        """
+        Writes the document of an upsert (see :func:`~mecoshark.resultparser.bulkwriter.BulkWriter.upsert`).
+
+        :param query: query that identifies the document
+        :param fields: dictionary of fields that should be set
+        :param key: key under which the id of the document is returned
+        :param document_id: id of the document (None: a new id is assigned)
+        :return: dictionary with key as key and the document id as value (empty if no key is given)
+        """
+        if document_id is None:
+            document_id = ObjectId()
+
+        start_time = timeit.default_timer()
+        self.export_file.write(to_document(query, fields, document_id))
+        self.write_time += timeit.default_timer() - start_time
+
+        if key is None:
+            return {}
+        return {key: document_id}
+
+    def flush(self):
+        """
+        See :func:`~mecoshark.resultparser.bulkwriter.BulkWriter.flush`. Nothing is pending.
+
+        :return: empty dictionary
+        """
+        return {}
+
+
+class Export(object):
+    """
+    Offline export of the states of a revision. Instead of writing to the database, the documents of every collection
+    are written to a compressed file in the directory <export_dir>/<revision>. The ids of the documents are resolved
+    like in a live run (ids of stored states are queried, new states get a new id), so that the export can be
+    loaded with :func:`import_export` (or mongoimport/mongorestore) later. Updates of stored documents (e.g., the
+    linter warnings) are written to <collection>.updates files.
+    A manifest lists the files of the export. It is written when the export is closed, i.e., an export without
+    manifest is not complete.
+
+    :property path: directory of the export of the revision
+    :property file_format: json or bson
+    :property files: dictionary with the name of the file (without extension) as key and the :class:`ExportFile`\
+    as value
+    :property id_fields: dictionary with the name of the collection as key and its id field as value
+    """
+    def __init__(self, export_dir, revision_hash, file_format='json'):
+        """
+        Initialization
+
+        :param export_dir: directory to which the exports are written
+        :param revision_hash: hash of the revision that is exported
+        :param file_format: json or bson
+        """
+        if file_format not in EXPORT_FORMATS:
+            raise ValueError("Unknown export format %s" % file_format)
+
+        self.path = os.path.join(export_dir, revision_hash)
+        self.file_format = file_format
+        self.files = {}
+        self.id_fields = {}
+        os.makedirs(self.path, exist_ok=True)
+
+    def get_file(self, name):
+        """
+        Gets (or creates) the export file with the given name
+
+        :param name: name of the file without extension
+        :return: :class:`ExportFile`
+        """
+        if name not in self.files:
+            self.files[name] = ExportFile(os.path.join(self.path, name + EXPORT_FORMATS[self.file_format]),
+                                          self.file_format)
+        return self.files[name]
+
+    def create_writer(self, collection_name, id_field='s_key'):
+        """
+        Creates the writer for the documents of a collection
+
+        :param collection_name: name of the collection
+        :param id_field: field or tuple of fields that identifies a document
+        :return: :class:`ExportWriter`
+        """
+        self.id_fields[collection_name] = id_field
+        return ExportWriter(self.get_file(collection_name), id_field)
+
+    def update(self, collection_name, document_id, fields):
+        """
+        Exports the update of a document, which is applied with $set by the importer
+
+        :param collection_name: name of the collection
+        :param document_id: id of the document
+        :param fields: dictionary of fields that are set
+        """
+        document = {'_id': document_id}
+        document.update(fields)
+        self.get_file(collection_name + '.updates').write(document)
+
+    def close(self):
+        """
+        Closes all files and writes the manifest
+        """
+        manifest = {'format': self.file_format, 'collections': {}, 'updates': {}}
+        for name, export_file in self.files.items():
+            export_file.close()
+            if name.endswith('.updates'):
+                manifest['updates'][name[:-len('.updates')]] = {
+                    'file': os.path.basename(export_file.path), 'documents': export_file.documents}
+            else:
+                id_field = self.id_fields[name]
+                manifest['collections'][name] = {
+                    'file': os.path.basename(export_file.path), 'documents': export_file.documents,
+                    'id_field': id_field if isinstance(id_field, str) else list(id_field)}
+
+        with open(os.path.join(self.path, MANIFEST_FILE), 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+        logger.info("Exported %s to %s" % (', '.join('%d documents of %s' % (info['documents'], name)
+                                                     for name, info in manifest['collections'].items()), self.path))
+
+
+def import_export(database, path, batch_size=10000):
+    """
+    Loads the export of a revision into the database. The documents are upserted (keyed on the id field of their
+    collection, the id of the document is only set if it is inserted), so that the result is the same as the one
+    of a live run, even if states were stored before. The upserts and updates are sent with large unordered bulk
+    writes.
+
+    :param database: :class:`pymongo.database.Database`
+    :param path: directory of the export of the revision (contains the manifest)
+    :param batch_size: number of operations per bulk write
+    :return: dictionary with the name of the collection as key and the number of imported documents as value
+    """
+    with open(os.path.join(path, MANIFEST_FILE)) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    imported = {}
+    for collection_name, info in manifest['collections'].items():
+        id_field = info['id_field'] if isinstance(info['id_field'], str) else tuple(info['id_field'])
+
+        def create_request(document):
+            document_id = document.pop('_id')
+            if isinstance(id_field, str):
+                query = {id_field: document[id_field]}
+            else:
+                query = {field: document[field] for field in id_field}
+            return UpdateOne(query, {'$set': to_fields(document), '$setOnInsert': {'_id': document_id}}, upsert=True)
+
+        imported[collection_name] = write_requests(database[collection_name], os.path.join(path, info['file']),
+                                                   create_request, batch_size)
+
+    # Updates are applied after all documents are imported, as they may refer to any of them
+    for collection_name, info in manifest.get('updates', {}).items():
+        def create_update(document):
+            document_id = document.pop('_id')
+            return UpdateOne({'_id': document_id}, {'$set': document})
+
+        write_requests(database[collection_name], os.path.join(path, info['file']), create_update, batch_size)
+
+    logger.info("Imported %s from %s" % (', '.join('%d documents of %s' % (documents, name)
+                                                   for name, documents in imported.items()), path))
+    return imported
+
+
+def write_requests(collection, path, create_request, batch_size):
+    """
+    Writes the requests for the documents of an exported file with unordered bulk writes.
+
+    :param collection: :class:`pymongo.collection.Collection`
+    :param path: path to the exported file
+    :param create_request: function that creates the request for a document
+    :param batch_size: number of requests per bulk write
+    :return: number of documents
+    """
+    requests = []
+    documents = 0
+    for document in read_export_file(path):
+        requests.append(create_request(document))
+        documents += 1
+
+        if len(requests) >= batch_size:
+            collection.bulk_write(requests, ordered=False)
+            requests = []
+
+    if requests:
+        collection.bulk_write(requests, ordered=False)
+    return documents
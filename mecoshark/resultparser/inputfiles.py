@@ -0,0 +1,108 @@
+import logging
+import os
+import subprocess
+
+logger = logging.getLogger("sourcemeter_parser")
+
+# Directories that are never part of the analyzed files
+IGNORED_DIRECTORIES = ('.git', '.hg', '.svn')
+
+
+def list_git_files(input_path, revision=None):
+    """
+    Lists the files that are tracked by git in the input path. If a revision is given, the files of the tree of this
+    revision are listed (git ls-tree), otherwise the files of the index (git ls-files).
+
+    :param input_path: path to the git working tree
+    :param revision: revision (e.g., commit hash) whose files are listed
+    :return: list of paths relative to the input path (starting with "/") or None, if the input path is not a git\
+    working tree or the revision is not known
+    """
+    if revision is not None:
+        command = ['git', '-C', input_path, 'ls-tree', '-r', '-z', '--name-only', revision]
+    else:
+        command = ['git', '-C', input_path, 'ls-files', '-z']
+
+    try:
+        output = subprocess.check_output(command, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return ['/' + os.fsdecode(path) for path in output.split(b'\0') if path]
+
+
+def list_changed_files(input_path, old_revision, new_revision):
+    """
+    Lists the files that differ between two revisions (git diff). Renamed files are listed with their old and their
+    new path.
+
+    :param input_path: path to the git working tree
+    :param old_revision: revision (e.g., commit hash) that is compared
+    :param new_revision: revision (e.g., commit hash) that is compared to the old one
+    :return: set of paths relative to the input path (starting with "/") or None, if the input path is not a git\
+    working tree or one of the revisions is not known
+    """
+    command = ['git', '-C', input_path, 'diff', '--name-only', '--no-renames', '-z', old_revision, new_revision]
+
+    try:
+        output = subprocess.check_output(command, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return {'/' + os.fsdecode(path) for path in output.split(b'\0') if path}
+
+
+def walk_input_files(input_path, ignored_directories=IGNORED_DIRECTORIES):
+    """
+    Lists all files in the input path via :func:`os.scandir`. Ignored directories are pruned while the tree is
+    traversed. Symbolic links to directories are not followed (like :func:`os.walk` does).
+
+    :param input_path: path that is traversed
+    :param ignored_directories: names of directories that are not traversed
+    :return: sorted list of paths relative to the input path (starting with "/"), i.e., in the same order as git\
+    lists them
+    """
+    files = []
+    directories = [('', input_path)]
+    while directories:
+        relative_path, path = directories.pop()
+
+        try:
+            entries = list(os.scandir(path))
+        except OSError as e:
+            logger.warning("Could not list directory %s: %s" % (path, e))
+            continue
+
+        for entry in entries:
+            if entry.is_dir():
+                if not entry.is_symlink() and entry.name not in ignored_directories:
+                    directories.append((relative_path + '/' + entry.name, entry.path))
+            else:
+                files.append(relative_path + '/' + entry.name)
+
+    files.sort()
+    return files
+
+
+def list_input_files(input_path, revision=None, use_git=True, repository_path=None):
+    """
+    Lists the files of the input path. If the input path is a git working tree, the files are taken from git (see\
+    :func:`list_git_files`). Otherwise (or if git fails), the input path is traversed (see :func:`walk_input_files`).
+
+    :param input_path: path to the revision that is used as input
+    :param revision: revision whose files are listed from git
+    :param use_git: if git should be used to list the files
+    :param repository_path: path to the git repository of the input path, if the input path is a checkout without\
+    git metadata (e.g., an extracted git archive). The files of the revision are listed from the repository
+    :return: list of paths relative to the input path (starting with "/")
+    """
+    git_path = repository_path if repository_path is not None and revision is not None else input_path
+    if use_git and os.path.exists(os.path.join(git_path, '.git')):
+        files = list_git_files(git_path, revision)
+        if files is not None:
+            logger.debug("Listed %d files of revision %s from git" % (len(files), revision))
+            return files
+
+        logger.warning("Could not list the files of %s from git. Traversing the input path." % input_path)
+
+    return walk_input_files(input_path)
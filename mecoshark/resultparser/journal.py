@@ -0,0 +1,156 @@
+import json
+import logging
+import os
+import shutil
+
+logger = logging.getLogger("sourcemeter_parser")
+
+
+class IngestJournal(object):
+    """
+    Append-only journal of the ingest of one revision. It is stored in a directory in the output path and keeps the
+    raw results of the analyzer, so that a run that died (e.g., out of memory) can be restarted without running the
+    analyzer again and without writing the batches again that were already written.
+
+    Every entry is one json line, which is flushed and synced to disk before the journal continues:
+
+    * analysis: the results of the analyzer were moved to results_path
+    * batch: a batch of rows was written. rows is the number of rows that were written so far (in the order of\
+      :func:`~mecoshark.resultparser.sourcemeterparser.SourcemeterParser.stream_states`) and offsets is a dictionary\
+      with the type of the states (key of CSV_FILES) as key and the number of its rows that were written so far as value
+    * step: a step of the ingest (e.g., states, clones, extra) is complete
+
+    A torn last line (the process died while writing it) is ignored.
+
+    :property path: directory of the journal
+    :property journal_file: path to the journal file
+    :property results_path: directory in which the results of the analyzer are kept
+    :property entries: list of the entries (dictionaries) of the journal
+    """
+
+    JOURNAL_FILE = 'journal.jsonl'
+
+    RESULTS_DIRECTORY = 'results'
+
+    def __init__(self, path):
+        """
+        Initialization. Reads the entries of an existing journal.
+
+        :param path: directory of the journal (created if it does not exist)
+        """
+        self.path = path
+        self.journal_file = os.path.join(path, self.JOURNAL_FILE)
+        self.results_path = os.path.join(path, self.RESULTS_DIRECTORY)
+        self.entries = []
+        self.handle = None
+
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(self.journal_file):
+            self.entries = self.read_entries(self.journal_file)
+            logger.info("Found journal with %d entries in %s" % (len(self.entries), path))
+
+    @staticmethod
+    def read_entries(journal_file):
+        """
+        Reads the entries of a journal file. Reading stops at the first line that is not complete.
+
+        :param journal_file: path to the journal file
+        :return: list of entries
+        """
+        entries = []
+        with open(journal_file) as handle:
+            for line in handle:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logger.warning("Ignoring incomplete entry at the end of the journal %s" % journal_file)
+                    break
+        return entries
+
+    def append(self, event, **fields):
+        """
+        Appends an entry to the journal and syncs it to disk.
+
+        :param event: type of the entry (analysis, batch, step)
+        :param fields: fields of the entry
+        """
+        entry = dict(fields, event=event)
+        if self.handle is None:
+            self.handle = open(self.journal_file, 'a')
+        self.handle.write(json.dumps(entry) + '\n')
+        self.handle.flush()
+        os.fsync(self.handle.fileno())
+        self.entries.append(entry)
+
+    def has_results(self):
+        """
+        Checks if the results of the analyzer were kept by a former run
+
+        :return: boolean
+        """
+        return os.path.isdir(self.results_path) and any(entry['event'] == 'analysis' for entry in self.entries)
+
+    def keep_results(self, output_path):
+        """
+        Moves the results of the analyzer into the journal.
+
+        :param output_path: directory with the results of the analyzer
+        :return: path to the kept results
+        """
+        os.makedirs(self.path, exist_ok=True)
+        shutil.rmtree(self.results_path, True)
+        shutil.move(output_path, self.results_path)
+        self.append('analysis', source=output_path)
+        return self.results_path
+
+    @property
+    def committed_rows(self):
+        """
+        Number of rows that were written by a former run
+
+        :return: int
+        """
+        batches = [entry for entry in self.entries if entry['event'] == 'batch']
+        return batches[-1]['rows'] if batches else 0
+
+    def commit_batch(self, rows, offsets):
+        """
+        Records that a batch was written.
+
+        :param rows: number of rows that were written so far
+        :param offsets: dictionary with the type of the states as key and the number of its rows that were written so\
+        far as value
+        """
+        self.append('batch', rows=rows, offsets=offsets)
+
+    def is_committed(self, step):
+        """
+        Checks if a step of the ingest was completed by a former run
+
+        :param step: name of the step
+        :return: boolean
+        """
+        return any(entry['event'] == 'step' and entry['name'] == step for entry in self.entries)
+
+    def commit_step(self, step):
+        """
+        Records that a step of the ingest is complete.
+
+        :param step: name of the step
+        """
+        self.append('step', name=step)
+
+    def close(self):
+        """
+        Closes the journal file
+        """
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+    def complete(self):
+        """
+        Removes the journal and the kept results after the ingest is complete
+        """
+        self.close()
+        shutil.rmtree(self.path, True)
@@ -0,0 +1,187 @@
+import logging
+import os
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger("sourcemeter_parser")
+
+# Formats of the metric tables with the extension of the files as value
+TABLE_FORMATS = {
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+
+# Columns of a metric table that describe the state (in this order, followed by one column per metric)
+STATE_COLUMNS = ('s_key', 'long_name', 'file_path', 'file_id', 'start_line', 'end_line', 'start_column', 'end_column')
+
+
+def is_available():
+    """
+    Checks if the metric tables can be written (i.e., if pyarrow is installed)
+
+    :return: boolean
+    """
+    return pyarrow is not None
+
+
+class MetricTable(object):
+    """
+    Table of the code entity states of one type (e.g., method) of a commit with one column per metric. The rows are
+    collected column by column and written as record batches of batch_size rows, so that the memory usage does not
+    depend on the number of states. The metric columns are the metrics of the rows of the first batch (all rows of
+    one type come from the same SourceMeter csv file). Metrics that are no numbers are null.
+
+    :property path: path to the file of the table
+    :property file_format: parquet or arrow (Arrow IPC file, which can be memory-mapped)
+    :property batch_size: number of rows per record batch
+    :property columns: dictionary with the name of the column as key and the list of its pending values as value
+    :property metric_names: names of the metric columns
+    :property rows: number of pending rows
+    :property written_rows: number of written rows
+    :property writer: writer of the file (created with the schema of the first batch)
+    :property schema: :class:`pyarrow.Schema` of the table (set when the first batch is written)
+    """
+    def __init__(self, path, file_format='parquet', batch_size=10000):
+        """
+        Initialization
+
+        :param path: path to the file of the table
+        :param file_format: parquet or arrow
+        :param batch_size: number of rows per record batch
+        """
+        self.path = path
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.columns = {name: [] for name in STATE_COLUMNS}
+        self.metric_names = []
+        self.rows = 0
+        self.written_rows = 0
+        self.writer = None
+        self.schema = None
+
+    def add(self, fields, metrics):
+        """
+        Adds the row of a state
+
+        :param fields: dictionary with the values of the STATE_COLUMNS
+        :param metrics: dictionary with the name of the metric as key and its value as value
+        """
+        for name in STATE_COLUMNS:
+            self.columns[name].append(fields.get(name, None))
+
+        if self.writer is None:
+            for name in metrics:
+                if name not in self.columns:
+                    self.metric_names.append(name)
+                    self.columns[name] = [None] * self.rows
+
+        for name in self.metric_names:
+            value = metrics.get(name, None)
+            self.columns[name].append(value if isinstance(value, float) else None)
+
+        self.rows += 1
+        if self.rows >= self.batch_size:
+            self.flush()
+
+    def create_schema(self):
+        """
+        Creates the schema of the table
+
+        :return: :class:`pyarrow.Schema`
+        """
+        fields = [pyarrow.field(name, pyarrow.string()) for name in ('s_key', 'long_name', 'file_path', 'file_id')]
+        fields.extend(pyarrow.field(name, pyarrow.int64())
+                      for name in ('start_line', 'end_line', 'start_column', 'end_column'))
+        fields.extend(pyarrow.field(name, pyarrow.float64()) for name in self.metric_names)
+        return pyarrow.schema(fields)
+
+    def flush(self):
+        """
+        Writes the pending rows as one record batch
+        """
+        if not self.rows:
+            return
+
+        if self.writer is None:
+            self.schema = self.create_schema()
+            if self.file_format == 'arrow':
+                self.writer = pyarrow.ipc.new_file(self.path, self.schema)
+            else:
+                self.writer = pyarrow.parquet.ParquetWriter(self.path, self.schema)
+
+        batch = pyarrow.RecordBatch.from_arrays(
+            [pyarrow.array(self.columns[field.name], type=field.type) for field in self.schema], schema=self.schema)
+        if self.file_format == 'arrow':
+            self.writer.write_batch(batch)
+        else:
+            self.writer.write_table(pyarrow.Table.from_batches([batch]))
+
+        self.written_rows += self.rows
+        self.rows = 0
+        self.columns = {name: [] for name in self.columns}
+
+    def close(self):
+        """
+        Writes the pending rows and closes the file
+        """
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+
+class MetricTables(object):
+    """
+    Metric tables of the code entity states of a commit: one file per type of the states (e.g., method.parquet) in the
+    directory <directory>/<revision>, so that analytics can read (or memory-map) the metrics of a commit without
+    querying the database.
+
+    :property path: directory of the tables of the commit
+    :property file_format: parquet or arrow
+    :property batch_size: number of rows per record batch
+    :property tables: dictionary with the type of the states as key and the :class:`MetricTable` as value
+    """
+    def __init__(self, directory, revision_hash, file_format='parquet', batch_size=10000):
+        """
+        Initialization
+
+        :param directory: directory to which the tables are written
+        :param revision_hash: hash of the revision
+        :param file_format: parquet or arrow
+        :param batch_size: number of rows per record batch
+        """
+        if file_format not in TABLE_FORMATS:
+            raise ValueError("Unknown table format %s" % file_format)
+
+        self.path = os.path.join(directory, revision_hash)
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.tables = {}
+        os.makedirs(self.path, exist_ok=True)
+
+    def add(self, ce_type, fields, metrics):
+        """
+        Adds the row of a state to the table of its type
+
+        :param ce_type: type of the state
+        :param fields: dictionary with the values of the STATE_COLUMNS
+        :param metrics: dictionary with the name of the metric as key and its value as value
+        """
+        if ce_type not in self.tables:
+            self.tables[ce_type] = MetricTable(os.path.join(self.path, ce_type + TABLE_FORMATS[self.file_format]),
+                                               self.file_format, self.batch_size)
+        self.tables[ce_type].add(fields, metrics)
+
+    def close(self):
+        """
+        Closes all tables
+        """
+        for table in self.tables.values():
+            table.close()
+
+        logger.info("Wrote metric tables to %s: %s" % (self.path, ', '.join(
+            '%d %s states' % (table.written_rows, ce_type) for ce_type, table in sorted(self.tables.items()))))
@@ -0,0 +1,129 @@
+import logging
+import queue
+import threading
+import timeit
+
+logger = logging.getLogger("sourcemeter_parser")
+
+
+class BatchPipeline(object):
+    """
+    Producer/consumer pipeline between reading the rows and writing them to the database. A producer thread reads
+    the rows, converts them (e.g., builds their metrics) and puts them in batches into a bounded queue, which is
+    drained by the consumer (the writer). Thereby, parsing and converting the next batches overlaps with writing the
+    current one. If the queue is full, the producer waits (backpressure), so that at most depth batches are held in
+    memory in addition to the ones that are produced and written.
+
+    :property rows: iterable of the rows
+    :property batch_size: number of rows per batch
+    :property depth: maximal number of batches in the queue
+    :property convert: function that is applied to every row by the producer (None: rows are not converted)
+    :property batches: :class:`queue.Queue` of the produced batches
+    :property stopped: :class:`threading.Event` that is set if the consumer stopped
+    :property upstream_wait: seconds the consumer waited for the producer
+    :property producer_wait: seconds the producer waited, as the queue was full
+    :property produced_batches: number of batches that were produced
+    """
+
+    # Marks the end of the batches in the queue
+    END = object()
+
+    # Seconds after which a producer that waits on a full queue checks if the consumer stopped
+    PUT_TIMEOUT = 0.1
+
+    def __init__(self, rows, batch_size, depth, convert=None):
+        """
+        Initialization
+
+        :param rows: iterable of the rows
+        :param batch_size: number of rows per batch
+        :param depth: maximal number of batches in the queue (at least 1)
+        :param convert: function that is applied to every row by the producer
+        """
+        self.rows = rows
+        self.batch_size = batch_size
+        self.depth = max(depth, 1)
+        self.convert = convert
+        self.batches = queue.Queue(maxsize=self.depth)
+        self.stopped = threading.Event()
+        self.upstream_wait = 0.0
+        self.producer_wait = 0.0
+        self.produced_batches = 0
+        self.thread = None
+
+    def start(self):
+        """
+        Starts the producer thread
+        """
+        self.thread = threading.Thread(target=self.produce, name='batch-producer', daemon=True)
+        self.thread.start()
+
+    def put(self, item):
+        """
+        Puts an item into the queue. Waits while the queue is full, unless the consumer stopped.
+
+        :param item: batch, exception or END
+        :return: False, if the consumer stopped
+        """
+        start_time = timeit.default_timer()
+        try:
+            while not self.stopped.is_set():
+                try:
+                    self.batches.put(item, timeout=self.PUT_TIMEOUT)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            self.producer_wait += timeit.default_timer() - start_time
+
+    def produce(self):
+        """
+        Reads and converts the rows and puts them in batches into the queue. Exceptions are passed to the consumer.
+        """
+        try:
+            batch = []
+            for row in self.rows:
+                batch.append(self.convert(row) if self.convert is not None else row)
+
+                if len(batch) >= self.batch_size:
+                    if not self.put(batch):
+                        return
+                    self.produced_batches += 1
+                    batch = []
+
+            if batch:
+                if not self.put(batch):
+                    return
+                self.produced_batches += 1
+            self.put(self.END)
+        except BaseException as e:
+            self.put(e)
+
+    def __iter__(self):
+        """
+        Starts the producer and yields the batches.
+
+        :return: generator of lists of rows
+        """
+        if self.thread is None:
+            self.start()
+
+        while True:
+            start_time = timeit.default_timer()
+            item = self.batches.get()
+            self.upstream_wait += timeit.default_timer() - start_time
+
+            if item is self.END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def stop(self):
+        """
+        Stops the producer (e.g., if the consumer failed) and waits for it
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
@@ -0,0 +1,146 @@
+import csv
+
+# Columns that describe the structure of a state and are not stored as metrics
+STRUCTURAL_COLUMNS = ('ID', 'Name', 'LongName', 'Parent', 'Component', 'Path', 'Line', 'Column', 'EndLine',
+                      'EndColumn')
+
+# Columns that are neither structural nor stored as metrics
+IGNORED_COLUMNS = ('WarningBlocker', 'WarningCritical', 'WarningInfo', 'WarningMajor', 'WarningMinor')
+
+
+def to_metric(value):
+    """
+    Converts a value of a metric column. Empty values are converted to 0, values that are no numbers are kept.
+
+    :param value: string value of the csv file
+    :return: float or the value itself
+    """
+    if not value:
+        return float(0)
+
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+class ColumnProjection(object):
+    """
+    Projection of a SourceMeter csv header onto its structural and metric columns. It is computed once per csv file
+    (i.e., per header), so that the metrics of a row can be built without copying the row and removing the
+    structural columns from it (see\
+    :func:`~mecoshark.resultparser.sourcemeterparser.SourcemeterParser.sanitize_metrics_dictionary`).
+
+    :property header: list of column names of the csv file
+    :property structural_names: names of the structural columns (in the order of the header)
+    :property metric_names: names of the metric columns (in the order of the header)
+    """
+    def __init__(self, header):
+        """
+        Initialization
+
+        :param header: list of column names of the csv file
+        """
+        self.header = list(header)
+        self.structural_names = [name for name in self.header if name in STRUCTURAL_COLUMNS]
+        self.metric_names = [name for name in self.header
+                             if name not in STRUCTURAL_COLUMNS and name not in IGNORED_COLUMNS]
+
+    def create_row(self, values):
+        """
+        Creates a row for the given values of a csv line. Missing values are set to None (like\
+        :class:`csv.DictReader` does), additional values are dropped.
+
+        :param values: list of strings of the csv line
+        :return: :class:`ProjectedRow`
+        """
+        if len(values) < len(self.header):
+            values = values + [None] * (len(self.header) - len(values))
+
+        row = ProjectedRow(zip(self.header, values))
+        row.projection = self
+        return row
+
+    def metrics(self, row):
+        """
+        Builds the metrics dictionary of a row.
+
+        :param row: dictionary with the column name as key and the string value as value
+        :return: dictionary with the name of the metric as key and its value as value
+        """
+        try:
+            return {name: float(row[name] or 0) for name in self.metric_names}
+        except ValueError:
+            return {name: to_metric(row[name]) for name in self.metric_names}
+
+
+class ProjectedRow(dict):
+    """
+    Row of a csv file that knows the :class:`ColumnProjection` of its header.
+    """
+    __slots__ = ('projection',)
+
+    def metrics(self):
+        """
+        Builds the metrics dictionary of the row
+
+        :return: dictionary with the name of the metric as key and its value as value
+        """
+        return self.projection.metrics(self)
+
+
+class ParsedRow(dict):
+    """
+    Row whose metrics were already built (e.g., in another process). It only keeps the columns that are no metrics,
+    so that only these and the converted metrics are pickled.
+
+    :property metric_values: dictionary of metrics of the row
+    """
+    __slots__ = ('metric_values',)
+
+    def __reduce__(self):
+        return ParsedRow, (dict(self),), self.metric_values
+
+    def __setstate__(self, state):
+        self.metric_values = state
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        Creates a parsed row of a row that can build its metrics (e.g., :class:`ProjectedRow`)
+
+        :param row: row that is parsed
+        :return: :class:`ParsedRow`
+        """
+        metric_values = row.metrics()
+        parsed_row = cls((name, value) for name, value in row.items() if name not in metric_values)
+        parsed_row.metric_values = metric_values
+        return parsed_row
+
+    def metrics(self):
+        """
+        Returns the metrics dictionary of the row
+
+        :return: dictionary with the name of the metric as key and its value as value
+        """
+        return self.metric_values
+
+
+def read_projected_rows(path):
+    """
+    Reads a SourceMeter csv file row by row. The projection of the header is computed once for the file.
+
+    :param path: path to the csv file
+    :return: generator of :class:`ProjectedRow`
+    """
+    with open(path) as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, None)
+        if header is None:
+            return
+
+        projection = ColumnProjection(header)
+        for values in reader:
+            # csv.DictReader skips empty lines as well
+            if values:
+                yield projection.create_row(values)
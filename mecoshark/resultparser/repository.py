@@ -0,0 +1,94 @@
+import logging
+
+from mongoengine import DoesNotExist
+from pycoshark.mongomodels import Project, VCSSystem, Commit, File
+
+logger = logging.getLogger("sourcemeter_parser")
+
+
+class RepositoryContext(object):
+    """
+    Data of a repository that is shared by the parsers of several revisions of it (e.g., in batch mode), so that it is
+    only queried once: the id of the vcs system, the ids of the commits and the ids of the stored files. The stored
+    files are looked up incrementally, i.e., only paths that were not looked up for a former revision are queried.
+
+    :property project_name: name of the project
+    :property url: url of the repository
+    :property vcs_system_id: id of the vcs system (:class:`bson.objectid.ObjectId`)
+    :property commit_ids: dictionary with the revision hash as key and the id of the commit as value
+    :property stored_files: dictionary with the path of a stored file as key and its id as value
+    :property looked_up_paths: paths that were looked up (also the ones that are not stored)
+    """
+
+    # Maximal number of paths or revisions that are put into one $in query
+    QUERY_SIZE = 10000
+
+    def __init__(self, project_name, url):
+        """
+        Initialization. Queries the id of the vcs system.
+
+        :param project_name: name of the project
+        :param url: url of the repository
+
+        .. NOTE:: Raises :class:`mongoengine.DoesNotExist` if the project or the vcs system does not exist.
+        """
+        self.project_name = project_name
+        self.url = url
+        self.commit_ids = {}
+        self.stored_files = {}
+        self.looked_up_paths = set()
+
+        project = Project.objects.get(name=project_name)
+        self.vcs_system_id = VCSSystem.objects(url=url, project_id=project.id).get().id
+
+    def resolve_commits(self, revisions):
+        """
+        Queries the ids of the commits of the given revisions with chunked $in queries
+
+        :param revisions: list of revision hashes
+        """
+        revisions = [revision for revision in revisions if revision not in self.commit_ids]
+        collection = Commit._get_collection()
+        for start in range(0, len(revisions), self.QUERY_SIZE):
+            query = {'vcs_system_id': self.vcs_system_id,
+                     'revision_hash': {'$in': revisions[start:start + self.QUERY_SIZE]}}
+            for document in collection.find(query, {'revision_hash': 1}):
+                self.commit_ids[document['revision_hash']] = document['_id']
+
+        logger.debug("Resolved %d of %d commits" % (len(self.commit_ids), len(revisions)))
+
+    def get_commit_id(self, revision):
+        """
+        Gets the id of the commit of a revision (queried, if it was not resolved before)
+
+        :param revision: revision hash
+        :return: id of the commit (:class:`bson.objectid.ObjectId`)
+
+        .. NOTE:: Raises :class:`mongoengine.DoesNotExist` if the commit does not exist.
+        """
+        if revision not in self.commit_ids:
+            self.resolve_commits([revision])
+
+        if revision not in self.commit_ids:
+            raise DoesNotExist("Commit with vcs_system_id %s and revision %s does not exist" %
+                               (self.vcs_system_id, revision))
+        return self.commit_ids[revision]
+
+    def get_stored_files(self, paths):
+        """
+        Gets the stored files. The paths that were not looked up before are queried with chunked $in queries.
+
+        :param paths: paths of the input files (relative to the input path)
+        :return: dictionary with the path of a stored file as key and its id as value (contains the stored files of\
+        all paths that were looked up so far)
+        """
+        new_paths = [path for path in paths if path not in self.looked_up_paths]
+        collection = File._get_collection()
+        for start in range(0, len(new_paths), self.QUERY_SIZE):
+            query = {'vcs_system_id': self.vcs_system_id, 'path': {'$in': new_paths[start:start + self.QUERY_SIZE]}}
+            for document in collection.find(query, {'path': 1}):
+                self.stored_files[document['path']] = document['_id']
+        self.looked_up_paths.update(new_paths)
+
+        logger.debug("Looked up %d new paths, %d stored files are known" % (len(new_paths), len(self.stored_files)))
+        return self.stored_files
@@ -1,34 +1,147 @@
-import copy
 import csv
 import glob
 import logging
 import os
 import sys
+import timeit
 
-from mongoengine import DoesNotExist
+from concurrent.futures import ProcessPoolExecutor
 
+from bson import ObjectId
+from mongoengine import DoesNotExist
+from pymongo import UpdateOne
+
+from mecoshark.resultparser.inputfiles import list_input_files, list_changed_files
+from mecoshark.resultparser.projection import ParsedRow, ProjectedRow, read_projected_rows
+from mecoshark.resultparser.bulkwriter import BulkWriter
+from mecoshark.resultparser.delta import CodeStateInheritance, DeltaBaseline
+from mecoshark.resultparser.carryforward import CarryForward
+from mecoshark.resultparser.pipeline import BatchPipeline
+from mecoshark.resultparser.export import Export
+from mecoshark.resultparser.metrictables import MetricTables, is_available as metric_tables_available
 from pycoshark.mongomodels import Project, VCSSystem, Commit, File, CodeGroupState, CodeEntityState, CloneInstance
 from pycoshark.utils import get_code_entity_state_identifier, get_code_group_state_identifier
 
 logger = logging.getLogger("sourcemeter_parser")
 
 
+def parse_csv_file(path, name):
+    """
+    Parses a whole csv file (see :func:`SourcemeterParser.read_csv_file`). Used by the process pool of the parser.
+
+    :param path: path to the csv file
+    :param name: type of the states (key of CSV_FILES)
+    :return: list of :class:`~mecoshark.resultparser.projection.ParsedRow`
+    """
+    return [ParsedRow.from_row(row) for row in SourcemeterParser.read_csv_file(path, name)]
+
+
 class SourcemeterParser(object):
     """
     Parser that parses the results from sourcemeter
 
     :property output_path: path to an output directory, where files can be stored
     :property input_path: path to the revisionn that is used as input
+    :property repository_path: path to the git repository of the input path (the input path, if it is a git working\
+    tree)
+    :property analyzed_path: path that was analyzed by SourceMeter (usually the input path)
     :property url: url to the repository of the project that is analyzed
     :property vcs_system_id: id of the vcs_system with the given url
     :property stored_files: list of files that are stored at the input path
-    :property ordered_file_states: dictionary that have all results in an ordered manner (a state that have another as parent must be after this parent state)
+    :property ordered_file_states: dictionary that have all results in an ordered manner (a state that have another as parent must be after this parent state). Only filled by :func:`prepare_csv_files`
     :property stored_file_states: states that were stored in the mongodb
     :property stored_meta_package_states: meta package states that were stored in the mongodb
     :property input_files: list of input files
+    :property input_file_index: dictionary with the file name of the input files as key and the list of the input\
+    files with this name (with their position in the input files) as value. Built by :func:`build_input_file_index`
+    :property fullpath_cache: dictionary with the long names that were resolved by :func:`get_fullpath` as key and\
+    the resolved long name as value
     :property commit_id: id of the commit for which the data should be stored. :class:`bson.objectid.ObjectId`
+    :property entity_state_writer: :class:`~mecoshark.resultparser.bulkwriter.BulkWriter` for the code entity states
+    :property group_state_writer: :class:`~mecoshark.resultparser.bulkwriter.BulkWriter` for the code group states
+    :property resolve_ids: if the ids of all states are resolved before the states are written
+    :property state_identities: dictionary with the ID of a row as key and the identity of the state (long name,\
+    file id, s_key) as value. Filled by :func:`resolve_state_ids`
+    :property batch_size: number of rows that are converted and written together
+    :property restrict_file_lookup: if only the files that are in the input path are queried by\
+    :func:`find_stored_files`
+    :property file_batch_size: batch size of the cursor that queries the stored files (None: default of the server)
+    :property use_git_index: if the input files are listed from git (see\
+    :func:`~mecoshark.resultparser.inputfiles.list_input_files`)
+    :property parse_workers: number of processes that parse the csv files concurrently (0: the csv files are\
+    streamed one after another)
+    :property parsed_csv_files: dictionary with the type of the states as key and the future of the parsed rows of\
+    its csv file as value. Filled by :func:`start_parsing`
+    :property file_state_keys: dictionary with the s_key of the stored states of files (type file) as key and the ID\
+    of their row as value. Used by :func:`parse_pmd_file` to find the ids of the states
+    :property ingest_mode: full (all states are written), delta (only states that changed compared to the parent\
+    commit are written) or carry-forward (the states of files that did not change compared to the parent commit are\
+    copied by the server)
+    :property delta_chain_limit: maximal number of commits whose written states make up the states of a commit in\
+    delta mode. If it is reached, all states are written again
+    :property delta_baseline: :class:`~mecoshark.resultparser.delta.DeltaBaseline` with the states of the parent\
+    commit (only in delta mode). Created by :func:`prepare_delta_baseline`
+    :property delta_parent_commit_id: id of the parent commit from which the unchanged states are inherited
+    :property delta_file_warnings: dictionary with the file path as key and the PMD warnings of the file as value\
+    (only in delta mode). A file state is only inherited if its warnings did not change
+    :property carry_forward: :class:`~mecoshark.resultparser.carryforward.CarryForward` that copied the states of\
+    the unchanged files (only in carry-forward mode). Created by :func:`prepare_carry_forward`
+    :property carried_paths: paths of the files whose states were copied from the parent commit. Their rows are not\
+    written, only added to the metric tables (see :func:`remove_carried_rows`)
+    :property carried_path_names: dictionary with the path of a row as key and its sanitized path as value. Filled by\
+    :func:`is_carried_forward`
+    :property journal: :class:`~mecoshark.resultparser.journal.IngestJournal` of the ingest (None: no journal)
+    :property streamed_rows: number of rows that were stored (or skipped, as they were written by a former run)
+    :property committed_rows: number of rows that were written by a former run (see journal)
+    :property row_offsets: dictionary with the type of the states as key and the number of its stored rows as value
+    :property pipeline_depth: maximal number of batches in the queue of the pipeline between reading and writing (0:\
+    the rows are read and written one after another)
+    :property query_time: seconds spent querying the ids of stored states (see :func:`assign_state_ids`)
+    :property export: :class:`~mecoshark.resultparser.export.Export` to which the documents are written instead of\
+    the database (None: documents are written to the database)
+    :property metric_tables: :class:`~mecoshark.resultparser.metrictables.MetricTables` to which the metrics of the\
+    code entity states are written (None: no metric tables are written)
+    :property context: :class:`~mecoshark.resultparser.repository.RepositoryContext` that is shared with the parsers\
+    of other revisions (None: everything is queried by this parser)
     """
-    def __init__(self, output_path, input_path, project_name, url, revision_hash, debug_level):
+
+    # Maximal number of s_keys that are put into one $in query
+    ID_QUERY_SIZE = 100000
+
+    # Maximal number of paths that are put into one $in query
+    PATH_QUERY_SIZE = 10000
+
+    # Csv files generated by SourceMeter with the type of the states as key
+    CSV_FILES = {
+        'class': '*-Class.csv',
+        'enum': '*-Enum.csv',
+        'interface': '*-Interface.csv',
+        'method': '*-Method.csv',
+        'annotation': '*-Annotation.csv',
+        'attribute': '*-Attribute.csv',
+        'component': '*-Component.csv',
+        'file': '*-File.csv',
+        'function': '*-Function.csv',
+        'module': '*-Module.csv',
+        'package': '*-Package.csv',
+        'namespace': '*-Namespace.csv',
+        'structure': '*-Structure.csv',
+        'union': '*-Union.csv',
+    }
+
+    # Order in which the csv files are streamed by stream_states. States of a stage only have parents in the same or
+    # in a former stage
+    CSV_STAGES = [
+        ['component', 'file', 'package', 'namespace', 'module'],
+        ['class', 'enum', 'interface', 'annotation', 'structure', 'union'],
+        ['method', 'function', 'attribute'],
+    ]
+
+    def __init__(self, output_path, input_path, project_name, url, revision_hash, debug_level, batch_size=1000,
+                 resolve_ids=True, restrict_file_lookup=False, file_batch_size=None,
+                 use_git_index=True, parse_workers=0, ingest_mode='full', delta_chain_limit=50, journal=None,
+                 pipeline_depth=0, export_dir=None, export_format='json', metrics_dir=None,
+                 metrics_format='parquet', context=None, repository_path=None, analyzed_path=None):
         """
         Initialization
 
@@ -37,11 +150,52 @@ class SourcemeterParser(object):
         :param url: url to the repository of the project that is analyzed
         :param revision_hash: hash of the revision, which is analyzed
         :param debug_level: debug level, like defined in :mod:`logging`
-
+        :param batch_size: number of rows that are converted and written to the database in one bulk write
+        :param resolve_ids: if True, the ids of all states are resolved (or assigned) before they are written, so that\
+        the states can be written without waiting for the ids of their parents
+        :param restrict_file_lookup: if True, only the stored files whose paths are in the input path are queried\
+        instead of all files of the vcs system
+        :param file_batch_size: batch size of the cursor that queries the stored files (None: default of the server)
+        :param use_git_index: if True and the input path is a git working tree, the input files are the files of the\
+        revision in git instead of all files in the input path
+        :param parse_workers: number of processes that parse the csv files concurrently. If it is 0, the csv files are\
+        streamed one after another. Otherwise, every csv file is parsed as a whole, which needs more memory
+        :param ingest_mode: full, delta or carry-forward. In delta mode, only the states that are new or changed\
+        compared to the parent commit are written, the other ones are inherited (see\
+        :class:`~mecoshark.resultparser.delta.CodeStateInheritance`). In carry-forward mode, the code entity states of\
+        the files that did not change compared to the parent commit are copied by the server (see\
+        :class:`~mecoshark.resultparser.carryforward.CarryForward`) and only the rows of the changed files are written
+        :param delta_chain_limit: maximal number of commits whose written states make up the states of a commit in\
+        delta mode
+        :param journal: :class:`~mecoshark.resultparser.journal.IngestJournal` in which the written batches and steps\
+        are recorded (None: no journal)
+        :param pipeline_depth: if it is greater than 0, the rows are read and their metrics are built in a producer\
+        thread, which puts them in batches into a queue of at most pipeline_depth batches that is drained by the\
+        writer (see :class:`~mecoshark.resultparser.pipeline.BatchPipeline`). Higher values need more memory, but\
+        smooth out differences between the speed of reading and writing
+        :param export_dir: if it is set, the states and clone instances are not written to the database, but\
+        exported to compressed files in this directory (see :class:`~mecoshark.resultparser.export.Export`). The\
+        database is only read. Needs the ids to be resolved and the full ingest mode
+        :param export_format: json (mongoimport) or bson (mongorestore)
+        :param metrics_dir: if it is set, the metrics of the code entity states are additionally written to one table\
+        per type of the states in this directory (see :class:`~mecoshark.resultparser.metrictables.MetricTables`).\
+        Needs pyarrow to be installed
+        :param metrics_format: parquet or arrow (Arrow IPC file)
+        :param context: :class:`~mecoshark.resultparser.repository.RepositoryContext` of the repository, which is\
+        shared with the parsers of other revisions (e.g., in batch mode). The vcs system, commit and stored files are\
+        taken from it instead of being queried by this parser
+        :param repository_path: path to the git repository, if the input path is a checkout without git metadata (see\
+        :class:`~mecoshark.checkout.CheckoutManager`). The input files and the changed files are listed from it.\
+        None: the input path is the git working tree
+        :param analyzed_path: path that SourceMeter analyzed, if the results were produced for another path than the\
+        input path (e.g., results of a former revision with the same tree from the\
+        :class:`~mecoshark.resultcache.ResultCache`). It is stripped from the paths in the results. None: the input path
         """
         # Set variables
         self.output_path = output_path
         self.input_path = input_path
+        self.repository_path = repository_path if repository_path is not None else input_path
+        self.analyzed_path = analyzed_path if analyzed_path is not None else input_path
         self.project_name = project_name
         self.url = url
         self.revision_hash = revision_hash
@@ -51,6 +205,48 @@ class SourcemeterParser(object):
         self.stored_file_states = {}
         self.stored_meta_package_states = {}
         self.input_files = []
+        self.input_file_index = {}
+        self.fullpath_cache = {}
+        self.state_identities = {}
+        self.resolve_ids = resolve_ids
+        self.batch_size = batch_size
+        self.restrict_file_lookup = restrict_file_lookup
+        self.file_batch_size = file_batch_size
+        self.use_git_index = use_git_index
+        self.parse_workers = parse_workers
+        self.parsed_csv_files = {}
+        self.file_state_keys = {}
+        self.ingest_mode = ingest_mode
+        self.delta_chain_limit = delta_chain_limit
+        self.delta_baseline = None
+        self.delta_parent_commit_id = None
+        self.delta_file_warnings = {}
+        self.carry_forward = None
+        self.carried_paths = set()
+        self.carried_path_names = {}
+        self.journal = journal
+        self.streamed_rows = 0
+        self.committed_rows = 0
+        self.row_offsets = {}
+        self.pipeline_depth = pipeline_depth
+        self.query_time = 0.0
+        self.export = None
+        if export_dir is not None:
+            self.export = Export(export_dir, revision_hash, export_format)
+            if not self.resolve_ids or self.ingest_mode != 'full':
+                logger.warning("Export needs the ids to be resolved and the full ingest mode. Using them.")
+                self.resolve_ids = True
+                self.ingest_mode = 'full'
+        self.metric_tables = None
+        if metrics_dir is not None:
+            if metric_tables_available():
+                self.metric_tables = MetricTables(metrics_dir, revision_hash, metrics_format, batch_size)
+            else:
+                logger.warning("Metric tables need pyarrow, which is not installed. No metric tables are written.")
+        self.entity_state_writer = self.create_writer(CodeEntityState)
+        self.group_state_writer = self.create_writer(CodeGroupState)
+
+        self.context = context
 
         # Get logger
         logger.setLevel(debug_level)
@@ -61,8 +257,20 @@ class SourcemeterParser(object):
 
         self.stored_files = self.find_stored_files()
 
-        # Prepare csv files
-        self.prepare_csv_files()
+    def create_writer(self, document_class, id_field='s_key'):
+        """
+        Creates the writer for the documents of a collection: a\
+        :class:`~mecoshark.resultparser.bulkwriter.BulkWriter` or, if the documents are exported, an\
+        :class:`~mecoshark.resultparser.export.ExportWriter`.
+
+        :param document_class: class of the documents (e.g., :class:`~pycoshark.mongomodels.CodeEntityState`)
+        :param id_field: field or tuple of fields that identifies a document
+        :return: writer
+        """
+        collection = document_class._get_collection()
+        if self.export is not None:
+            return self.export.create_writer(collection.name, id_field)
+        return BulkWriter(collection, id_field=id_field, batch_size=self.batch_size)
 
     def get_commit_id(self, vcs_system_id):
         """
@@ -72,6 +280,8 @@ class SourcemeterParser(object):
         :return: commit_id (:class:`bson.objectid.ObjectId`)
         """
         try:
+            if self.context is not None:
+                return self.context.get_commit_id(self.revision_hash)
             return Commit.objects(vcs_system_id=vcs_system_id, revision_hash=self.revision_hash).get().id
         except DoesNotExist:
             logger.error("Commit with vcs_system_id %s and revision %s does not exist" %
@@ -85,6 +295,9 @@ class SourcemeterParser(object):
 
         :return: vcs_system_id (:class:`bson.objectid.ObjectId`)
         """
+        if self.context is not None:
+            return self.context.vcs_system_id
+
         try:
             project = Project.objects.get(name=self.project_name)
             return VCSSystem.objects(url=self.url, project_id=project.id).get().id
@@ -96,22 +309,40 @@ class SourcemeterParser(object):
         """
         We need to find all files that are stored in the input path. This is needed to link the files that were parsed
         with the files that are already stored via vcsSHARK.
+        Only the path and the id of the files are queried. If restrict_file_lookup is set, the query is restricted to\
+        the paths of the input files (chunked $in queries). If a context is given, the stored files are taken from it\
+        (see :func:`~mecoshark.resultparser.repository.RepositoryContext.get_stored_files`).
+
         :return: dictionary with file path as key and id as value (from vcsshark results)
         """
         # get list of files in input_path
-        self.input_files = []
-        for root, dirs, files in os.walk(self.input_path, topdown=True):
-            for name in files:
-                full_file_path = os.path.join(root, name).replace(self.input_path, "")
+        self.input_files = list_input_files(self.input_path, self.revision_hash, self.use_git_index,
+                                            self.repository_path)
+
+        self.input_file_index = self.build_input_file_index(self.input_files)
+        self.fullpath_cache = {}
+
+        # the context only looks up the paths that were not looked up for a former revision
+        if self.context is not None:
+            return self.context.get_stored_files([path.lstrip('/') for path in self.input_files])
 
-                # Filter out git directory
-                if not full_file_path.startswith("/.git/"):
-                    self.input_files.append(full_file_path)
+        # get all stored files of the project (or only the ones in the input path)
+        if self.restrict_file_lookup:
+            paths = [path.lstrip('/') for path in self.input_files]
+            queries = [{'vcs_system_id': self.vcs_system_id, 'path': {'$in': paths[start:start + self.PATH_QUERY_SIZE]}}
+                       for start in range(0, len(paths), self.PATH_QUERY_SIZE)]
+        else:
+            queries = [{'vcs_system_id': self.vcs_system_id}]
 
-        # get all stored files of the project
+        collection = File._get_collection()
         stored_files = {}
-        for file in File.objects(vcs_system_id=self.vcs_system_id):
-            stored_files[file.path] = file.id
+        for query in queries:
+            cursor = collection.find(query, {'path': 1})
+            if self.file_batch_size:
+                cursor = cursor.batch_size(self.file_batch_size)
+
+            for document in cursor:
+                stored_files[document['path']] = document['_id']
 
         return stored_files
 
@@ -132,24 +363,13 @@ class SourcemeterParser(object):
 
     def prepare_csv_files(self):
         """
-        Prepares the csv files generated by SourceMeter by creating a sort key and sort it after it
-        """
-        all_csv_paths = {
-            'class': self.get_csv_file(os.path.join(self.output_path, "*-Class.csv")),
-            'enum': self.get_csv_file(os.path.join(self.output_path, "*-Enum.csv")),
-            'interface':  self.get_csv_file(os.path.join(self.output_path, "*-Interface.csv")),
-            'method': self.get_csv_file(os.path.join(self.output_path, "*-Method.csv")),
-            'annotation': self.get_csv_file(os.path.join(self.output_path, "*-Annotation.csv")),
-            'attribute': self.get_csv_file(os.path.join(self.output_path, "*-Attribute.csv")),
-            'component': self.get_csv_file(os.path.join(self.output_path, "*-Component.csv")),
-            'file': self.get_csv_file(os.path.join(self.output_path, "*-File.csv")),
-            'function': self.get_csv_file(os.path.join(self.output_path, "*-Function.csv")),
-            'module': self.get_csv_file(os.path.join(self.output_path, "*-Module.csv")),
-            'package': self.get_csv_file(os.path.join(self.output_path, "*-Package.csv")),
-            'namespace': self.get_csv_file(os.path.join(self.output_path, "*-Namespace.csv")),
-            'structure': self.get_csv_file(os.path.join(self.output_path, "*-Structure.csv")),
-            'union': self.get_csv_file(os.path.join(self.output_path, "*-Union.csv")),
-        }
+        Prepares the csv files generated by SourceMeter by creating a sort key and sort it after it.
+        All rows are kept in the ordered_file_states property.
+
+        .. NOTE:: :func:`store_data` does not need this, as it streams the rows via :func:`stream_states`
+        """
+        all_csv_paths = {name: self.get_csv_file(os.path.join(self.output_path, pattern))
+                         for name, pattern in self.CSV_FILES.items()}
 
         file_states = []
         for name, path in all_csv_paths.items():
@@ -186,6 +406,8 @@ class SourcemeterParser(object):
         Sorts the given dictionary in a way, that the parent states of the states must be before it.
         Special rules apply for file states, as they do not have any parents.
 
+        The states are ordered level by level (see :func:`group_by_depth`). States whose parent is not part of the
+        given states (or that are part of a cycle) can not be ordered. They are reported and put at the end.
 
         :param state_dict: dictionary of states that should be ordered
         :return: ordered dictionary
@@ -193,41 +415,454 @@ class SourcemeterParser(object):
         .. NOTE:: Example: X has parent Y, Y has parent Z. Therefore, it would be ordered:\
         Z -> Y -> X
         """
-        not_finished = True
-        new_dict = []
-        written_ids = []
+        levels, unresolved = SourcemeterParser.group_by_depth(state_dict)
 
-        while not_finished:
-            for row in state_dict:
-                if 'Parent' not in row and row['ID'] not in written_ids:
-                    written_ids.append(row['ID'])
-                    new_dict.append(row)
+        new_dict = [row for level in levels for row in level]
 
-                if 'Parent' in row and row['ID'] not in written_ids and (row['Parent'] in written_ids
-                                                                         or row['Parent'] == '__LogicalRoot__'
-                                                                         or row['type'] == 'file'):
-                    written_ids.append(row['ID'])
-                    new_dict.append(row)
-
-                if len(state_dict) == len(written_ids):
-                    not_finished = False
+        if unresolved:
+            logger.warning("Parent not found for the states with the IDs %s (missing parent or cycle)!" %
+                           ', '.join(row['ID'] for row in unresolved))
+            new_dict.extend(unresolved)
 
         return new_dict
 
+    @staticmethod
+    def group_by_depth(state_dict):
+        """
+        Groups the given states by their depth in the parent hierarchy (Kahn's algorithm). States without a parent,
+        with the logical root as parent and file states have the depth 0, their children the depth 1 and so on.
+        Within a level, the states keep the order of the given states. Runs in O(n).
+
+        :param state_dict: dictionary of states that should be grouped
+        :return: tuple of the list of levels (each a list of states) and the list of states that could not be\
+        grouped, as their parent is missing or they are part of a cycle
+        """
+        children = {}
+        level = []
+        for row in state_dict:
+            if 'Parent' not in row or row['Parent'] == '__LogicalRoot__' or row['type'] == 'file':
+                level.append(row)
+            else:
+                children.setdefault(row['Parent'], []).append(row)
+
+        levels = []
+        while level:
+            levels.append(level)
+            next_level = []
+            for row in level:
+                next_level.extend(children.pop(row['ID'], []))
+            level = next_level
+
+        unresolved = [row for rows in children.values() for row in rows]
+        return levels, unresolved
+
+    def start_parsing(self, executor):
+        """
+        Submits all csv files to the process pool. The largest files are submitted first, so that the parse time\
+        approaches the one of the largest file.
+
+        :param executor: :class:`concurrent.futures.ProcessPoolExecutor`
+        """
+        paths = {}
+        for name, pattern in self.CSV_FILES.items():
+            path = self.get_csv_file(os.path.join(self.output_path, pattern))
+            if path is not None:
+                paths[name] = path
+
+        for name in sorted(paths, key=lambda name: os.path.getsize(paths[name]), reverse=True):
+            logger.info("Parse path: " + paths[name])
+            self.parsed_csv_files[name] = executor.submit(parse_csv_file, paths[name], name)
+
+    def read_csv_states(self, name):
+        """
+        Reads the rows of the csv file for the given type of states one after another. If the csv file was submitted\
+        to the process pool (see :func:`start_parsing`), the parsed rows are taken from there.
+
+        :param name: type of the states (key of CSV_FILES)
+        :return: generator of rows
+        """
+        if name in self.parsed_csv_files:
+            for row in self.parsed_csv_files.pop(name).result():
+                yield row
+            return
+
+        path = self.get_csv_file(os.path.join(self.output_path, self.CSV_FILES[name]))
+        if path is None:
+            return
+
+        logger.info("Open path: " + path)
+        for row in self.read_csv_file(path, name):
+            yield row
+
+    @staticmethod
+    def read_csv_file(path, name):
+        """
+        Reads the rows of a csv file one after another and sets their type.
+
+        :param path: path to the csv file
+        :param name: type of the states (key of CSV_FILES)
+        :return: generator of rows
+        """
+        for row in read_projected_rows(path):
+            row['type'] = name
+
+            if name == 'file':
+                row['Path'] = row['LongName']
+
+            yield row
+
+    def stream_states(self):
+        """
+        Streams the rows of all csv files in the order of CSV_STAGES, so that a state comes after its parent state.
+        Rows whose parent was not streamed yet are held back until the parent comes. Rows whose parent never comes
+        (missing parent or cycle) are reported and streamed at the end.
+
+        :return: generator of rows
+        """
+        streamed_ids = set()
+        waiting_rows = {}
+
+        for stage in self.CSV_STAGES:
+            for name in stage:
+                for row in self.read_csv_states(name):
+                    if 'Parent' in row and row['Parent'] != '__LogicalRoot__' and row['type'] != 'file' \
+                            and row['Parent'] not in streamed_ids:
+                        waiting_rows.setdefault(row['Parent'], []).append(row)
+                        continue
+
+                    # Stream the row and all rows that were waiting for it
+                    rows = [row]
+                    while rows:
+                        next_row = rows.pop()
+                        streamed_ids.add(next_row['ID'])
+                        yield next_row
+                        rows.extend(reversed(waiting_rows.pop(next_row['ID'], [])))
+
+        unresolved = [row for rows in waiting_rows.values() for row in rows]
+        if unresolved:
+            logger.warning("Parent not found for the states with the IDs %s (missing parent or cycle)!" %
+                           ', '.join(row['ID'] for row in unresolved))
+        for row in unresolved:
+            yield row
+
     def store_data(self):
         """
         Call to store data: If they have 'Path' in the row, file states data is stored. Otherwise, meta package data
 
+        The rows are streamed from the csv files (see :func:`stream_states`) and stored in chunks of batch_size rows,
+        so that the memory usage does not depend on the size of the project. If parse_workers is set, the csv files\
+        are parsed concurrently in a process pool while the states of the former stages are stored.
+        In delta mode, the states are compared to the ones of the parent commit first (see\
+        :func:`prepare_delta_baseline`). In carry-forward mode, the states of the unchanged files are copied first (see\
+        :func:`prepare_carry_forward`) and their rows are skipped.
+        If a journal is given, the steps (states, clones, extra) and batches that were completed by a former run are\
+        skipped (see :class:`~mecoshark.resultparser.journal.IngestJournal`).
+
         :return:
         """
-        for row in self.ordered_file_states:
-            if 'Path' in row:
-                self.store_file_states_data(row)
+        self.run_step('states', self.store_states_data)
+        self.run_step('clones', self.store_clone_data)
+        self.run_step('extra', self.store_extra_data)
+
+        if self.export is not None:
+            self.export.close()
+
+    def run_step(self, name, step):
+        """
+        Runs a step of the ingest, unless the journal recorded that it was completed before.
+
+        :param name: name of the step
+        :param step: function that runs the step
+        """
+        # The export files and metric tables are written from scratch, so that no step of a former run can be skipped
+        if self.journal is None or self.export is not None or self.metric_tables is not None:
+            step()
+            return
+
+        if self.journal.is_committed(name):
+            logger.info("Skipping step %s, which was completed by a former run" % name)
+            return
+
+        step()
+        self.journal.commit_step(name)
+
+    def store_states_data(self):
+        """
+        Stores the code entity states and code group states of all csv files (see :func:`store_data`).
+        """
+        if self.ingest_mode == 'delta':
+            self.prepare_delta_baseline()
+        elif self.ingest_mode == 'carry-forward':
+            self.prepare_carry_forward()
+
+        executor = None
+        if self.parse_workers:
+            executor = ProcessPoolExecutor(max_workers=self.parse_workers)
+            self.start_parsing(executor)
+
+        if self.journal is not None and self.journal.committed_rows:
+            if self.delta_baseline is not None:
+                logger.info("Writing all batches again, as the states are compared to the parent commit in delta mode")
+            elif self.export is not None or self.metric_tables is not None:
+                logger.info("Writing all batches again, as the export files and metric tables are written from scratch")
             else:
-                self.store_meta_package_data(row)
+                self.committed_rows = self.journal.committed_rows
+                logger.info("Skipping the first %d rows, which were written by a former run" % self.committed_rows)
+
+        try:
+            if self.pipeline_depth:
+                self.store_pipelined()
+            else:
+                rows = []
+                for row in self.stream_rows():
+                    rows.append(row)
+
+                    if len(rows) >= self.batch_size:
+                        self.store_batch(rows)
+                        rows = []
+                self.store_batch(rows)
+        finally:
+            self.parsed_csv_files = {}
+            if executor is not None:
+                executor.shutdown()
+
+        self.group_state_writer.flush()
+        self.stored_file_states.update(self.entity_state_writer.flush())
+
+        if self.delta_baseline is not None:
+            self.store_state_inheritance()
+
+        if self.carry_forward is not None:
+            self.carry_forward.resolve_references()
+
+        if self.metric_tables is not None:
+            self.metric_tables.close()
+
+    def stream_rows(self):
+        """
+        Streams the rows that are stored (see :func:`stream_states`). Rows of files whose states were copied from the\
+        parent commit are skipped, unless metric tables are written. Then, they are passed on to :func:`store_batch`,\
+        which adds them to the metric tables, as the producer thread of the pipeline must not write them.
+
+        :return: generator of rows
+        """
+        for row in self.stream_states():
+            if self.carried_paths and self.metric_tables is None and self.is_carried_forward(row):
+                continue
+            yield row
+
+    def remove_carried_rows(self, rows):
+        """
+        Removes the rows of files whose states were copied from the parent commit from a batch and adds them to the\
+        metric tables (see :func:`stream_rows`).
+
+        :param rows: rows of the batch
+        :return: rows that are stored
+        """
+        if not self.carried_paths or self.metric_tables is None:
+            return rows
+
+        stored_rows = []
+        for row in rows:
+            if self.is_carried_forward(row):
+                self.add_to_metric_tables(row, self.get_metrics(row))
+            else:
+                stored_rows.append(row)
+        return stored_rows
+
+    def store_pipelined(self):
+        """
+        Stores the rows with a :class:`~mecoshark.resultparser.pipeline.BatchPipeline`: the rows are read and their\
+        metrics are built in a producer thread, while the batches are written. Afterwards, the time the writer waited\
+        for the producer and the time it spent in the database are logged.
+        """
+        pipeline = BatchPipeline(self.stream_rows(), self.batch_size, self.pipeline_depth, self.prepare_row)
+        start_time = timeit.default_timer()
+        try:
+            for rows in pipeline:
+                self.store_batch(rows)
+        finally:
+            pipeline.stop()
+
+        database_time = self.entity_state_writer.write_time + self.group_state_writer.write_time + self.query_time
+        logger.info("Stored %d batches in %0.2f s. Writer waited %0.2f s on reading and %0.2f s on the database, "
+                    "reader waited %0.2f s on the writer" %
+                    (pipeline.produced_batches, timeit.default_timer() - start_time, pipeline.upstream_wait,
+                     database_time, pipeline.producer_wait))
+
+    @staticmethod
+    def prepare_row(row):
+        """
+        Builds the metrics of a row in advance (see :class:`~mecoshark.resultparser.projection.ParsedRow`), so that\
+        the writer only needs to write them.
+
+        :param row: row that is processed
+        :return: :class:`~mecoshark.resultparser.projection.ParsedRow`
+        """
+        if isinstance(row, ParsedRow):
+            return row
+        return ParsedRow.from_row(row)
+
+    def store_batch(self, rows):
+        """
+        Stores a batch of rows (see :func:`store_states`). If a journal is given, the batch is written right away and\
+        recorded in the journal. Batches that were written by a former run are not written again, only the ids of\
+        their states are queried (see :func:`resolve_state_ids`), as the following rows may reference them.
+
+        :param rows: rows of the batch
+        """
+        rows = self.remove_carried_rows(rows)
+        if self.journal is None:
+            self.store_states(rows)
+            return
+
+        if self.streamed_rows + len(rows) <= self.committed_rows:
+            self.resolve_state_ids(rows)
+            self.state_identities = {}
+        else:
+            self.store_states(rows)
+            self.group_state_writer.flush()
+            self.stored_file_states.update(self.entity_state_writer.flush())
+
+        self.streamed_rows += len(rows)
+        for row in rows:
+            self.row_offsets[row['type']] = self.row_offsets.get(row['type'], 0) + 1
+
+        if self.streamed_rows > self.committed_rows:
+            self.journal.commit_batch(self.streamed_rows, self.row_offsets)
+
+    def prepare_delta_baseline(self):
+        """
+        Loads the states of the parent commit (first parent) for the delta mode. If the parent commit has no stored
+        states or the chain of commits whose written states make up the states of the parent reached the\
+        delta_chain_limit, all states are written. The PMD warnings of the files are read as well, as they are\
+        compared with the linter results of the file states of the parent commit.
+        """
+        commit_collection = Commit._get_collection()
+        parents = commit_collection.find_one({'_id': self.commit_id}, {'parents': 1}).get('parents', None) or []
+
+        chain_commit_ids = []
+        parent = None
+        if parents:
+            parent = commit_collection.find_one({'vcs_system_id': self.vcs_system_id, 'revision_hash': parents[0]},
+                                                {'_id': 1})
+
+        if parent is not None:
+            inheritance = CodeStateInheritance._get_collection().find_one({'commit_id': parent['_id']},
+                                                                          {'chain_commit_ids': 1})
+            if inheritance is not None:
+                chain_commit_ids = inheritance['chain_commit_ids']
+            elif CodeEntityState._get_collection().find_one({'commit_id': parent['_id']}, {'_id': 1}) is not None:
+                chain_commit_ids = [parent['_id']]
+
+        if len(chain_commit_ids) >= self.delta_chain_limit:
+            logger.info("Chain of commit %s reached the limit of %d commits. Writing all states." %
+                        (parents[0], self.delta_chain_limit))
+            chain_commit_ids = []
+
+        if not chain_commit_ids:
+            logger.info("No states of a parent commit found. Writing all states.")
+
+        self.delta_parent_commit_id = parent['_id'] if chain_commit_ids else None
+        self.delta_baseline = DeltaBaseline(chain_commit_ids)
+        self.delta_baseline.commit_has_states = \
+            CodeEntityState._get_collection().find_one({'commit_id': self.commit_id}, {'_id': 1}) is not None or \
+            CodeGroupState._get_collection().find_one({'commit_id': self.commit_id}, {'_id': 1}) is not None
+
+        file_ids = list({self.stored_files[path.lstrip('/')] for path in self.input_files
+                         if path.lstrip('/') in self.stored_files})
+        self.delta_baseline.load(file_ids, self.ID_QUERY_SIZE)
+
+        # The linter results are part of the file states, so they are compared as well
+        pmd_file_path = glob.glob(os.path.join(self.output_path, "*-PMD.txt"))
+        if pmd_file_path:
+            self.delta_file_warnings = self.read_pmd_file(pmd_file_path[0])
+
+    def prepare_carry_forward(self):
+        """
+        Copies the code entity states of the files that did not change compared to the parent commit (first parent,\
+        git diff) into the analyzed commit. The parent commit must have all of its states stored (i.e., it was not\
+        ingested in delta mode). Otherwise, or if the changed files can not be listed or the server can not copy the\
+        states, all states are written.
+        """
+        commit_collection = Commit._get_collection()
+        parents = commit_collection.find_one({'_id': self.commit_id}, {'parents': 1}).get('parents', None) or []
+
+        parent = None
+        if parents:
+            parent = commit_collection.find_one({'vcs_system_id': self.vcs_system_id, 'revision_hash': parents[0]},
+                                                {'_id': 1})
+
+        if parent is None or \
+                CodeEntityState._get_collection().find_one({'commit_id': parent['_id']}, {'_id': 1}) is None:
+            logger.info("No states of a parent commit found. Writing all states.")
+            return
+
+        if CodeStateInheritance._get_collection().find_one({'commit_id': parent['_id']}, {'_id': 1}) is not None:
+            logger.info("Parent commit %s was ingested in delta mode. Writing all states." % parents[0])
+            return
+
+        changed_files = list_changed_files(self.repository_path, parents[0], self.revision_hash)
+        if changed_files is None:
+            logger.warning("Could not list the files that changed since %s. Writing all states." % parents[0])
+            return
+
+        carried_paths = {path.lstrip('/') for path in self.input_files if path not in changed_files}
+        file_ids = list({self.stored_files[path] for path in carried_paths if path in self.stored_files})
+
+        carry_forward = CarryForward(parent['_id'], self.commit_id)
+        if not carry_forward.copy_states(file_ids, self.ID_QUERY_SIZE):
+            logger.warning("Writing all states.")
+            return
+
+        logger.info("Copied the states of %d unchanged files from the parent commit, %d files changed" %
+                    (len(file_ids), len(changed_files)))
+        self.carry_forward = carry_forward
+        self.carried_paths = carried_paths
+
+    def is_carried_forward(self, row):
+        """
+        Checks if the state of the row belongs to a file whose states were copied from the parent commit.
+
+        :param row: row that is processed
+        :return: True, if the row is not written
+        """
+        if 'Path' not in row:
+            return False
 
-        self.store_clone_data()
-        self.store_extra_data()
+        path = row['Path']
+        if path not in self.carried_path_names:
+            self.carried_path_names[path] = self.sanitize_long_name(path)
+        return self.carried_path_names[path] in self.carried_paths
+
+    def store_state_inheritance(self):
+        """
+        Stores the :class:`~mecoshark.resultparser.delta.CodeStateInheritance` of the commit in delta mode.
+        States of the commit that were stored before (e.g., by a full run), but are inherited now, are deleted, as\
+        they would replace the inherited ones.
+        """
+        baseline = self.delta_baseline
+        for start in range(0, len(baseline.stale_state_keys), self.ID_QUERY_SIZE):
+            query = {'s_key': {'$in': baseline.stale_state_keys[start:start + self.ID_QUERY_SIZE]}}
+            CodeEntityState._get_collection().delete_many(query)
+            CodeGroupState._get_collection().delete_many(query)
+        removed_ce_ids, removed_cg_ids = baseline.get_removed_ids()
+        written_ces = len(baseline.seen_entity_states) - baseline.inherited_entity_states
+        written_cgs = len(baseline.seen_group_states) - baseline.inherited_group_states
+
+        CodeStateInheritance._get_collection().update_one({'commit_id': self.commit_id}, {'$set': {
+            'parent_commit_id': self.delta_parent_commit_id,
+            'chain_commit_ids': baseline.chain_commit_ids + [self.commit_id],
+            'removed_ce_ids': removed_ce_ids,
+            'removed_cg_ids': removed_cg_ids,
+            'written_ces': written_ces,
+            'inherited_ces': baseline.inherited_entity_states,
+            'written_cgs': written_cgs,
+            'inherited_cgs': baseline.inherited_group_states,
+        }}, upsert=True)
+
+        logger.info("Wrote %d and inherited %d code entity states, wrote %d and inherited %d code group states" %
+                    (written_ces, baseline.inherited_entity_states, written_cgs, baseline.inherited_group_states))
 
     def store_extra_data(self):
         """
@@ -245,48 +880,207 @@ class SourcemeterParser(object):
         #elif pylint_file_path:
         #    self.parse_pylint_file(pylint_file_path[0])
 
+    def read_pmd_file(self, path):
+        """
+        Reads the PMD report line by line (see :func:`parse_pmd_line`).
+
+        :param path: path to the PMD report
+        :return: dictionary with the file path as key and the list of warnings as value
+        """
+        file_warnings = {}
+        with open(path) as pmd_file:
+            for line in pmd_file:
+                self.parse_pmd_line(line, file_warnings)
+        return file_warnings
+
     def parse_pmd_file(self, path):
+        """
+        Parses the PMD report and stores the warnings as linter of the states of the files.
+        The report is read line by line. The ids of the states are taken from the states that were stored before (see\
+        file_state_keys), the remaining ones are queried with one $in query. All linter updates are written with one\
+        bulk write. In delta mode, file states that were inherited from the parent commit are skipped, as they belong\
+        to the parent commit and already have the same warnings.
+
+        :param path: path to the PMD report
+        """
         logger.info("Parsing & storing pmd warnings...")
-        with open(path) as pmd_file:
-            data = pmd_file.readlines()
 
         # Go through all warnings that pmd reported
-        file_warnings = {}
-        for line in data:
-            line = line.strip()
-            parts = line.split(":")
-            file_parts = parts[0].strip()
-            pmd_type = parts[1].strip()
-            message = parts[2].strip()
+        file_warnings = self.read_pmd_file(path)
 
-            file_path = file_parts.split("(")[0]
-            file_path = file_path.replace(self.input_path.rstrip("/") + "/", "")
-            line_number = file_parts.split("(")[1].strip(")")
+        logger.debug("Found the following pmd warnings: %s" % file_warnings)
 
-            warnings = file_warnings.get(file_path, list())
-            warnings.append({"ln": int(line_number), "l_ty": pmd_type, "msg": message})
-            file_warnings[file_path] = warnings
+        # Find the ids of the states of the files
+        state_ids = {}
+        unresolved = {}
+        for file_path in file_warnings:
+            if file_path not in self.stored_files:
+                logger.warning("Code Entity State for file %s does not exist!" % file_path)
+                continue
+
+            s_key = get_code_entity_state_identifier(file_path, self.commit_id, self.stored_files[file_path])
+            row_id = self.file_state_keys.get(s_key, None)
+            if row_id in self.stored_file_states:
+                if self.delta_baseline is not None and \
+                        self.delta_baseline.is_inherited_entity_state(self.stored_file_states[row_id]):
+                    continue
+                state_ids[file_path] = self.stored_file_states[row_id]
+            else:
+                unresolved[s_key] = file_path
+
+        collection = CodeEntityState._get_collection()
+        s_keys = list(unresolved)
+        for start in range(0, len(s_keys), self.ID_QUERY_SIZE):
+            query = {'s_key': {'$in': s_keys[start:start + self.ID_QUERY_SIZE]}}
+            for document in collection.find(query, {'s_key': 1}):
+                state_ids[unresolved.pop(document['s_key'])] = document['_id']
+
+        for file_path in unresolved.values():
+            logger.warning("Code Entity State for file %s does not exist!" % file_path)
+
+        if self.export is not None:
+            for file_path in file_warnings:
+                if file_path in state_ids:
+                    self.export.update(collection.name, state_ids[file_path], {'linter': file_warnings[file_path]})
+            return
+
+        requests = [UpdateOne({'_id': state_ids[file_path]}, {'$set': {'linter': file_warnings[file_path]}})
+                    for file_path in file_warnings if file_path in state_ids]
+        if requests:
+            collection.bulk_write(requests, ordered=False)
+
+    def parse_pmd_line(self, line, file_warnings):
+        """
+        Parses one line of the PMD report and adds the warning to the warnings of its file.
 
-        logger.debug("Found the following pmd warnings: %s" % file_warnings)
+        :param line: line of the PMD report
+        :param file_warnings: dictionary with the file path as key and the list of warnings as value
+        """
+        line = line.strip()
+        if not line:
+            return
 
-        for file_path, data in file_warnings.items():
+        parts = line.split(":")
+        file_parts = parts[0].strip()
+        pmd_type = parts[1].strip()
+        message = parts[2].strip()
 
-            try:
-                # Get file id
-                m_file = File.objects(path=file_path, vcs_system_id=self.vcs_system_id).get()
+        file_path = file_parts.split("(")[0]
+        file_path = file_path.replace(self.analyzed_path.rstrip("/") + "/", "")
+        line_number = file_parts.split("(")[1].strip(")")
 
-                # Get code entity state
-                identifier = get_code_entity_state_identifier(file_path, self.commit_id, m_file.id)
-                m_ces = CodeEntityState.objects(s_key=identifier).get()
-                m_ces.linter.clear()
+        file_warnings.setdefault(file_path, []).append({"ln": int(line_number), "l_ty": pmd_type, "msg": message})
 
-                for warnings in data:
-                    m_ces.linter.append(warnings)
+    def store_states(self, rows):
+        """
+        Stores the states of the given rows. If resolve_ids is set, the ids of the states are resolved first (see
+        :func:`resolve_state_ids`).
 
-                # Save code entity state
-                m_ces.save()
-            except DoesNotExist:
-                logger.warning("Code Entity State for file %s does not exist!" % file_path)
+        :param rows: rows that are processed. A parent state must come before its children
+        """
+        if self.resolve_ids:
+            self.resolve_state_ids(rows)
+
+        for row in rows:
+            if 'Path' in row:
+                self.store_file_states_data(row)
+            else:
+                self.store_meta_package_data(row)
+
+        self.state_identities = {}
+
+    def resolve_state_ids(self, rows):
+        """
+        Resolves the ids of the states of the given rows before they are written.
+        The s_keys of all rows are calculated and the ids of already stored states are queried with one $in query per
+        collection. States that are not stored yet get a new :class:`bson.objectid.ObjectId`, which is used when they
+        are inserted. The ids are put into the stored_meta_package_states and stored_file_states properties, so that
+        all states can be written with unordered bulk writes, as no state needs to wait for the id of its parent.
+
+        :param rows: rows for which the ids should be resolved
+        """
+        group_state_keys = {}
+        entity_state_keys = {}
+
+        for row in rows:
+            if 'Path' in row:
+                identity = self.get_file_state_identity(row)
+                state_keys = entity_state_keys
+            else:
+                identity = self.get_meta_package_identity(row)
+                state_keys = group_state_keys
+
+            self.state_identities[row['ID']] = identity
+            if identity[2] is not None:
+                state_keys.setdefault(identity[2], []).append(row['ID'])
+
+        self.stored_meta_package_states.update(self.assign_state_ids(CodeGroupState, group_state_keys))
+        self.stored_file_states.update(self.assign_state_ids(CodeEntityState, entity_state_keys))
+
+    def assign_state_ids(self, document_class, state_keys):
+        """
+        Queries the ids of the states with the given s_keys and creates new ids for states that are not stored.
+
+        :param document_class: :class:`~pycoshark.mongomodels.CodeGroupState` or\
+        :class:`~pycoshark.mongomodels.CodeEntityState`
+        :param state_keys: dictionary with s_key as key and list of row IDs as value
+        :return: dictionary with the row ID as key and the id of the state as value
+        """
+        collection = document_class._get_collection()
+        s_keys = list(state_keys)
+        stored_ids = {}
+        start_time = timeit.default_timer()
+        for start in range(0, len(s_keys), self.ID_QUERY_SIZE):
+            query = {'s_key': {'$in': s_keys[start:start + self.ID_QUERY_SIZE]}}
+            for document in collection.find(query, {'s_key': 1}):
+                stored_ids[document['s_key']] = document['_id']
+        self.query_time += timeit.default_timer() - start_time
+
+        logger.debug("Found %d of %d states in collection %s" % (len(stored_ids), len(s_keys), collection.name))
+
+        state_ids = {}
+        for s_key, row_ids in state_keys.items():
+            state_id = stored_ids.get(s_key, None) or ObjectId()
+            for row_id in row_ids:
+                state_ids[row_id] = state_id
+        return state_ids
+
+    def get_meta_package_identity(self, row):
+        """
+        Calculates the identity of the code group state of the given row.
+
+        :param row: row that is processed
+        :return: tuple of long name, file id (always None) and s_key
+        """
+        if row['ID'] in self.state_identities:
+            return self.state_identities[row['ID']]
+
+        long_name = self.sanitize_long_name(row['LongName'])
+        return long_name, None, get_code_group_state_identifier(long_name, self.commit_id)
+
+    def get_file_state_identity(self, row):
+        """
+        Calculates the identity of the code entity state of the given row.
+
+        :param row: row that is processed
+        :return: tuple of long name, file id and s_key. File id and s_key are None if the file is not stored
+        """
+        if row['ID'] in self.state_identities:
+            return self.state_identities[row['ID']]
+
+        path_name = self.sanitize_long_name(row['Path'])
+
+        # We only need to sanitize the long name for files, Otherwise we store it like it comes out of sourcemeter
+        if row['type'] == 'file':
+            long_name = self.sanitize_long_name(row['LongName'])
+        else:
+            long_name = row['LongName']
+
+        file_id = self.stored_files.get(path_name, None)
+        if file_id is None:
+            return long_name, None, None
+
+        return long_name, file_id, get_code_entity_state_identifier(long_name, self.commit_id, file_id)
 
     def get_component_ids(self, row_component_ids):
         """
@@ -296,12 +1090,21 @@ class SourcemeterParser(object):
         :return: ObjectIds of all components as list (:class:`bson.objectid.ObjectId`)
         """
         # get list of objectids for all components in the csv file
-        row_component_ids = row_component_ids.split(",")
         component_object_ids = []
-        for row_component_id in row_component_ids:
-            component_object_ids.append(self.stored_meta_package_states[row_component_id.strip()])
+        for row_component_id in self.get_component_row_ids(row_component_ids):
+            component_object_ids.append(self.stored_meta_package_states[row_component_id])
         return component_object_ids
 
+    @staticmethod
+    def get_component_row_ids(row_component_ids):
+        """
+        Function that gets the IDs of the component rows from the component ids string.
+
+        :param row_component_ids: component ids string
+        :return: list of IDs
+        """
+        return [row_component_id.strip() for row_component_id in row_component_ids.split(",")]
+
     def store_meta_package_data(self, row):
         """
         Stores the meta package data.
@@ -311,17 +1114,40 @@ class SourcemeterParser(object):
 
         .. NOTE:: Meta packages do not have a direct connection to files from a revision. It consists of a set of states.
         """
-        long_name = self.sanitize_long_name(row['LongName'])
-        metrics_dict = self.sanitize_metrics_dictionary(copy.deepcopy(row))
+        long_name, _, s_key = self.get_meta_package_identity(row)
+        metrics_dict = self.get_metrics(row)
 
         cg_parent_ids = []
+        parent_row_ids = []
         if 'Parent' in row and row['Parent'] in self.stored_meta_package_states:
             cg_parent_ids.append(self.stored_meta_package_states[row['Parent']])
+            parent_row_ids.append(row['Parent'])
 
         if 'Component' in row:
             cg_parent_ids.extend(self.get_component_ids(row['Component']))
+            parent_row_ids.extend(self.get_component_row_ids(row['Component']))
+
+        if self.delta_baseline is not None:
+            fields = {'long_name': long_name, 'cg_type': row['type'], 'metrics': metrics_dict}
+            state_id = self.delta_baseline.match_group_state(row['ID'], fields, parent_row_ids)
+            if state_id is not None:
+                self.stored_meta_package_states[row['ID']] = state_id
+                if self.delta_baseline.commit_has_states:
+                    self.delta_baseline.stale_state_keys.append(s_key)
+                return
+
+        if row['ID'] in self.state_identities:
+            tmp = {'metrics.{}'.format(k): v for k, v in metrics_dict.items()}
+            tmp['s_key'] = s_key
+            tmp['long_name'] = long_name
+            tmp['commit_id'] = self.commit_id
+            tmp['cg_type'] = row['type']
+            tmp['cg_parent_ids'] = cg_parent_ids
+
+            self.group_state_writer.upsert({'s_key': s_key}, tmp,
+                                           document_id=self.stored_meta_package_states[row['ID']])
+            return
 
-        s_key = get_code_group_state_identifier(long_name, self.commit_id)
         tmp = {'set__metrics__{}'.format(k): v for k, v in metrics_dict.items()}
         tmp['s_key'] = s_key
         tmp['long_name'] = long_name
@@ -336,102 +1162,166 @@ class SourcemeterParser(object):
     def store_file_states_data(self, row):
         """
         Stores the file states data.
-        Fills the stored_file_states property for less database communication.
+        The upserts are collected by the entity_state_writer and written in batches. If the ids were not resolved
+        before (see :func:`resolve_state_ids`), the ids of the written states are put into the stored_file_states
+        property and all pending upserts are written first, if the parent of the row was not yet written.
 
         :param row: row that is processed:
 
         .. NOTE:: File states have a direct connection to a file from a revision.
         """
-        path_name = self.sanitize_long_name(row['Path'])
+        if 'Parent' in row and self.entity_state_writer.is_pending(row['Parent']):
+            self.stored_file_states.update(self.entity_state_writer.flush())
 
-        # We only need to sanitize the long name for files, Otherwise we store it like it comes out of sourcemeter
-        if row['type'] == 'file':
-            long_name = self.sanitize_long_name(row['LongName'])
-        else:
-            long_name = row['LongName']
+        long_name, file_id, s_key = self.get_file_state_identity(row)
 
         cg_ids = []
+        group_row_ids = []
         ce_parent_id = None
+        parent_row_id = None
         if 'Parent' in row and row['Parent'] in self.stored_meta_package_states:
             cg_ids.append(self.stored_meta_package_states[row['Parent']])
+            group_row_ids.append(row['Parent'])
         elif 'Parent' in row and row['Parent'] in self.stored_file_states:
             ce_parent_id = self.stored_file_states[row['Parent']]
+            parent_row_id = row['Parent']
         elif 'Parent' in row and row['type'] != 'file':
             logger.warning("ERROR! Parent not found for %s!" % row)
 
         if 'Component' in row:
             cg_ids.extend(self.get_component_ids(row['Component']))
+            group_row_ids.extend(self.get_component_row_ids(row['Component']))
 
         start_line = None
         end_line = None
         start_column = None
         end_column = None
         if 'Line' in row and 'EndLine' in row and 'Column' in row and 'EndColumn' in row:
-            start_line = row['Line']
-            end_line = row['EndLine']
-            start_column = row['Column']
-            end_column = row['EndColumn']
+            start_line = int(row['Line'])
+            end_line = int(row['EndLine'])
+            start_column = int(row['Column'])
+            end_column = int(row['EndColumn'])
 
-        try:
-            s_key = get_code_entity_state_identifier(long_name, self.commit_id, self.stored_files[path_name])
-            tmp = {'set__metrics__{}'.format(k): v for k, v in self.sanitize_metrics_dictionary(copy.deepcopy(row)).items()}
-            tmp['s_key'] = s_key
-            tmp['long_name'] = long_name
-            tmp['commit_id'] = self.commit_id
-            tmp['file_id'] = self.stored_files[path_name]
-            tmp['ce_type'] = row['type']
-            tmp['cg_ids'] = cg_ids
-            tmp['ce_parent_id'] = ce_parent_id
-            tmp['start_line'] = start_line
-            tmp['end_line'] = end_line
-            tmp['start_column'] = start_column
-            tmp['end_column'] = end_column
-
-            state_id = CodeEntityState.objects(s_key=s_key).upsert_one(**tmp).id
-            self.stored_file_states[row['ID']] = state_id
-        except KeyError:
+        if s_key is None:
             # This should not happen, but it can happen, e.g., for the conftest.cpp file for C/c++ projects, which
             # is just temporally created
-            logger.warning("Could not store results for file %s" % path_name)
+            logger.warning("Could not store results for file %s" % self.sanitize_long_name(row['Path']))
+            return
+
+        metrics_dict = self.get_metrics(row)
+        if row['type'] == 'file':
+            self.file_state_keys[s_key] = row['ID']
+
+        if self.metric_tables is not None:
+            self.add_to_metric_tables(row, metrics_dict)
+
+        if self.delta_baseline is not None:
+            fields = {'long_name': long_name, 'file_id': file_id, 'ce_type': row['type'], 'metrics': metrics_dict,
+                      'start_line': start_line, 'end_line': end_line, 'start_column': start_column,
+                      'end_column': end_column}
+            if row['type'] == 'file':
+                fields['linter'] = self.delta_file_warnings.get(long_name, [])
+            state_id = self.delta_baseline.match_entity_state(row['ID'], fields, parent_row_id, group_row_ids)
+            if state_id is not None:
+                self.stored_file_states[row['ID']] = state_id
+                if self.delta_baseline.commit_has_states:
+                    self.delta_baseline.stale_state_keys.append(s_key)
+                return
+
+        tmp = {'metrics.{}'.format(k): v for k, v in metrics_dict.items()}
+        tmp['s_key'] = s_key
+        tmp['long_name'] = long_name
+        tmp['commit_id'] = self.commit_id
+        tmp['file_id'] = file_id
+        tmp['ce_type'] = row['type']
+        tmp['cg_ids'] = cg_ids
+        tmp['ce_parent_id'] = ce_parent_id
+        tmp['start_line'] = start_line
+        tmp['end_line'] = end_line
+        tmp['start_column'] = start_column
+        tmp['end_column'] = end_column
+
+        if row['ID'] in self.state_identities:
+            self.entity_state_writer.upsert({'s_key': s_key}, tmp, document_id=self.stored_file_states[row['ID']])
+        else:
+            self.stored_file_states.update(self.entity_state_writer.upsert({'s_key': s_key}, tmp, key=row['ID']))
+
+    def add_to_metric_tables(self, row, metrics_dict):
+        """
+        Adds the code entity state of the given row to the metric tables.
+
+        :param row: row that is processed
+        :param metrics_dict: metrics of the row
+        """
+        long_name, file_id, s_key = self.get_file_state_identity(row)
+        if s_key is None:
+            return
+
+        fields = {'s_key': s_key, 'long_name': long_name, 'file_path': self.sanitize_long_name(row['Path']),
+                  'file_id': str(file_id)}
+        if 'Line' in row and 'EndLine' in row and 'Column' in row and 'EndColumn' in row:
+            fields['start_line'] = int(row['Line'])
+            fields['end_line'] = int(row['EndLine'])
+            fields['start_column'] = int(row['Column'])
+            fields['end_column'] = int(row['EndColumn'])
+
+        self.metric_tables.add(row['type'], fields, metrics_dict)
 
     def store_clone_data(self):
         """
         Parses and stores the cloning data that was generated by sourcemeter.
+        The clone instances are streamed and written with unordered bulk upserts that are keyed on the shard key\
+        (name, commit_id, file_id) of the clone instances.
         """
         logger.info("Parsing & storing clone data...")
         clone_class_csv_path = glob.glob(os.path.join(self.output_path, "*-CloneClass.csv"))[0]
         clone_instance_csv_path = glob.glob(os.path.join(self.output_path, "*-CloneInstance.csv"))[0]
 
+        # The converted metrics of a clone class are shared by all of its instances
         clone_classes = {}
-        with open(clone_class_csv_path) as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                clone_classes[row['ID']] = self.sanitize_metrics_dictionary(copy.deepcopy(row))
-
-        with open(clone_instance_csv_path) as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                metrics_dict = self.sanitize_metrics_dictionary(copy.deepcopy(row))
-                long_name = self.sanitize_long_name(row['Path'])
-
-                tmp = {
-                    'commit_id': self.commit_id,
-                    'name': row['ID'],
-                    'file_id': self.stored_files[long_name],
-                    'clone_class': row['Parent'],
-                    'clone_class_metrics': clone_classes[row['Parent']],
-                    'clone_instance_metrics': metrics_dict,
-                    'start_line': row['Line'],
-                    'end_line': row['EndLine'],
-                    'start_column': row['Column'],
-                    'end_column': row['EndColumn']
-                }
-
-                CloneInstance.objects(name=row['ID'], commit_id=self.commit_id,
-                                      file_id=self.stored_files[long_name]).upsert_one(**tmp)
+        for row in read_projected_rows(clone_class_csv_path):
+            clone_classes[row['ID']] = row.metrics()
+
+        writer = self.create_writer(CloneInstance, id_field=('name', 'commit_id', 'file_id'))
+        for row in read_projected_rows(clone_instance_csv_path):
+            long_name = self.sanitize_long_name(row['Path'])
+            file_id = self.stored_files.get(long_name, None)
+            if file_id is None:
+                logger.warning("Could not store clone instance %s for file %s" % (row['ID'], long_name))
+                continue
+
+            tmp = {
+                'commit_id': self.commit_id,
+                'name': row['ID'],
+                'file_id': file_id,
+                'clone_class': row['Parent'],
+                'clone_class_metrics': clone_classes[row['Parent']],
+                'clone_instance_metrics': row.metrics(),
+                'start_line': int(row['Line']),
+                'end_line': int(row['EndLine']),
+                'start_column': int(row['Column']),
+                'end_column': int(row['EndColumn'])
+            }
+
+            writer.upsert({'name': row['ID'], 'commit_id': self.commit_id, 'file_id': file_id}, tmp)
+        writer.flush()
 
         logger.info("Finished parsing & storing clone data!")
 
+    def get_metrics(self, row):
+        """
+        Gets the metrics of the given row. Rows that were read by this parser build them from the projection of their\
+        csv header, other rows are sanitized via\
+        :func:`sanitize_metrics_dictionary`.
+
+        :param row: row that is processed
+        :return: dictionary of metrics
+        """
+        if isinstance(row, (ProjectedRow, ParsedRow)):
+            return row.metrics()
+
+        return self.sanitize_metrics_dictionary(dict(row))
+
     @staticmethod
     def sanitize_metrics_dictionary(metrics):
         """
@@ -502,7 +1392,7 @@ class SourcemeterParser(object):
     def sanitize_long_name(self, orig_long_name):
         """
         Sanitizes the long_name of the row.
-        1) If the long_name has the input path in it: just strip it
+        1) If the long_name has the analyzed (input) path in it: just strip it
         2) If the long_name has the output path in it: just strip it
         3) Otherwise: The long_name will be separated by "/" and joined together after the first part was split.
 
@@ -512,8 +1402,8 @@ class SourcemeterParser(object):
 
         .. NOTE:: This is necessary, as the output of sourcemeter can be different based on which processor is used.
         """
-        if self.input_path in orig_long_name:
-            long_name = orig_long_name.replace(self.input_path + "/", "")
+        if self.analyzed_path in orig_long_name:
+            long_name = orig_long_name.replace(self.analyzed_path + "/", "")
         elif self.output_path in orig_long_name:
             long_name = orig_long_name.replace(self.output_path + "/", "")
         else:
@@ -532,12 +1422,45 @@ class SourcemeterParser(object):
 
     def get_fullpath(self, long_name):
         """
-        If the long_name is in the input files of the input path, it will return the corresponding file name
+        If the long_name is in the input files of the input path, it will return the corresponding file name.
+        If several input files end with the long_name, the first one of the input files is returned.
 
         :param long_name: long_name of the row
         :return: new long_name
+
+        .. NOTE:: Only the input files whose name matches the last part of the long_name are compared (see\
+        :func:`build_input_file_index`), instead of all input files. If the long_name has no "/", it can be the end of\
+        a file name (e.g., Foo.java matches /src/MyFoo.java), so all file names that end with it are compared.\
+        The results are cached.
         """
-        for file_name in self.input_files:
+        if long_name in self.fullpath_cache:
+            return self.fullpath_cache[long_name]
+
+        if '/' in long_name:
+            candidates = self.input_file_index.get(long_name.rsplit('/', 1)[1], [])
+        else:
+            candidates = [files[0] for name, files in self.input_file_index.items() if name.endswith(long_name)]
+
+        full_path = long_name
+        for _, file_name in sorted(candidates):
             if file_name.endswith(long_name):
-                return file_name
-        return long_name
+                full_path = file_name
+                break
+
+        self.fullpath_cache[long_name] = full_path
+        return full_path
+
+    @staticmethod
+    def build_input_file_index(input_files):
+        """
+        Builds an index for :func:`get_fullpath`. The input files are grouped by their file name (the part after the
+        last "/"), in the order of the input files.
+
+        :param input_files: list of input files
+        :return: dictionary with the file name as key and the list of tuples of the position and the input file as\
+        value
+        """
+        index = {}
+        for position, file_name in enumerate(input_files):
+            index.setdefault(file_name.rsplit('/', 1)[-1], []).append((position, file_name))
+        return index
@@ -0,0 +1,286 @@
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import timeit
+
+from mecoshark.checkout import CheckoutManager
+from mecoshark.mecosharkapp import MecoSHARK
+
+logger = logging.getLogger('mecoshark_main')
+
+# Worker of the current process (created by init_worker in the processes of the pool)
+worker = None
+
+
+class ResourceLimit(object):
+    """
+    Limits how many processes use a resource at the same time with a semaphore that is shared by all processes of
+    the scheduler. Used as context manager around the use of the resource. Records how long this process waited for
+    the resource and how long it used it.
+
+    :property name: name of the resource
+    :property semaphore: :class:`multiprocessing.BoundedSemaphore` that is shared by the processes
+    :property wait_time: seconds this process waited for the resource
+    :property busy_time: seconds this process used the resource
+    """
+    def __init__(self, name, semaphore):
+        """
+        Initialization
+
+        :param name: name of the resource
+        :param semaphore: :class:`multiprocessing.BoundedSemaphore` that is shared by the processes
+        """
+        self.name = name
+        self.semaphore = semaphore
+        self.wait_time = 0.0
+        self.busy_time = 0.0
+        self.acquired_at = None
+
+    def __enter__(self):
+        start_time = timeit.default_timer()
+        self.semaphore.acquire()
+        self.acquired_at = timeit.default_timer()
+        self.wait_time += self.acquired_at - start_time
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.busy_time += timeit.default_timer() - self.acquired_at
+        self.semaphore.release()
+        return False
+
+    def reset(self):
+        """
+        Resets the recorded times
+        """
+        self.wait_time = 0.0
+        self.busy_time = 0.0
+
+
+class RevisionWorker(object):
+    """
+    Worker in a process of the :class:`RevisionScheduler`. The worker has its own checkouts of the revisions (see\
+    :class:`~mecoshark.checkout.CheckoutManager`) and its own output directory in the work directory. The revisions are processed like in the batch mode (see\
+    :func:`~mecoshark.mecosharkapp.MecoSHARK.process_revisions`) by one :class:`~mecoshark.mecosharkapp.MecoSHARK`
+    instance with its own connection to the database.
+
+    :property name: name of the worker (worker-<pid>)
+    :property path: directory of the worker
+    :property repository_path: path to the repository
+    :property checkout_mode: worktree or archive (see :class:`~mecoshark.checkout.CheckoutManager`)
+    :property app_arguments: dictionary of keyword arguments of :class:`~mecoshark.mecosharkapp.MecoSHARK`
+    :property limits: dictionary with the name of the resource as key and the :class:`ResourceLimit` as value
+    :property app: :class:`~mecoshark.mecosharkapp.MecoSHARK` instance (created for the first revision)
+    """
+    def __init__(self, work_dir, repository_path, checkout_mode, app_arguments, semaphores):
+        """
+        Initialization
+
+        :param work_dir: directory in which the directory of the worker is created
+        :param repository_path: path to the repository
+        :param checkout_mode: worktree or archive
+        :param app_arguments: dictionary of keyword arguments of :class:`~mecoshark.mecosharkapp.MecoSHARK` (without\
+        input_path and output)
+        :param semaphores: dictionary with the name of the resource as key and the semaphore as value
+        """
+        self.name = 'worker-%d' % os.getpid()
+        self.path = os.path.join(work_dir, self.name)
+        self.repository_path = repository_path
+        self.checkout_mode = checkout_mode
+        self.app_arguments = app_arguments
+        self.limits = {name: ResourceLimit(name, semaphore) for name, semaphore in semaphores.items()}
+        self.app = None
+
+    def create_app(self):
+        """
+        Creates the directory of the worker and the :class:`~mecoshark.mecosharkapp.MecoSHARK` instance, which\
+        connects to the database. The revisions are materialized in the checkouts directory of the worker.
+        """
+        output_path = os.path.join(self.path, 'output')
+        shutil.rmtree(self.path, True)
+        os.makedirs(output_path)
+        checkouts = CheckoutManager(self.repository_path, os.path.join(self.path, 'checkouts'), self.checkout_mode)
+
+        parser_options = dict(self.app_arguments.get('parser_options') or {}, limits=self.limits)
+        app = MecoSHARK(input_path=self.repository_path, output=output_path, checkouts=checkouts,
+                        **dict(self.app_arguments, parser_options=parser_options))
+        app.open_context()
+        self.app = app
+
+    def process(self, revision):
+        """
+        Processes a revision
+
+        :param revision: revision hash
+        :return: dictionary with the status of the revision and its timings (see :func:`RevisionScheduler.run`)
+        """
+        for limit in self.limits.values():
+            limit.reset()
+
+        start_time = timeit.default_timer()
+        try:
+            if self.app is None:
+                self.create_app()
+            processed = self.app.run_revision(revision)
+        except (Exception, SystemExit) as e:
+            logger.error("Processing revision %s failed: %s" % (revision, e))
+            processed = False
+
+        result = {
+            'revision': revision,
+            'status': 'processed' if processed else 'failed',
+            'worker': self.name,
+            'time': timeit.default_timer() - start_time,
+        }
+        for name, limit in self.limits.items():
+            result[name + '_wait'] = limit.wait_time
+            result[name + '_time'] = limit.busy_time
+        return result
+
+
+def init_worker(work_dir, repository_path, checkout_mode, app_arguments, semaphores):
+    """
+    Creates the :class:`RevisionWorker` of a process of the pool
+
+    :param work_dir: directory in which the directory of the worker is created
+    :param repository_path: path to the repository
+    :param checkout_mode: worktree or archive
+    :param app_arguments: dictionary of keyword arguments of :class:`~mecoshark.mecosharkapp.MecoSHARK`
+    :param semaphores: dictionary with the name of the resource as key and the semaphore as value
+    """
+    global worker
+    worker = RevisionWorker(work_dir, repository_path, checkout_mode, app_arguments, semaphores)
+
+
+def process_revision(revision):
+    """
+    Processes a revision with the :class:`RevisionWorker` of the process
+
+    :param revision: revision hash
+    :return: dictionary with the status of the revision and its timings
+    """
+    return worker.process(revision)
+
+
+class RevisionScheduler(object):
+    """
+    Processes several revisions of a repository at the same time in a pool of worker processes (see\
+    :class:`RevisionWorker`). The number of processes that execute SourceMeter and the number of processes that
+    ingest the results into the database are limited separately (see :class:`ResourceLimit`), so that the workers
+    neither oversubscribe the cores nor the database. The other steps (checkout, language detection) are not limited.
+
+    :property repository_path: path to the repository
+    :property work_dir: directory in which the workers create their checkouts and output directories
+    :property checkout_mode: worktree or archive (see :class:`~mecoshark.checkout.CheckoutManager`)
+    :property app_arguments: dictionary of keyword arguments of :class:`~mecoshark.mecosharkapp.MecoSHARK`
+    :property workers: number of worker processes
+    :property limits: dictionary with the name of the resource as key and the maximal number of processes that use\
+    it at the same time as value
+    :property status_file: path to a file to which the result of every revision is appended as json line (or None)
+    """
+
+    # Start method of the processes. The workers connect to the database after they are forked
+    START_METHOD = 'fork'
+
+    def __init__(self, repository_path, work_dir, app_arguments, workers, max_analyzers=None, max_writers=None,
+                 status_file=None, checkout_mode='worktree'):
+        """
+        Initialization
+
+        :param repository_path: path to the repository
+        :param work_dir: directory in which the workers create their checkouts and output directories
+        :param app_arguments: dictionary of keyword arguments of :class:`~mecoshark.mecosharkapp.MecoSHARK` (without\
+        input_path and output)
+        :param workers: number of worker processes
+        :param max_analyzers: maximal number of SourceMeter executions at the same time (None: workers)
+        :param max_writers: maximal number of processes that write to the database at the same time (None: workers)
+        :param status_file: path to a file to which the result of every revision is appended as json line
+        :param checkout_mode: worktree or archive
+
+        .. WARNING:: The process must not connect to the database before the workers are forked.
+        """
+        self.repository_path = repository_path
+        self.work_dir = work_dir
+        self.app_arguments = app_arguments
+        self.workers = max(workers, 1)
+        self.limits = {
+            'analyzer': min(max_analyzers or self.workers, self.workers),
+            'writer': min(max_writers or self.workers, self.workers),
+        }
+        self.status_file = status_file
+        self.checkout_mode = checkout_mode
+
+    def run(self, revisions):
+        """
+        Processes the revisions. The results are logged (and written to the status file) as soon as a revision is
+        finished.
+
+        :param revisions: list of revision hashes
+        :return: list of dictionaries (in the order of the revisions) with the keys revision, status (processed or\
+        failed), worker, time (seconds) and <resource>_wait and <resource>_time for the analyzer and writer\
+        (seconds the worker waited for and used the resource)
+        """
+        context = multiprocessing.get_context(self.START_METHOD)
+        semaphores = {name: context.BoundedSemaphore(limit) for name, limit in self.limits.items()}
+        os.makedirs(self.work_dir, exist_ok=True)
+
+        # The CPUs are divided among the analyzers that may run at the same time
+        parser_options = dict(self.app_arguments.get('parser_options') or {})
+        parser_options.setdefault('concurrent_analyzers', self.limits['analyzer'])
+
+        # The processes of the pool are daemonic and can not start the processes that parse the csv files
+        if parser_options.get('parse_workers', 0):
+            logger.warning("Parsing the csv files in the workers, as they can not start parse workers.")
+        parser_options['parse_workers'] = 0
+        app_arguments = dict(self.app_arguments, parser_options=parser_options)
+
+        logger.info("Processing %d revisions with %d workers (at most %d analyzers and %d writers at the same time)" %
+                    (len(revisions), self.workers, self.limits['analyzer'], self.limits['writer']))
+
+        start_time = timeit.default_timer()
+        results = {}
+        pool = context.Pool(self.workers, init_worker,
+                            (self.work_dir, self.repository_path, self.checkout_mode, app_arguments, semaphores))
+        try:
+            for result in pool.imap_unordered(process_revision, revisions):
+                results[result['revision']] = result
+                self.report(result, len(results), len(revisions))
+        finally:
+            pool.close()
+            pool.join()
+            self.clean_up()
+
+        logger.info("Processed %d of %d revisions in %0.5f s" % (
+            sum(result['status'] == 'processed' for result in results.values()), len(revisions),
+            timeit.default_timer() - start_time))
+        return [results[revision] for revision in revisions]
+
+    def report(self, result, finished, total):
+        """
+        Logs the result of a revision and appends it to the status file
+
+        :param result: dictionary with the status of the revision and its timings
+        :param finished: number of finished revisions
+        :param total: number of revisions
+        """
+        logger.info("[%d/%d] Revision %s %s by %s in %0.2f s (analysis: %0.2f s, waited %0.2f s; ingest: %0.2f s, "
+                    "waited %0.2f s)" % (finished, total, result['revision'], result['status'], result['worker'],
+                                         result['time'], result['analyzer_time'], result['analyzer_wait'],
+                                         result['writer_time'], result['writer_wait']))
+
+        if self.status_file is not None:
+            with open(self.status_file, 'a') as status_file:
+                status_file.write(json.dumps(result) + '\n')
+
+    def clean_up(self):
+        """
+        Deletes the directories of the workers (and their worktrees from the repository)
+        """
+        for name in os.listdir(self.work_dir):
+            if name.startswith('worker-'):
+                shutil.rmtree(os.path.join(self.work_dir, name), True)
+
+        if self.checkout_mode == 'worktree':
+            subprocess.check_call(['git', '-C', self.repository_path, 'worktree', 'prune'])
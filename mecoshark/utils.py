@@ -4,27 +4,36 @@ import os
 from mecoshark.processor.baseprocessor import BaseProcessor
 
 
+# Plugin directories that were imported by find_plugins
+loaded_plugin_dirs = set()
+
+
 def find_plugins(pluginDir):
     """Finds all python files in the specified path and imports them. This is needed, if we want to
     detect automatically, which processor
 
     :param pluginDir: path to the plugin directory"""
+    if pluginDir in loaded_plugin_dirs:
+        return
+
     plugin_files = [x[:-3] for x in os.listdir(pluginDir) if x.endswith(".py")]
     sys.path.insert(0, pluginDir)
     for plugin in plugin_files:
         __import__(plugin)
+    loaded_plugin_dirs.add(pluginDir)
 
 
-def find_correct_processor(languages, output_path, input_path):
+def find_correct_processor(languages, output_path, input_path, parser_options=None):
     """ Finds the correct processor by looking at the processor.supported_languages property
 
     :param language_identifier: string that represents the language (e.g., **java**)
+    :param parser_options: dictionary of keyword arguments that are passed to the parser of the processors
     """
     # import processor plugins
     find_plugins(os.path.dirname(os.path.realpath(__file__))+"/processor")
     correct_processors = []
     for sc in BaseProcessor.__subclasses__():
-        processor = sc(output_path, input_path)
+        processor = sc(output_path, input_path, parser_options)
 
         language_list = list(languages.keys())
         for language in language_list:
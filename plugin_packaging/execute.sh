@@ -4,12 +4,11 @@ PLUGIN_PATH=$1
 REPOSITORY_PATH=$2
 NEW_UUID=$(cat /dev/urandom | tr -dc 'a-zA-Z0-9' | fold -w 32 | head -n 1)
 
-cp -R $REPOSITORY_PATH "/dev/shm/$NEW_UUID" || exit 1
+mkdir "/dev/shm/$NEW_UUID" || exit 1
 
-cd "/dev/shm/$NEW_UUID" || exit 1
-git checkout -f --quiet $3 || exit 1
-
-COMMAND="python3.5 $PLUGIN_PATH/main.py --input /dev/shm/$NEW_UUID --output /dev/shm/$NEW_UUID --revision $3 --repository_url $4 --project_name $5 --db-hostname $6 --db-port $7 --db-database $8"
+# the revision is extracted from the repository into the RAM disk (without the git metadata) by mecoSHARK. The
+# checkouts are kept next to the output directory (/dev/shm/$NEW_UUID/mecoshark), which the processors clean up
+COMMAND="python3.5 $PLUGIN_PATH/main.py --input $REPOSITORY_PATH --output /dev/shm/$NEW_UUID --checkout archive --scratch-dir /dev/shm/$NEW_UUID/checkouts --revision $3 --repository_url $4 --project_name $5 --db-hostname $6 --db-port $7 --db-database $8"
 
 if [ ! -z ${9+x} ] && [ ${9} != "None" ]; then
 	COMMAND="$COMMAND --db-user ${9}"
@@ -40,7 +39,7 @@ export PATH=$PATH:$PLUGIN_PATH/external/sloccount2.26
 eval $COMMAND
 
 # if folder does not exist exit with 1
-if [ ! -d "/dev/shm/$NEW_UUID/.git" ]; then
+if [ ! -d "$REPOSITORY_PATH/.git" ]; then
     (>&2 echo ".git folder not found!")
 fi
 
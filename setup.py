@@ -15,6 +15,7 @@ setup(
     author_email='trautsch@cs.uni-goettingen.de',
     description='Calculates metrics and clones on revision level.',
     install_requires=['mongoengine', 'pymongo', 'pycoshark>=1.0.14', 'mock'],
+    extras_require={'metrictables': ['pyarrow']},
     url='https://github.com/smartshark/mecoSHARK',
     download_url='https://github.com/smartshark/mecoSHARK/zipball/master',
     packages=find_packages(),
@@ -1,2 +1,2 @@
 #!/bin/sh
-$javaSourcemeter -maximumThreads=4 -projectName=$projectname -projectBaseDir=$input -resultsDir=$results -runMetricHunter=false -runDCF=true -runFB=false -runPMD=true
+$javaSourcemeter -maximumThreads=$threads -projectName=$projectname -projectBaseDir=$input -resultsDir=$results -runMetricHunter=false -runDCF=true -runFB=false -runPMD=true
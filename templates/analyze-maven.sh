@@ -1,3 +1,3 @@
 #!/bin/sh
 cd $results
-$javaSourcemeter -maximumThreads=4 -projectName=$projectname -buildScript=build-maven.sh -resultsDir=$results -runMetricHunter=false -runDCF=true -runFB=false -runPMD=true
+$javaSourcemeter -maximumThreads=$threads -projectName=$projectname -buildScript=build-maven.sh -resultsDir=$results -runMetricHunter=false -runDCF=true -runFB=false -runPMD=true
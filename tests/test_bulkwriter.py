@@ -0,0 +1,99 @@
+import configparser
+import os
+import unittest
+
+from bson import ObjectId
+from mongoengine import connect
+
+from mecoshark.resultparser.bulkwriter import BulkWriter
+from pycoshark.mongomodels import CodeEntityState, CloneInstance
+
+
+class BulkWriterTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Create testconfig
+        config = configparser.ConfigParser()
+        config.read(os.path.dirname(os.path.realpath(__file__)) + "/data/used_test_config.cfg")
+
+        connect(config['Database']['db_database'], username=config['Database']['db_user'],
+                password=config['Database']['db_password'], host=config['Database']['db_hostname'],
+                port=int(config['Database']['db_port']), authentication_source=config['Database']['db_authentication'],
+                connect=False)
+
+    def setUp(self):
+        CodeEntityState.drop_collection()
+        self.collection = CodeEntityState._get_collection()
+
+    def test_upsert_is_written_when_batch_is_full(self):
+        writer = BulkWriter(self.collection, batch_size=2)
+
+        self.assertEqual({}, writer.upsert({'s_key': 'a'}, {'long_name': 'A'}, key='L1'))
+        self.assertTrue(writer.is_pending('L1'))
+        self.assertEqual(0, self.collection.count_documents({}))
+
+        ids = writer.upsert({'s_key': 'b'}, {'long_name': 'B'}, key='L2')
+        self.assertFalse(writer.is_pending('L1'))
+        self.assertEqual(2, self.collection.count_documents({}))
+        self.assertEqual(self.collection.find_one({'s_key': 'a'})['_id'], ids['L1'])
+        self.assertEqual(self.collection.find_one({'s_key': 'b'})['_id'], ids['L2'])
+
+    def test_flush_resolves_ids_of_existing_documents(self):
+        existing_id = self.collection.insert_one({'s_key': 'a', 'long_name': 'old'}).inserted_id
+        writer = BulkWriter(self.collection)
+
+        writer.upsert({'s_key': 'a'}, {'long_name': 'A'}, key='L1')
+        writer.upsert({'s_key': 'b'}, {'long_name': 'B'}, key='L2')
+        ids = writer.flush()
+
+        self.assertEqual(existing_id, ids['L1'])
+        self.assertEqual('A', self.collection.find_one({'_id': existing_id})['long_name'])
+        self.assertEqual(2, self.collection.count_documents({}))
+
+    def test_upserts_with_same_key_are_coalesced(self):
+        writer = BulkWriter(self.collection)
+
+        writer.upsert({'s_key': 'a'}, {'long_name': 'A', 'ce_type': 'class'}, key='L1')
+        writer.upsert({'s_key': 'a'}, {'long_name': 'B'}, key='L2')
+        ids = writer.flush()
+
+        self.assertEqual(1, self.collection.count_documents({}))
+        self.assertEqual(ids['L1'], ids['L2'])
+        document = self.collection.find_one({'s_key': 'a'})
+        self.assertEqual('B', document['long_name'])
+        self.assertEqual('class', document['ce_type'])
+
+    def test_upsert_with_document_id(self):
+        existing_id = self.collection.insert_one({'s_key': 'a', 'long_name': 'old'}).inserted_id
+        new_id = ObjectId()
+        writer = BulkWriter(self.collection)
+
+        writer.upsert({'s_key': 'a'}, {'long_name': 'A'}, document_id=existing_id)
+        writer.upsert({'s_key': 'b'}, {'long_name': 'B'}, document_id=new_id)
+        self.assertEqual({}, writer.flush())
+
+        self.assertEqual('A', self.collection.find_one({'_id': existing_id})['long_name'])
+        self.assertEqual('B', self.collection.find_one({'_id': new_id})['long_name'])
+
+    def test_flush_without_upserts(self):
+        writer = BulkWriter(self.collection)
+        self.assertEqual({}, writer.flush())
+
+    def test_upserts_with_compound_id_field(self):
+        CloneInstance.drop_collection()
+        collection = CloneInstance._get_collection()
+        existing_id = collection.insert_one({'name': 'C1', 'commit_id': 1, 'file_id': 1,
+                                             'clone_class': 'old'}).inserted_id
+        writer = BulkWriter(collection, id_field=('name', 'commit_id', 'file_id'))
+
+        writer.upsert({'name': 'C1', 'commit_id': 1, 'file_id': 1}, {'clone_class': 'A'}, key='L1')
+        writer.upsert({'name': 'C1', 'commit_id': 2, 'file_id': 1}, {'clone_class': 'B'}, key='L2')
+        writer.upsert({'name': 'C1', 'commit_id': 1, 'file_id': 1}, {'start_line': 1}, key='L3')
+        ids = writer.flush()
+
+        self.assertEqual(2, collection.count_documents({}))
+        self.assertEqual(existing_id, ids['L1'])
+        self.assertEqual(existing_id, ids['L3'])
+        self.assertEqual(collection.find_one({'commit_id': 2})['_id'], ids['L2'])
+        self.assertEqual('A', collection.find_one({'_id': existing_id})['clone_class'])
+        self.assertEqual(1, collection.find_one({'_id': existing_id})['start_line'])
@@ -0,0 +1,317 @@
+import configparser
+import copy
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import unittest
+
+import mock
+from bson import ObjectId
+from mongoengine import connect
+from pymongo.errors import OperationFailure
+
+from mecoshark.resultparser.carryforward import CarryForward, SHA1_FUNCTION
+from pycoshark.mongomodels import CodeEntityState, CodeGroupState
+from pycoshark.utils import get_code_entity_state_identifier, get_code_group_state_identifier
+
+
+def get_stage(pipeline, operator, number=0):
+    """
+    Gets a stage of a pipeline by its operator
+
+    :param pipeline: list of stages
+    :param operator: operator of the stage (e.g., $set)
+    :param number: number of the stage among the stages with this operator
+    :return: argument of the stage
+    """
+    return [stage[operator] for stage in pipeline if operator in stage][number]
+
+
+class AggregationEvaluator(object):
+    """
+    Evaluates the stages and expressions of the carry-forward pipelines on documents in memory, like the server
+    does. $function is only evaluated for the SHA1_FUNCTION, with hashlib (see test_sha1_function_equals_hashlib).
+    """
+    def __init__(self, collections):
+        self.collections = collections
+
+    def aggregate(self, collection, pipeline):
+        documents = [copy.deepcopy(document) for document in self.collections[collection]]
+        for stage in pipeline:
+            (operator, argument), = stage.items()
+            documents = getattr(self, 'stage_' + operator[1:])(documents, argument)
+        return documents
+
+    def stage_match(self, documents, query):
+        def matches(document):
+            for field, condition in query.items():
+                value = document.get(field, None)
+                if isinstance(condition, dict) and '$in' in condition:
+                    if value not in condition['$in']:
+                        return False
+                elif isinstance(condition, dict) and '$exists' in condition:
+                    if (field in document) != condition['$exists']:
+                        return False
+                elif value != condition:
+                    return False
+            return True
+        return [document for document in documents if matches(document)]
+
+    def stage_lookup(self, documents, argument):
+        foreign_documents = self.collections[argument['from']]
+        for document in documents:
+            local_value = self.get_path(document, argument['localField'])
+            local_values = local_value if isinstance(local_value, list) else [local_value]
+            document[argument['as']] = [copy.deepcopy(foreign) for foreign in foreign_documents
+                                        if foreign.get(argument['foreignField'], None) in local_values]
+        return documents
+
+    def stage_set(self, documents, fields, variables=None):
+        return [dict(document, **{name: self.evaluate(expression, document, variables or {})
+                                  for name, expression in fields.items()}) for document in documents]
+
+    def stage_unset(self, documents, names):
+        return [{name: value for name, value in document.items() if name not in names} for document in documents]
+
+    def stage_project(self, documents, fields):
+        return [dict({'_id': document['_id']}, **{name: self.evaluate(expression, document, {})
+                                                  for name, expression in fields.items()})
+                for document in documents]
+
+    def stage_merge(self, documents, argument):
+        target = self.collections[argument['into']]
+        on = argument['on']
+        for document in documents:
+            matched = [index for index, existing in enumerate(target) if existing.get(on, None) == document[on]]
+            if not matched:
+                if argument['whenNotMatched'] == 'insert':
+                    target.append(dict(document, _id=document.get('_id', None) or ObjectId()))
+                continue
+
+            existing = target[matched[0]]
+            if argument['whenMatched'] == 'replace':
+                target[matched[0]] = dict(document, _id=existing['_id'])
+            else:
+                merged = [existing]
+                for stage in argument['whenMatched']:
+                    (operator, stage_argument), = stage.items()
+                    if operator == '$set':
+                        merged = self.stage_set(merged, stage_argument, {'new': document})
+                    else:
+                        merged = getattr(self, 'stage_' + operator[1:])(merged, stage_argument)
+                target[matched[0]] = merged[0]
+        return []
+
+    def get_path(self, value, path):
+        for name in path.split('.'):
+            if isinstance(value, list):
+                value = [item.get(name, None) for item in value]
+            elif isinstance(value, dict):
+                value = value.get(name, None)
+            else:
+                return None
+        return value
+
+    def evaluate(self, expression, document, variables):
+        if isinstance(expression, str) and expression.startswith('$$'):
+            name, _, path = expression[2:].partition('.')
+            return self.get_path(variables[name], path) if path else variables[name]
+        if isinstance(expression, str) and expression.startswith('$'):
+            return self.get_path(document, expression[1:])
+        if isinstance(expression, list):
+            return [self.evaluate(item, document, variables) for item in expression]
+        if isinstance(expression, dict) and len(expression) == 1 and next(iter(expression)).startswith('$'):
+            (operator, argument), = expression.items()
+            return getattr(self, 'operator_' + operator[1:])(argument, document, variables)
+        return expression
+
+    def operator_let(self, argument, document, variables):
+        variables = dict(variables, **{name: self.evaluate(expression, document, variables)
+                                       for name, expression in argument['vars'].items()})
+        return self.evaluate(argument['in'], document, variables)
+
+    def operator_indexOfArray(self, argument, document, variables):
+        array, value = self.evaluate(argument, document, variables)
+        return array.index(value) if value in array else -1
+
+    def operator_cond(self, argument, document, variables):
+        condition, then, otherwise = argument
+        return self.evaluate(then if self.evaluate(condition, document, variables) else otherwise, document,
+                             variables)
+
+    def operator_gte(self, argument, document, variables):
+        first, second = self.evaluate(argument, document, variables)
+        return first >= second
+
+    def operator_eq(self, argument, document, variables):
+        first, second = self.evaluate(argument, document, variables)
+        return first == second
+
+    def operator_ne(self, argument, document, variables):
+        first, second = self.evaluate(argument, document, variables)
+        return first != second
+
+    def operator_arrayElemAt(self, argument, document, variables):
+        array, index = self.evaluate(argument, document, variables)
+        return array[index] if array is not None and 0 <= index < len(array) else None
+
+    def operator_ifNull(self, argument, document, variables):
+        value, replacement = self.evaluate(argument, document, variables)
+        return value if value is not None else replacement
+
+    def operator_map(self, argument, document, variables):
+        return [self.evaluate(argument['in'], document, dict(variables, **{argument['as']: item}))
+                for item in self.evaluate(argument['input'], document, variables)]
+
+    def operator_filter(self, argument, document, variables):
+        return [item for item in self.evaluate(argument['input'], document, variables)
+                if self.evaluate(argument['cond'], document, dict(variables, **{argument['as']: item}))]
+
+    def operator_concat(self, argument, document, variables):
+        values = self.evaluate(argument, document, variables)
+        return None if None in values else ''.join(values)
+
+    def operator_toString(self, argument, document, variables):
+        value = self.evaluate(argument, document, variables)
+        return None if value is None else str(value)
+
+    def operator_function(self, argument, document, variables):
+        assert argument['body'] == SHA1_FUNCTION
+        value, = self.evaluate(argument['args'], document, variables)
+        return None if value is None else hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+
+class CarryForwardTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Create testconfig
+        config = configparser.ConfigParser()
+        config.read(os.path.dirname(os.path.realpath(__file__)) + "/data/used_test_config.cfg")
+
+        connect(config['Database']['db_database'], username=config['Database']['db_user'],
+                password=config['Database']['db_password'], host=config['Database']['db_hostname'],
+                port=int(config['Database']['db_port']), authentication_source=config['Database']['db_authentication'],
+                connect=False)
+
+    def setUp(self):
+        self.parent_commit_id = ObjectId()
+        self.commit_id = ObjectId()
+        self.carry_forward = CarryForward(self.parent_commit_id, self.commit_id)
+        self.entity_collection = CodeEntityState._get_collection_name()
+        self.group_collection = CodeGroupState._get_collection_name()
+
+    @unittest.skipUnless(shutil.which('node'), 'needs node to evaluate the javascript function')
+    def test_sha1_function_equals_hashlib(self):
+        values = ['', 'org.Foo.bar(Ljava/lang/String;)V', 'x' * 55, 'x' * 56, 'x' * 64, 'x' * 1000,
+                  'Umlaut ü € \U0001d11e' * 10, None]
+        script = 'var sha1 = %s;\nconsole.log(JSON.stringify(%s.map(sha1)));' % (SHA1_FUNCTION, json.dumps(values))
+
+        digests = json.loads(subprocess.check_output(['node', '-e', script]).decode())
+
+        self.assertEqual([hashlib.sha1(value.encode('utf-8')).hexdigest() if value is not None else None
+                          for value in values], digests)
+
+    def test_copy_pipeline(self):
+        file_ids = [ObjectId(), ObjectId()]
+        pipeline = self.carry_forward.get_copy_pipeline(file_ids)
+
+        self.assertEqual({'commit_id': self.parent_commit_id, 'file_id': {'$in': file_ids}},
+                         get_stage(pipeline, '$match'))
+        self.assertEqual(self.commit_id, get_stage(pipeline, '$set')['commit_id'])
+        self.assertEqual(['$long_name', str(self.commit_id), {'$toString': '$file_id'}],
+                         get_stage(pipeline, '$set')['s_key']['$function']['args'][0]['$concat'])
+        self.assertIn('_id', get_stage(pipeline, '$unset'))
+        self.assertEqual('s_key', get_stage(pipeline, '$merge')['on'])
+        self.assertIn('$merge', pipeline[-1])
+
+    def test_resolve_pipeline(self):
+        pipeline = self.carry_forward.get_resolve_pipeline()
+
+        self.assertEqual(self.commit_id, get_stage(pipeline, '$match')['commit_id'])
+        # The states are merged on the shard key
+        self.assertEqual('s_key', get_stage(pipeline, '$merge')['on'])
+        self.assertEqual('$s_key', get_stage(pipeline, '$project')['s_key'])
+        self.assertEqual('discard', get_stage(pipeline, '$merge')['whenNotMatched'])
+        self.assertIn('$merge', pipeline[-1])
+
+    def test_copied_states_are_removed_on_failure(self):
+        CodeEntityState.drop_collection()
+        collection = CodeEntityState._get_collection()
+        collection.insert_many([
+            {'s_key': 'copied', 'commit_id': self.commit_id, 'carried_group_keys': []},
+            {'s_key': 'written', 'commit_id': self.commit_id},
+            {'s_key': 'parent', 'commit_id': self.parent_commit_id, 'carried_group_keys': []},
+        ])
+
+        with mock.patch.object(type(collection), 'aggregate', side_effect=OperationFailure('failed')):
+            self.assertFalse(self.carry_forward.copy_states([ObjectId()], 10))
+            self.assertEqual(['parent', 'written'], sorted(state['s_key'] for state in collection.find()))
+
+            collection.insert_one({'s_key': 'copied', 'commit_id': self.commit_id, 'carried_group_keys': []})
+            with self.assertRaises(OperationFailure):
+                self.carry_forward.resolve_references()
+            self.assertEqual(['parent', 'written'], sorted(state['s_key'] for state in collection.find()))
+
+    def test_copy_and_resolve_states(self):
+        unchanged_file = ObjectId()
+        changed_file = ObjectId()
+        component = {'_id': ObjectId(), 'long_name': 'component', 'commit_id': self.parent_commit_id}
+        package = {'_id': ObjectId(), 'long_name': 'org.test', 'commit_id': self.parent_commit_id}
+        parent_class = {'_id': ObjectId(), 'long_name': 'org.test.A', 'commit_id': self.parent_commit_id,
+                        'file_id': unchanged_file, 'ce_parent_id': None, 'cg_ids': [package['_id'], component['_id']],
+                        'metrics': {'LOC': 10.0}}
+        parent_method = {'_id': ObjectId(), 'long_name': 'org.test.A.a()', 'commit_id': self.parent_commit_id,
+                         'file_id': unchanged_file, 'ce_parent_id': parent_class['_id'], 'cg_ids': [component['_id']],
+                         'metrics': {'LOC': 2.0}}
+        parent_changed = {'_id': ObjectId(), 'long_name': 'org.test.B', 'commit_id': self.parent_commit_id,
+                          'file_id': changed_file, 'ce_parent_id': None, 'cg_ids': [package['_id']]}
+        collections = {self.entity_collection: [parent_class, parent_method, parent_changed],
+                       self.group_collection: [component, package]}
+        evaluator = AggregationEvaluator(collections)
+
+        # Step 1: the states of the unchanged file are copied with the commit_id and s_key of the analyzed commit
+        evaluator.aggregate(self.entity_collection, self.carry_forward.get_copy_pipeline([unchanged_file]))
+
+        copied = {state['long_name']: state for state in collections[self.entity_collection]
+                  if state['commit_id'] == self.commit_id}
+        self.assertEqual(['org.test.A', 'org.test.A.a()'], sorted(copied))
+        self.assertEqual(5, len(collections[self.entity_collection]))
+        for long_name, state in copied.items():
+            self.assertEqual(get_code_entity_state_identifier(long_name, self.commit_id, unchanged_file), state['s_key'])
+            self.assertNotIn(state['_id'], (parent_class['_id'], parent_method['_id']))
+            self.assertNotIn('carried_parent', state)
+            self.assertNotIn('carried_groups', state)
+        self.assertEqual({'LOC': 2.0}, copied['org.test.A.a()']['metrics'])
+        self.assertEqual(copied['org.test.A']['s_key'], copied['org.test.A.a()']['carried_parent_key'])
+        self.assertIsNone(copied['org.test.A']['carried_parent_key'])
+        self.assertEqual([get_code_group_state_identifier('org.test', self.commit_id),
+                          get_code_group_state_identifier('component', self.commit_id)],
+                         copied['org.test.A']['carried_group_keys'])
+
+        # The states of the parent commit are not changed
+        self.assertEqual(self.parent_commit_id, parent_method['commit_id'])
+        self.assertEqual(parent_class['_id'], parent_method['ce_parent_id'])
+
+        # Step 2: the references are resolved to the states of the analyzed commit (written in the meantime)
+        new_component = {'_id': ObjectId(), 'long_name': 'component', 'commit_id': self.commit_id,
+                         's_key': get_code_group_state_identifier('component', self.commit_id)}
+        new_package = {'_id': ObjectId(), 'long_name': 'org.test', 'commit_id': self.commit_id,
+                       's_key': get_code_group_state_identifier('org.test', self.commit_id)}
+        collections[self.group_collection].extend([new_component, new_package])
+        evaluator.aggregate(self.entity_collection, self.carry_forward.get_resolve_pipeline())
+
+        resolved = {state['long_name']: state for state in collections[self.entity_collection]
+                    if state['commit_id'] == self.commit_id}
+        self.assertIsNone(resolved['org.test.A']['ce_parent_id'])
+        self.assertEqual([new_package['_id'], new_component['_id']], resolved['org.test.A']['cg_ids'])
+        self.assertEqual(resolved['org.test.A']['_id'], resolved['org.test.A.a()']['ce_parent_id'])
+        self.assertEqual([new_component['_id']], resolved['org.test.A.a()']['cg_ids'])
+        for state in resolved.values():
+            self.assertNotIn('carried_parent_key', state)
+            self.assertNotIn('carried_group_keys', state)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import shutil
+import subprocess
+import unittest
+
+from pathlib import Path
+
+from mecoshark.checkout import CheckoutManager
+
+
+class CheckoutManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.repository_path = os.path.dirname(os.path.realpath(__file__)) + '/data/checkout_repository'
+        self.scratch_dir = os.path.dirname(os.path.realpath(__file__)) + '/data/checkout_scratch'
+        shutil.rmtree(self.repository_path, ignore_errors=True)
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+        os.makedirs(self.repository_path + '/src')
+        self.git('init', '-q')
+        Path(self.repository_path + '/src/A.java').write_text('class A {}')
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'first')
+        self.first = self.head()
+
+        Path(self.repository_path + '/src/B.java').write_text('class B {}')
+        Path(self.repository_path + '/README').write_text('readme')
+        os.remove(self.repository_path + '/src/A.java')
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', 'second')
+        self.second = self.head()
+
+    def tearDown(self):
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+        shutil.rmtree(self.repository_path, ignore_errors=True)
+
+    def git(self, *args):
+        subprocess.check_output(['git', '-C', self.repository_path, '-c', 'user.name=test', '-c',
+                                 'user.email=test@test.de'] + list(args), stderr=subprocess.DEVNULL)
+
+    def head(self):
+        return subprocess.check_output(['git', '-C', self.repository_path, 'rev-parse', 'HEAD']).decode('ascii').strip()
+
+    def check_reuse(self, mode):
+        manager = CheckoutManager(self.repository_path, self.scratch_dir, mode)
+
+        with manager.checkout(self.first) as path:
+            self.assertTrue(os.path.isfile(path + '/src/A.java'))
+            self.assertFalse(os.path.isdir(path + '/.git'))
+            # e.g., created by the analysis
+            os.makedirs(path + '/.sloccount')
+
+        with manager.checkout(self.second) as second_path:
+            self.assertEqual(path, second_path)
+            self.assertEqual(['B.java'], os.listdir(path + '/src'))
+            self.assertTrue(os.path.isfile(path + '/README'))
+            self.assertFalse(os.path.exists(path + '/.sloccount'))
+
+        self.assertEqual(1, len(manager.checkouts))
+        manager.close()
+        self.assertFalse(os.path.exists(path))
+        return path
+
+    def test_worktree(self):
+        self.check_reuse('worktree')
+        output = subprocess.check_output(['git', '-C', self.repository_path, 'worktree', 'list', '--porcelain'])
+        self.assertEqual(1, output.decode('utf-8').count('worktree '))
+
+    def test_archive(self):
+        path = self.check_reuse('archive')
+        self.assertFalse(os.path.exists(path + '/.git'))
+
+    def check_sparse(self, mode):
+        manager = CheckoutManager(self.repository_path, self.scratch_dir, mode)
+
+        with manager.checkout(self.second) as path:
+            self.assertTrue(os.path.isfile(path + '/README'))
+
+        with manager.checkout(self.second, [':(glob)**/*.java']) as path:
+            self.assertEqual(['B.java'], os.listdir(path + '/src'))
+            self.assertFalse(os.path.exists(path + '/README'))
+
+        with manager.checkout(self.first, []) as path:
+            self.assertFalse(os.path.exists(path + '/src'))
+
+        with manager.checkout(self.first, [':(glob)**/*.java']) as path:
+            self.assertEqual(['A.java'], os.listdir(path + '/src'))
+
+        manager.close()
+
+    def test_sparse_worktree(self):
+        self.check_sparse('worktree')
+
+    def test_sparse_archive(self):
+        self.check_sparse('archive')
+
+    def test_pool(self):
+        manager = CheckoutManager(self.repository_path, self.scratch_dir, 'archive')
+        first_path = manager.acquire(self.first)
+        second_path = manager.acquire(self.second)
+
+        self.assertNotEqual(first_path, second_path)
+        self.assertEqual(['A.java'], os.listdir(first_path + '/src'))
+        self.assertEqual(['B.java'], os.listdir(second_path + '/src'))
+        manager.close()
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            CheckoutManager(self.repository_path, self.scratch_dir, 'copy')
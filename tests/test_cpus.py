@@ -0,0 +1,66 @@
+import os
+import shutil
+import unittest
+
+import mock
+
+from mecoshark import cpus
+from mecoshark.cpus import get_cgroup_cpu_limit, get_thread_count
+from mecoshark.processor.javaprocessor import JavaProcessor
+
+
+class CPUsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = os.path.dirname(os.path.realpath(__file__)) + '/data/cgroup'
+        self.proc_cgroup = self.root + '/proc_cgroup'
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write(self, path, content):
+        path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as cgroup_file:
+            cgroup_file.write(content)
+
+    def test_cgroup_v2(self):
+        self.write('proc_cgroup', '0::/job\n')
+        self.write('job/cpu.max', '150000 100000\n')
+        self.assertEqual(1.5, get_cgroup_cpu_limit(self.root, self.proc_cgroup))
+
+        self.write('job/cpu.max', 'max 100000\n')
+        self.assertIsNone(get_cgroup_cpu_limit(self.root, self.proc_cgroup))
+
+    def test_cgroup_v1(self):
+        self.write('proc_cgroup', '4:memory:/job\n2:cpu,cpuacct:/job\n')
+        self.write('cpu,cpuacct/job/cpu.cfs_quota_us', '200000\n')
+        self.write('cpu,cpuacct/job/cpu.cfs_period_us', '100000\n')
+        self.assertEqual(2.0, get_cgroup_cpu_limit(self.root, self.proc_cgroup))
+
+        self.write('cpu,cpuacct/job/cpu.cfs_quota_us', '-1\n')
+        self.assertIsNone(get_cgroup_cpu_limit(self.root, self.proc_cgroup))
+
+    def test_no_cgroup(self):
+        self.assertIsNone(get_cgroup_cpu_limit(self.root, self.proc_cgroup))
+
+    @mock.patch.object(cpus, 'get_available_cpus', return_value=16)
+    def test_thread_count(self, get_available_cpus):
+        with mock.patch.object(cpus, 'get_cgroup_cpu_limit', return_value=None):
+            self.assertEqual(16, get_thread_count())
+            self.assertEqual(5, get_thread_count(3))
+            self.assertEqual(1, get_thread_count(32))
+
+        with mock.patch.object(cpus, 'get_cgroup_cpu_limit', return_value=2.5):
+            self.assertEqual(3, get_thread_count())
+            self.assertEqual(1, get_thread_count(2))
+
+    def test_template_threads(self):
+        template = os.path.dirname(os.path.realpath(__file__)) + '/../templates/analyze-dir.sh'
+        processor = JavaProcessor(self.root, self.root, {'threads': 3})
+        processor.prepare_template(template)
+
+        with open(os.path.join(self.root, 'analyze-dir.sh')) as script:
+            self.assertIn('-maximumThreads=3 ', script.read())
@@ -0,0 +1,131 @@
+import configparser
+import os
+import unittest
+
+from bson import ObjectId
+from mongoengine import connect
+
+from mecoshark.resultparser.delta import CodeStateInheritance, DeltaBaseline
+from pycoshark.mongomodels import CodeEntityState, CodeGroupState
+
+
+class DeltaBaselineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Create testconfig
+        config = configparser.ConfigParser()
+        config.read(os.path.dirname(os.path.realpath(__file__)) + "/data/used_test_config.cfg")
+
+        connect(config['Database']['db_database'], username=config['Database']['db_user'],
+                password=config['Database']['db_password'], host=config['Database']['db_hostname'],
+                port=int(config['Database']['db_port']), authentication_source=config['Database']['db_authentication'],
+                connect=False)
+
+    def setUp(self):
+        self.commit1 = ObjectId()
+        self.commit2 = ObjectId()
+        self.file_id = ObjectId()
+        self.baseline = DeltaBaseline([self.commit1, self.commit2])
+
+    def create_entity_state(self, commit_id, long_name, metrics, **fields):
+        state = {'_id': ObjectId(), 'commit_id': commit_id, 'long_name': long_name, 'file_id': self.file_id,
+                 'ce_type': 'method', 'metrics': metrics, 'start_line': 1, 'end_line': 2, 'start_column': 3,
+                 'end_column': 4}
+        state.update(fields)
+        return state
+
+    def get_fields(self, long_name, metrics):
+        return {'long_name': long_name, 'file_id': self.file_id, 'ce_type': 'method', 'metrics': metrics,
+                'start_line': 1, 'end_line': 2, 'start_column': 3, 'end_column': 4}
+
+    def test_fold_states(self):
+        state1 = self.create_entity_state(self.commit1, 'A.a()', {'LOC': 1.0})
+        state2 = self.create_entity_state(self.commit1, 'A.b()', {'LOC': 1.0})
+        state3 = self.create_entity_state(self.commit1, 'A.c()', {'LOC': 1.0})
+        state4 = self.create_entity_state(self.commit2, 'A.a()', {'LOC': 2.0})
+
+        states = {}
+        self.baseline.fold_states(states, [state3, state2, state1], set(), lambda document: document['long_name'])
+        self.baseline.fold_states(states, [state4], {state2['_id']}, lambda document: document['long_name'])
+
+        self.assertEqual({'A.a()': state4, 'A.c()': state3}, states)
+
+    def test_load(self):
+        CodeEntityState.drop_collection()
+        CodeGroupState.drop_collection()
+        CodeStateInheritance.drop_collection()
+        removed_file = ObjectId()
+        other_file = ObjectId()
+        group1 = {'_id': ObjectId(), 'commit_id': self.commit1, 'long_name': 'org', 'metrics': {}}
+        group2 = {'_id': ObjectId(), 'commit_id': self.commit2, 'long_name': 'org', 'metrics': {'TLOC': 1.0}}
+        state1 = self.create_entity_state(self.commit1, 'A.a()', {'LOC': 1.0})
+        state2 = self.create_entity_state(self.commit1, 'A.b()', {'LOC': 1.0})
+        state3 = self.create_entity_state(self.commit1, 'B', {'LOC': 1.0}, file_id=other_file)
+        state4 = self.create_entity_state(self.commit2, 'A.a()', {'LOC': 2.0})
+        removed1 = self.create_entity_state(self.commit1, 'C', {'LOC': 1.0}, file_id=removed_file)
+        removed2 = self.create_entity_state(self.commit2, 'C', {'LOC': 2.0}, file_id=removed_file)
+        CodeGroupState._get_collection().insert_many([dict(group, s_key=str(group['_id'])) for group in (group1, group2)])
+        CodeEntityState._get_collection().insert_many([dict(state, s_key=str(state['_id'])) for state in (
+            state1, state2, state3, state4, removed1, removed2)])
+        CodeStateInheritance._get_collection().insert_one({'commit_id': self.commit2,
+                                                           'removed_ce_ids': [state2['_id']]})
+
+        self.baseline.load([self.file_id, other_file, ObjectId()], 1)
+
+        self.assertEqual({('A.a()', self.file_id): state4['_id'], ('B', other_file): state3['_id']},
+                         {key: state['_id'] for key, state in self.baseline.entity_states.items()})
+        self.assertEqual(group2['_id'], self.baseline.group_states['org']['_id'])
+        self.assertEqual([removed2['_id']], self.baseline.removed_entity_ids)
+
+        # The names of the states that were replaced by later commits are kept, as inherited states may reference them
+        self.assertEqual('A.a()', self.baseline.state_names[state1['_id']])
+        self.assertEqual('org', self.baseline.state_names[group1['_id']])
+
+    def test_match_entity_state(self):
+        group_id = ObjectId()
+        parent = self.create_entity_state(self.commit1, 'A', {'LOC': 5.0}, ce_type='class', cg_ids=[group_id])
+        child = self.create_entity_state(self.commit1, 'A.a()', {'LOC': 1.0}, ce_parent_id=parent['_id'])
+        changed = self.create_entity_state(self.commit1, 'A.b()', {'LOC': 1.0}, ce_parent_id=parent['_id'])
+        removed = self.create_entity_state(self.commit1, 'A.c()', {'LOC': 1.0}, ce_parent_id=parent['_id'])
+        self.baseline.entity_states = {(state['long_name'], self.file_id): state
+                                       for state in (parent, child, changed, removed)}
+        self.baseline.state_names = {state['_id']: state['long_name'] for state in (parent, child, changed, removed)}
+        self.baseline.state_names[group_id] = 'org.package'
+        self.baseline.row_names['L1'] = 'org.package'
+
+        # The class changed, the unchanged method is still inherited as its parent is the same (by long name)
+        fields = dict(self.get_fields('A', {'LOC': 6.0}), ce_type='class')
+        self.assertIsNone(self.baseline.match_entity_state('L2', fields, None, ['L1']))
+        self.assertEqual(child['_id'],
+                         self.baseline.match_entity_state('L3', self.get_fields('A.a()', {'LOC': 1.0}), 'L2', []))
+        self.assertIsNone(self.baseline.match_entity_state('L4', self.get_fields('A.b()', {'LOC': 2.0}), 'L2', []))
+        self.assertIsNone(self.baseline.match_entity_state('L5', self.get_fields('A.d()', {'LOC': 2.0}), 'L2', []))
+
+        self.assertEqual(1, self.baseline.inherited_entity_states)
+        self.assertEqual(([removed['_id']], []), self.baseline.get_removed_ids())
+
+    def test_match_entity_state_without_metrics(self):
+        # The stored state of an attribute has no metrics field, as the row has no metric columns
+        attribute = self.create_entity_state(self.commit1, 'a.Foo.f', {}, ce_type='attribute')
+        del attribute['metrics']
+        self.baseline.entity_states = {('a.Foo.f', self.file_id): attribute}
+
+        fields = dict(self.get_fields('a.Foo.f', {}), ce_type='attribute')
+        self.assertEqual(attribute['_id'], self.baseline.match_entity_state('L1', fields, None, []))
+        self.assertIsNone(self.baseline.match_entity_state('L1', dict(fields, metrics={'LOC': 1.0}), None, []))
+        self.assertEqual(1, self.baseline.inherited_entity_states)
+
+    def test_match_group_state(self):
+        component = {'_id': ObjectId(), 'commit_id': self.commit1, 'long_name': 'component', 'cg_type': 'component',
+                     'metrics': {'LOC': 10.0}}
+        package = {'_id': ObjectId(), 'commit_id': self.commit1, 'long_name': 'org', 'cg_type': 'package',
+                   'metrics': {'LOC': 5.0}, 'cg_parent_ids': [component['_id']]}
+        self.baseline.group_states = {'component': component, 'org': package}
+        self.baseline.state_names = {component['_id']: 'component', package['_id']: 'org'}
+
+        fields = {'long_name': 'component', 'cg_type': 'component', 'metrics': {'LOC': 11.0}}
+        self.assertIsNone(self.baseline.match_group_state('L1', fields, []))
+
+        fields = {'long_name': 'org', 'cg_type': 'package', 'metrics': {'LOC': 5.0}}
+        self.assertEqual(package['_id'], self.baseline.match_group_state('L2', fields, ['L1']))
+        self.assertEqual(1, self.baseline.inherited_group_states)
@@ -0,0 +1,52 @@
+import json
+import os
+import shutil
+import unittest
+
+from bson import ObjectId
+
+from mecoshark.resultparser.export import Export, read_export_file, to_document, to_fields
+
+
+class ExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.export_dir = os.path.dirname(os.path.realpath(__file__)) + '/data/export'
+        shutil.rmtree(self.export_dir, ignore_errors=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.export_dir, ignore_errors=True)
+
+    def test_document_of_upsert(self):
+        document_id = ObjectId()
+        fields = {'metrics.LOC': 3.0, 'metrics.McCC': 1.0, 's_key': 'abc', 'long_name': 'A.a()', 'cg_ids': []}
+
+        document = to_document({'s_key': 'abc'}, fields, document_id)
+
+        self.assertEqual({'_id': document_id, 's_key': 'abc', 'long_name': 'A.a()', 'cg_ids': [],
+                          'metrics': {'LOC': 3.0, 'McCC': 1.0}}, document)
+        document.pop('_id')
+        self.assertEqual(fields, to_fields(document))
+
+    def test_export_formats(self):
+        for file_format in ('json', 'bson'):
+            export = Export(self.export_dir, file_format, file_format)
+            writer = export.create_writer('code_entity_state')
+            document_id = ObjectId()
+            self.assertEqual({'L1': document_id},
+                             writer.upsert({'s_key': 'abc'}, {'metrics.LOC': 1.5, 'start_line': 3}, key='L1',
+                                           document_id=document_id))
+            clone_writer = export.create_writer('clone_instance', id_field=('name', 'commit_id'))
+            clone_writer.upsert({'name': 'C1', 'commit_id': document_id}, {'clone_class': 'C'})
+            export.update('code_entity_state', document_id, {'linter': [{'l_ty': 'x'}]})
+            export.close()
+
+            with open(os.path.join(export.path, 'manifest.json')) as manifest_file:
+                manifest = json.load(manifest_file)
+            self.assertEqual(['name', 'commit_id'], manifest['collections']['clone_instance']['id_field'])
+
+            path = os.path.join(export.path, manifest['collections']['code_entity_state']['file'])
+            self.assertEqual([{'_id': document_id, 's_key': 'abc', 'metrics': {'LOC': 1.5}, 'start_line': 3}],
+                             list(read_export_file(path)))
+            path = os.path.join(export.path, manifest['updates']['code_entity_state']['file'])
+            self.assertEqual([{'_id': document_id, 'linter': [{'l_ty': 'x'}]}], list(read_export_file(path)))
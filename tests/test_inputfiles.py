@@ -0,0 +1,73 @@
+import os
+import shutil
+import subprocess
+import unittest
+
+from pathlib import Path
+
+from mecoshark.resultparser.inputfiles import list_changed_files, list_git_files, list_input_files, \
+    walk_input_files
+
+
+class InputFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.input_path = os.path.dirname(os.path.realpath(__file__)) + '/data/input_files'
+        shutil.rmtree(self.input_path, ignore_errors=True)
+
+        os.makedirs(self.input_path + '/src/main')
+        os.makedirs(self.input_path + '/.git/objects')
+        os.makedirs(self.input_path + '/lib/.svn')
+        Path(self.input_path + '/src/main/A.java').touch()
+        Path(self.input_path + '/src/B.java').touch()
+        Path(self.input_path + '/.git/HEAD').touch()
+        Path(self.input_path + '/lib/.svn/entries').touch()
+        Path(self.input_path + '/README').touch()
+
+    def tearDown(self):
+        shutil.rmtree(self.input_path, ignore_errors=True)
+
+    def git(self, *args):
+        subprocess.check_output(['git', '-C', self.input_path, '-c', 'user.name=test', '-c', 'user.email=test@test.de']
+                                + list(args), stderr=subprocess.DEVNULL)
+
+    def test_walk_input_files(self):
+        self.assertEqual(['/README', '/src/B.java', '/src/main/A.java'], walk_input_files(self.input_path))
+
+    def test_list_git_files(self):
+        shutil.rmtree(self.input_path + '/.git')
+        self.git('init', '-q')
+        self.git('add', 'src')
+        self.git('commit', '-q', '-m', 'first')
+        revision = subprocess.check_output(['git', '-C', self.input_path, 'rev-parse', 'HEAD']).decode().strip()
+        self.git('add', 'README')
+
+        self.assertEqual(['/src/B.java', '/src/main/A.java'], list_git_files(self.input_path, revision))
+        self.assertEqual(['/README', '/src/B.java', '/src/main/A.java'], list_git_files(self.input_path))
+        self.assertEqual(['/src/B.java', '/src/main/A.java'], list_input_files(self.input_path, revision))
+
+        # checkout without git metadata, the files are listed from the repository
+        checkout_path = self.input_path + '/checkout'
+        os.makedirs(checkout_path)
+        self.assertEqual(['/src/B.java', '/src/main/A.java'],
+                         list_input_files(checkout_path, revision, repository_path=self.input_path))
+
+    def test_list_changed_files(self):
+        shutil.rmtree(self.input_path + '/.git')
+        self.git('init', '-q')
+        self.git('add', 'src', 'README')
+        self.git('commit', '-q', '-m', 'first')
+        old_revision = subprocess.check_output(['git', '-C', self.input_path, 'rev-parse', 'HEAD']).decode().strip()
+        Path(self.input_path + '/src/B.java').write_text('class B {}')
+        self.git('mv', 'README', 'README.md')
+        self.git('commit', '-q', '-a', '-m', 'second')
+
+        self.assertEqual({'/README', '/README.md', '/src/B.java'},
+                         list_changed_files(self.input_path, old_revision, 'HEAD'))
+        self.assertIsNone(list_changed_files(self.input_path, 'abc', 'HEAD'))
+
+    def test_list_input_files_without_git(self):
+        # .git is no repository, so the input path is traversed
+        self.assertEqual(['/README', '/src/B.java', '/src/main/A.java'], list_input_files(self.input_path, 'abc'))
+        self.assertEqual(['/README', '/src/B.java', '/src/main/A.java'],
+                         list_input_files(self.input_path, 'abc', use_git=False))
@@ -0,0 +1,49 @@
+import os
+import shutil
+import unittest
+
+from mecoshark.resultparser.journal import IngestJournal
+
+
+class IngestJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.journal_path = os.path.dirname(os.path.realpath(__file__)) + '/data/journal'
+        shutil.rmtree(self.journal_path, ignore_errors=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.journal_path, ignore_errors=True)
+
+    def test_resume_from_journal(self):
+        results = self.journal_path + '_results'
+        os.makedirs(results)
+        open(os.path.join(results, 'project-Class.csv'), 'w').close()
+
+        journal = IngestJournal(self.journal_path)
+        self.assertFalse(journal.has_results())
+        self.assertEqual(journal.results_path, journal.keep_results(results))
+        journal.commit_batch(1000, {'class': 1000})
+        journal.commit_batch(1500, {'class': 1200, 'method': 300})
+        journal.commit_step('states')
+        journal.close()
+
+        # The process died while writing the next entry
+        with open(journal.journal_file, 'a') as handle:
+            handle.write('{"event": "ba')
+
+        journal = IngestJournal(self.journal_path)
+        self.assertTrue(journal.has_results())
+        self.assertTrue(os.path.exists(os.path.join(journal.results_path, 'project-Class.csv')))
+        self.assertFalse(os.path.exists(results))
+        self.assertEqual(1500, journal.committed_rows)
+        self.assertTrue(journal.is_committed('states'))
+        self.assertFalse(journal.is_committed('clones'))
+
+        journal.complete()
+        self.assertFalse(os.path.exists(self.journal_path))
+
+    def test_empty_journal(self):
+        journal = IngestJournal(self.journal_path)
+
+        self.assertEqual(0, journal.committed_rows)
+        self.assertFalse(journal.is_committed('states'))
@@ -0,0 +1,32 @@
+import os
+import unittest
+
+from mecoshark.languages import detect_languages, get_extension, get_pathspecs
+
+
+class LanguagesTest(unittest.TestCase):
+
+    def test_get_extension(self):
+        self.assertEqual('java', get_extension('src/A.java'))
+        self.assertEqual('gz', get_extension('lib/a.tar.gz'))
+        self.assertIsNone(get_extension('Makefile'))
+        self.assertIsNone(get_extension('src/.gitignore'))
+
+    def test_detect_languages_like_sloccount(self):
+        # Same parts as detected by sloccount (see test_mecosharkapp)
+        input_path = os.path.dirname(os.path.realpath(__file__)) + '/data/java_project'
+        paths = [os.path.join(root, name) for root, dirs, names in os.walk(input_path) for name in names]
+
+        self.assertEqual({'ansic': 6.0/28.0, 'java': 22.0/28.0}, detect_languages(paths))
+
+    def test_detect_languages_headers(self):
+        self.assertEqual({'ansic': 1.0}, detect_languages(['a.c', 'a.h', 'README']))
+        self.assertEqual({'cpp': 0.75, 'ansic': 0.25}, detect_languages(['a.c', 'b.cpp', 'b.h', 'c.hpp']))
+        self.assertEqual({}, detect_languages(['README', 'logo.png']))
+
+    def test_get_pathspecs(self):
+        paths = ['src/A.java', 'src/b.c', 'src/b.h', 'doc/index.html', 'setup.py']
+
+        self.assertEqual([':(glob)**/*.java'], get_pathspecs(['java'], paths))
+        self.assertEqual([':(glob)**/*.c', ':(glob)**/*.h'], get_pathspecs(['ansic', 'cpp', 'cs', 'c'], paths))
+        self.assertEqual([], get_pathspecs(['ruby'], paths))
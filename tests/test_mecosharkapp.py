@@ -3,6 +3,8 @@ import logging
 import os
 import unittest
 
+import mock
+
 from mecoshark.mecosharkapp import MecoSHARK
 
 
@@ -46,4 +48,15 @@ class MecoSHARKTest(unittest.TestCase):
         expected_languages = {
             'python': 21.0/21.0
         }
-        self.assertEqual(expected_languages, languages)
\ No newline at end of file
+        self.assertEqual(expected_languages, languages)
+
+    def test_failing_revision_does_not_stop_batch(self):
+        mecosharkapp = MecoSHARK(self.input_path_java, self.out, 'project', None, None, None, self.database, self.host,
+                                 self.port, self.username, self.password, self.authentication_db, logging.DEBUG, False)
+
+        with mock.patch.object(mecosharkapp, 'open_context'), mock.patch.object(mecosharkapp, 'checkout'), \
+                mock.patch.object(mecosharkapp, 'run_processors', side_effect=[True, IndexError(), True]) as run:
+            results = mecosharkapp.process_revisions(['first', 'second', 'third'])
+
+        self.assertEqual({'first': True, 'second': False, 'third': True}, results)
+        self.assertEqual(3, run.call_count)
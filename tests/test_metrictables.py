@@ -0,0 +1,52 @@
+import os
+import shutil
+import unittest
+
+from mecoshark.resultparser.metrictables import MetricTables, is_available
+
+if is_available():
+    import pyarrow
+    import pyarrow.parquet
+
+
+@unittest.skipUnless(is_available(), 'metric tables need pyarrow')
+class MetricTablesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics_dir = os.path.dirname(os.path.realpath(__file__)) + '/data/metric_tables'
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+
+    def add_states(self, tables):
+        tables.add('method', {'s_key': 'a', 'long_name': 'A.a()', 'file_path': 'src/A.java', 'file_id': 'f1',
+                              'start_line': 1, 'end_line': 3, 'start_column': 1, 'end_column': 2},
+                   {'LOC': 3.0, 'McCC': 1.0})
+        tables.add('method', {'s_key': 'b', 'long_name': 'A.b()', 'file_path': 'src/A.java', 'file_id': 'f1',
+                              'start_line': 4, 'end_line': 9, 'start_column': 1, 'end_column': 2},
+                   {'LOC': 6.0, 'McCC': 'x'})
+        tables.add('file', {'s_key': 'c', 'long_name': 'src/A.java', 'file_path': 'src/A.java', 'file_id': 'f1'},
+                   {'LOC': 10.0})
+        tables.close()
+
+    def test_parquet_tables(self):
+        tables = MetricTables(self.metrics_dir, 'abc', batch_size=1)
+        self.add_states(tables)
+
+        table = pyarrow.parquet.read_table(os.path.join(self.metrics_dir, 'abc', 'method.parquet'))
+        self.assertEqual(['s_key', 'long_name', 'file_path', 'file_id', 'start_line', 'end_line', 'start_column',
+                          'end_column', 'LOC', 'McCC'], table.schema.names)
+        self.assertEqual([3.0, 6.0], table.column('LOC').to_pylist())
+        self.assertEqual([1.0, None], table.column('McCC').to_pylist())
+
+        table = pyarrow.parquet.read_table(os.path.join(self.metrics_dir, 'abc', 'file.parquet'))
+        self.assertEqual([None], table.column('start_line').to_pylist())
+
+    def test_arrow_tables(self):
+        tables = MetricTables(self.metrics_dir, 'abc', file_format='arrow')
+        self.add_states(tables)
+
+        with pyarrow.memory_map(os.path.join(self.metrics_dir, 'abc', 'method.arrow')) as source:
+            table = pyarrow.ipc.open_file(source).read_all()
+        self.assertEqual(['a', 'b'], table.column('s_key').to_pylist())
@@ -0,0 +1,199 @@
+import csv
+import os
+import shutil
+import subprocess
+import unittest
+
+from pathlib import Path
+
+import mock
+
+from mecoshark.modules import ModuleResultMerger, add_values, find_modules, map_changed_files
+from mecoshark.processor.javaprocessor import JavaProcessor
+from mecoshark.resultcache import ResultCache
+from mecoshark.resultparser.sourcemeterparser import SourcemeterParser
+
+
+def write_results(path, analyzed_path, module):
+    """
+    Writes the results of SourceMeter for a module with one class in the package org.test
+    """
+    os.makedirs(path)
+    component = '%s/%s/.columbus_java/%s.ljsi' % (analyzed_path, module, module)
+    java_file = '%s/%s/src/org/test/%s.java' % (analyzed_path, module, module.upper())
+    Path(path + '/%s-Component.csv' % module).write_text(
+        'ID,Name,LongName,TLOC\n'
+        'L103,%s,%s,10\n'
+        'L102,<System>,<System>,10\n' % (component, component))
+    Path(path + '/%s-Package.csv' % module).write_text(
+        'ID,Name,LongName,Parent,Component,TLOC\n'
+        'L100,<root_package>,<root_package>,__LogicalRoot__,L103,10\n'
+        'L101,org.test,org.test,L100,L103,10\n')
+    Path(path + '/%s-Class.csv' % module).write_text(
+        'ID,Name,LongName,Parent,Component,Path,Line,Column,EndLine,EndColumn,LOC\n'
+        'L104,%s,org.test.%s,L101,"L103,L102",%s,1,1,10,2,10\n' % (module.upper(), module.upper(), java_file))
+    Path(path + '/%s-File.csv' % module).write_text('ID,Name,LongName,LOC\nF0,%s.java,%s,10\n' % (module.upper(),
+                                                                                                java_file))
+    Path(path + '/%s-CloneClass.csv' % module).write_text('ID,Name,CA\nC1,C1,2\n')
+    Path(path + '/%s-CloneInstance.csv' % module).write_text(
+        'ID,Name,Parent,Component,Path,Line,Column,EndLine,EndColumn\n'
+        'C1_0,ci,C1,L103,%s,1,1,3,4\n' % java_file)
+    Path(path + '/%s-PMD.txt' % module).write_text('%s(3):\tSystemPrintln:\tSystem.out.println is used\n' % java_file)
+
+
+def read_rows(path):
+    with open(path) as csv_file:
+        return list(csv.DictReader(csv_file))
+
+
+class ModulesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.dirname(os.path.realpath(__file__)) + '/data/modules'
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_find_modules(self):
+        files = ['/pom.xml', '/README.md', '/api/pom.xml', '/api/src/A.java', '/core/build.gradle',
+                 '/core/src/B.java', '/docs/pom.xml', '/docs/index.md']
+        self.assertEqual(['api', 'core'], find_modules(files))
+
+        self.assertIsNone(find_modules(files + ['/src/C.java']))
+        self.assertIsNone(find_modules(files + ['/tools/C.java']))
+        self.assertIsNone(find_modules(['/pom.xml', '/src/A.java']))
+        self.assertEqual(['api'], find_modules(['/api/pom.xml', '/api/A.py', '/api/src/A.java', '/B.py']))
+
+    def test_map_changed_files(self):
+        self.assertEqual({'core'}, map_changed_files({'/core/src/B.java', '/pom.xml', '/docs/index.md'},
+                                                     ['api', 'core']))
+        self.assertEqual(set(), map_changed_files(set(), ['api', 'core']))
+
+    def test_add_values(self):
+        self.assertEqual('30', add_values('10', '20'))
+        self.assertEqual('1.75', add_values('1.5', '0.25'))
+        self.assertEqual('10', add_values('10', ''))
+        self.assertEqual('20', add_values('', '20'))
+
+    def test_merge(self):
+        write_results(self.path + '/api', '/dev/shm/first', 'api')
+        write_results(self.path + '/core', '/dev/shm/second', 'core')
+
+        merger = ModuleResultMerger(self.path + '/merged', 'project', '/dev/shm/input/')
+        merger.add(self.path + '/api', '/dev/shm/first')
+        merger.add(self.path + '/core', '/dev/shm/second/')
+        merger.close()
+
+        self.assertEqual(['project-Class.csv', 'project-CloneClass.csv', 'project-CloneInstance.csv',
+                          'project-Component.csv', 'project-File.csv', 'project-PMD.txt', 'project-Package.csv'],
+                         sorted(os.listdir(self.path + '/merged')))
+
+        # The <System> component and the packages are merged, the component of every module is kept
+        components = read_rows(self.path + '/merged/project-Component.csv')
+        self.assertEqual([('M0.L103', '/dev/shm/input/api/.columbus_java/api.ljsi'), ('M0.L102', '<System>'),
+                          ('M1.L103', '/dev/shm/input/core/.columbus_java/core.ljsi')],
+                         [(row['ID'], row['LongName']) for row in components])
+        packages = read_rows(self.path + '/merged/project-Package.csv')
+        self.assertEqual([('M0.L100', '__LogicalRoot__', 'M0.L103'), ('M0.L101', 'M0.L100', 'M0.L103')],
+                         [(row['ID'], row['Parent'], row['Component']) for row in packages])
+
+        # The totals of the merged rows (<System> and the packages) are summed over the modules
+        self.assertEqual(['10', '20', '10'], [row['TLOC'] for row in components])
+        self.assertEqual(['20', '20'], [row['TLOC'] for row in packages])
+
+        classes = read_rows(self.path + '/merged/project-Class.csv')
+        self.assertEqual([('M0.L104', 'M0.L101', 'M0.L103,M0.L102', '/dev/shm/input/api/src/org/test/API.java'),
+                          ('M1.L104', 'M0.L101', 'M1.L103,M0.L102', '/dev/shm/input/core/src/org/test/CORE.java')],
+                         [(row['ID'], row['Parent'], row['Component'], row['Path']) for row in classes])
+
+        clone_instances = read_rows(self.path + '/merged/project-CloneInstance.csv')
+        self.assertEqual([('M0.C1_0', 'M0.C1'), ('M1.C1_0', 'M1.C1')],
+                         [(row['ID'], row['Parent']) for row in clone_instances])
+        self.assertEqual(['M0.C1', 'M1.C1'],
+                         [row['ID'] for row in read_rows(self.path + '/merged/project-CloneClass.csv')])
+
+        pmd = Path(self.path + '/merged/project-PMD.txt').read_text().splitlines()
+        self.assertEqual(['/dev/shm/input/api/src/org/test/API.java(3):',
+                          '/dev/shm/input/core/src/org/test/CORE.java(3):'], [line.split('\t')[0] for line in pmd])
+
+        # The merged results are read like the results of one analysis
+        rows = list(SourcemeterParser.read_csv_file(self.path + '/merged/project-File.csv', 'file'))
+        self.assertEqual(['M0.F0', 'M1.F0'], [row['ID'] for row in rows])
+        self.assertEqual('/dev/shm/input/core/src/org/test/CORE.java', rows[1]['Path'])
+
+
+class IncrementalModulesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.dirname(os.path.realpath(__file__)) + '/data/incremental_modules'
+        self.repository_path = self.path + '/repository'
+        shutil.rmtree(self.path, ignore_errors=True)
+
+        os.makedirs(self.repository_path + '/api/src')
+        os.makedirs(self.repository_path + '/core/src')
+        self.git('init', '-q')
+        Path(self.repository_path + '/pom.xml').write_text('<project/>')
+        Path(self.repository_path + '/api/pom.xml').write_text('<project/>')
+        Path(self.repository_path + '/api/src/A.java').write_text('class A {}')
+        Path(self.repository_path + '/core/pom.xml').write_text('<project/>')
+        Path(self.repository_path + '/core/src/B.java').write_text('class B {}')
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'first')
+        self.first = self.head()
+        Path(self.repository_path + '/core/src/B.java').write_text('class B { int b; }')
+        self.git('commit', '-q', '-a', '-m', 'second')
+        self.second = self.head()
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def git(self, *args):
+        subprocess.check_output(['git', '-C', self.repository_path, '-c', 'user.name=test', '-c',
+                                 'user.email=test@test.de'] + list(args), stderr=subprocess.DEVNULL)
+
+    def head(self):
+        return subprocess.check_output(['git', '-C', self.repository_path, 'rev-parse', 'HEAD']).decode('ascii').strip()
+
+    def execute_module(self, module, template):
+        results_path = self.path + '/analysis/%s-%d' % (module, len(os.listdir(self.path + '/analysis')))
+        write_results(results_path, self.repository_path, module)
+        return results_path
+
+    @mock.patch('mecoshark.processor.javaprocessor.SourcemeterParser')
+    def test_only_changed_modules_are_analyzed(self, parser):
+        os.makedirs(self.path + '/analysis')
+        merged_classes = []
+
+        def read_merged_classes(output_path, *args, **kwargs):
+            merged_classes.append([row['ID'] for row in read_rows(output_path + '/repository-Class.csv')])
+            return mock.DEFAULT
+        parser.side_effect = read_merged_classes
+        result_cache = ResultCache(self.path + '/cache')
+        processor = JavaProcessor(self.path + '/out', self.repository_path,
+                                  {'result_cache': result_cache, 'incremental_modules': True})
+        self.assertEqual(['api', 'core'], processor.find_modules(self.first))
+
+        with mock.patch.object(processor, 'execute_module', side_effect=self.execute_module) as execute_module, \
+                mock.patch.object(result_cache, 'lookup', wraps=result_cache.lookup) as lookup:
+            # The changed files of the first revision can not be listed, both modules are looked up
+            processor.process('project', self.first, 'url', None, 'DEBUG')
+            self.assertEqual(['api', 'core'], [args[0] for args, kwargs in execute_module.call_args_list])
+            self.assertEqual(2, lookup.call_count)
+
+            # api did not change, its results are taken from the cache. core changed and is analyzed without lookup
+            execute_module.reset_mock()
+            lookup.reset_mock()
+            processor.process('project', self.second, 'url', None, 'DEBUG')
+            self.assertEqual(['core'], [args[0] for args, kwargs in execute_module.call_args_list])
+            self.assertEqual(1, lookup.call_count)
+
+        args, kwargs = parser.call_args
+        self.assertEqual(self.repository_path, kwargs['analyzed_path'])
+        self.assertNotIn('incremental_modules', kwargs)
+        self.assertEqual([['M0.L104', 'M1.L104'], ['M0.L104', 'M1.L104']], merged_classes)
+        self.assertFalse(os.path.exists(self.path + '/out/repository'))
+
+if __name__ == '__main__':
+    unittest.main()
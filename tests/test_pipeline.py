@@ -0,0 +1,30 @@
+import unittest
+
+from mecoshark.resultparser.pipeline import BatchPipeline
+
+
+class BatchPipelineTest(unittest.TestCase):
+
+    def test_batches(self):
+        pipeline = BatchPipeline(range(7), 3, 1, convert=lambda row: row * 2)
+
+        self.assertEqual([[0, 2, 4], [6, 8, 10], [12]], list(pipeline))
+        self.assertEqual(3, pipeline.produced_batches)
+
+    def test_error_of_producer_is_raised(self):
+        def rows():
+            yield 1
+            raise ValueError('broken csv file')
+
+        with self.assertRaises(ValueError):
+            list(BatchPipeline(rows(), 1, 1))
+
+    def test_stop_producer(self):
+        pipeline = BatchPipeline(range(1000), 1, 2)
+
+        for batch in pipeline:
+            break
+        pipeline.stop()
+
+        self.assertFalse(pipeline.thread.is_alive())
+        self.assertLess(pipeline.produced_batches, 1000)
@@ -0,0 +1,55 @@
+import copy
+import csv
+import os
+import pickle
+import unittest
+
+from mecoshark.resultparser.projection import ColumnProjection, ParsedRow, read_projected_rows
+from mecoshark.resultparser.sourcemeterparser import SourcemeterParser, parse_csv_file
+
+
+class ProjectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.class_csv = os.path.dirname(os.path.realpath(__file__)) + '/data/csv_data/zookeeper-Class.csv'
+
+    def test_projection_of_header(self):
+        projection = ColumnProjection(['ID', 'Name', 'LongName', 'Parent', 'Line', 'LOC', 'WarningInfo', 'McCC'])
+
+        self.assertEqual(['ID', 'Name', 'LongName', 'Parent', 'Line'], projection.structural_names)
+        self.assertEqual(['LOC', 'McCC'], projection.metric_names)
+
+    def test_metrics(self):
+        projection = ColumnProjection(['ID', 'LOC', 'Odd', 'McCC'])
+
+        self.assertEqual({'LOC': 3.0, 'Odd': 0.0, 'McCC': 0.5}, projection.create_row(['L1', '3', '', '0.5']).metrics())
+        self.assertEqual({'LOC': 3.0, 'Odd': 'x', 'McCC': 0.0}, projection.create_row(['L1', '3', 'x']).metrics())
+
+    def test_read_projected_rows_equals_sanitized_rows(self):
+        with open(self.class_csv) as csvfile:
+            expected_rows = list(csv.DictReader(csvfile))
+
+        rows = list(read_projected_rows(self.class_csv))
+
+        self.assertEqual(expected_rows, rows)
+        for expected_row, row in zip(expected_rows, rows):
+            self.assertEqual(SourcemeterParser.sanitize_metrics_dictionary(copy.deepcopy(expected_row)),
+                             row.metrics())
+
+    def test_parsed_row_is_pickled_with_metrics(self):
+        row = ColumnProjection(['ID', 'LOC']).create_row(['L1', '3'])
+        parsed_row = pickle.loads(pickle.dumps(ParsedRow.from_row(row)))
+
+        self.assertEqual({'ID': 'L1'}, parsed_row)
+        self.assertEqual({'LOC': 3.0}, parsed_row.metrics())
+
+    def test_parse_csv_file(self):
+        rows = list(SourcemeterParser.read_csv_file(self.class_csv, 'class'))
+        parsed_rows = parse_csv_file(self.class_csv, 'class')
+
+        self.assertEqual(len(rows), len(parsed_rows))
+        for row, parsed_row in zip(rows, parsed_rows):
+            self.assertEqual(row['ID'], parsed_row['ID'])
+            self.assertEqual(row['Parent'], parsed_row['Parent'])
+            self.assertEqual('class', parsed_row['type'])
+        self.assertEqual([row.metrics() for row in rows], [row.metrics() for row in parsed_rows])
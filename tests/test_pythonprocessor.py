@@ -5,6 +5,7 @@ from pathlib import Path
 
 import mock
 
+from mecoshark.processor.javaprocessor import JavaProcessor
 from mecoshark.processor.pythonprocessor import PythonProcessor
 
 
@@ -50,6 +51,26 @@ class PythonProcessorTest(unittest.TestCase):
 
         self.assertFalse(python_processor.is_output_produced())
 
+    @mock.patch('mecoshark.processor.pythonprocessor.SourcemeterParser')
+    def test_process_keeps_other_files_in_output(self, parser):
+        python_processor = PythonProcessor(self.out, self.input_path_python)
+        os.makedirs(self.out + '/checkouts/checkout-0')
+
+        with mock.patch.object(python_processor, 'execute_sourcemeter'):
+            python_processor.process('project', 'abc', 'url', None, 'DEBUG')
+
+        self.assertTrue(parser.return_value.store_data.called)
+        self.assertTrue(os.path.isdir(self.out + '/checkouts/checkout-0'))
+        self.assertFalse(os.path.exists(self.out + '/' + self.projectname))
+
+    def test_journals_of_processors_are_separate(self):
+        python_journal = PythonProcessor(self.out, self.input_path_python, {'journal': True}).open_journal('abc')
+        java_journal = JavaProcessor(self.out, self.input_path_python, {'journal': True}).open_journal('abc')
+
+        self.assertEqual(os.path.join(self.out, 'journal', 'python', 'abc'), python_journal.path)
+        self.assertEqual(os.path.join(self.out, 'journal', 'java', 'abc'), java_journal.path)
+        self.assertIsNone(PythonProcessor(self.out, self.input_path_python).open_journal('abc'))
+
     @mock.patch('subprocess.run')
     def test_language_detection_python(self, mock_subprocess):
         python_processor = PythonProcessor(self.out, self.input_path_python)
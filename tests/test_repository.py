@@ -0,0 +1,56 @@
+import configparser
+import os
+import unittest
+
+from mongoengine import connect, DoesNotExist
+
+from mecoshark.resultparser.repository import RepositoryContext
+from pycoshark.mongomodels import VCSSystem, Commit, Project, File
+
+
+class RepositoryContextTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Create testconfig
+        config = configparser.ConfigParser()
+        config.read(os.path.dirname(os.path.realpath(__file__)) + "/data/used_test_config.cfg")
+
+        # Setting up database with data that is normally put into it via vcs program
+        connect(config['Database']['db_database'], username=config['Database']['db_user'],
+                password=config['Database']['db_password'], host=config['Database']['db_hostname'],
+                port=int(config['Database']['db_port']), authentication_source=config['Database']['db_authentication'],
+                connect=False)
+
+    def setUp(self):
+        Project.drop_collection()
+        VCSSystem.drop_collection()
+        Commit.drop_collection()
+        File.drop_collection()
+
+        self.project_id = Project(name="zookeeper").save().id
+        self.vcs_id = VCSSystem(url="http://test.de", project_id=self.project_id, repository_type="test").save().id
+        self.commit1 = Commit(revision_hash="2342", vcs_system_id=self.vcs_id).save()
+        self.commit2 = Commit(revision_hash="2343", vcs_system_id=self.vcs_id).save()
+        self.file1 = File(path="src/A.java", vcs_system_id=self.vcs_id).save()
+        self.file2 = File(path="src/B.java", vcs_system_id=self.vcs_id).save()
+
+    def test_resolve_commits(self):
+        context = RepositoryContext("zookeeper", "http://test.de")
+        context.resolve_commits(["2342", "2343", "9999"])
+
+        self.assertEqual(self.vcs_id, context.vcs_system_id)
+        self.assertEqual({"2342": self.commit1.id, "2343": self.commit2.id}, context.commit_ids)
+        self.assertEqual(self.commit2.id, context.get_commit_id("2343"))
+        with self.assertRaises(DoesNotExist):
+            context.get_commit_id("9999")
+
+    def test_get_stored_files_incrementally(self):
+        context = RepositoryContext("zookeeper", "http://test.de")
+
+        self.assertEqual({"src/A.java": self.file1.id}, context.get_stored_files(["src/A.java", "README"]))
+
+        # Only the new path is looked up, known paths are not queried again
+        File.objects(id=self.file1.id).delete()
+        self.assertEqual({"src/A.java": self.file1.id, "src/B.java": self.file2.id},
+                         context.get_stored_files(["src/A.java", "src/B.java"]))
+        self.assertEqual({"src/A.java", "src/B.java", "README"}, context.looked_up_paths)
@@ -0,0 +1,96 @@
+import os
+import shutil
+import subprocess
+import unittest
+
+from pathlib import Path
+
+import mock
+
+from mecoshark.processor.javaprocessor import JavaProcessor
+from mecoshark.resultcache import ResultCache, get_tree_id
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.dirname(os.path.realpath(__file__)) + '/data/result_cache'
+        self.repository_path = self.path + '/repository'
+        self.cache_path = self.path + '/cache'
+        shutil.rmtree(self.path, ignore_errors=True)
+
+        os.makedirs(self.repository_path)
+        self.git('init', '-q')
+        Path(self.repository_path + '/A.java').write_text('class A {}')
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'first')
+        self.first = self.head()
+        Path(self.repository_path + '/A.java').write_text('class A { int a; }')
+        self.git('commit', '-q', '-a', '-m', 'second')
+        self.second = self.head()
+        self.git('revert', '--no-edit', 'HEAD')
+        self.revert = self.head()
+
+        self.template = self.path + '/analyze.sh'
+        self.analyzer = self.path + '/analyzer'
+        Path(self.template).write_text('$analyzer -maximumThreads=$threads')
+        Path(self.analyzer).write_text('')
+
+        self.results = self.path + '/results'
+        os.makedirs(self.results)
+        Path(self.results + '/test-Class.csv').write_text('ID')
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def git(self, *args):
+        subprocess.check_output(['git', '-C', self.repository_path, '-c', 'user.name=test', '-c',
+                                 'user.email=test@test.de'] + list(args), stderr=subprocess.DEVNULL)
+
+    def head(self):
+        return subprocess.check_output(['git', '-C', self.repository_path, 'rev-parse', 'HEAD']).decode('ascii').strip()
+
+    def test_get_key(self):
+        cache = ResultCache(self.cache_path)
+        key = cache.get_key(self.repository_path, self.first, self.analyzer, [self.template])
+
+        self.assertEqual(get_tree_id(self.repository_path, self.first), get_tree_id(self.repository_path, self.revert))
+        self.assertEqual(key, cache.get_key(self.repository_path, self.revert, self.analyzer, [self.template]))
+        self.assertNotEqual(key, cache.get_key(self.repository_path, self.second, self.analyzer, [self.template]))
+
+        Path(self.template).write_text('$analyzer -maximumThreads=$threads -runPMD=false')
+        self.assertNotEqual(key, cache.get_key(self.repository_path, self.first, self.analyzer, [self.template]))
+
+        self.assertIsNone(cache.get_key(self.repository_path, 'abc', self.analyzer, [self.template]))
+        self.assertIsNone(cache.get_key(self.cache_path, self.first, self.analyzer, [self.template]))
+
+    def test_store_and_lookup(self):
+        cache = ResultCache(self.cache_path)
+        key = cache.get_key(self.repository_path, self.first, self.analyzer, [self.template])
+        self.assertIsNone(cache.lookup(key))
+
+        cache.store(key, self.results, '/dev/shm/first', self.first)
+        results_path, analyzed_path = cache.lookup(key)
+
+        self.assertEqual('/dev/shm/first', analyzed_path)
+        self.assertEqual(['test-Class.csv'], os.listdir(results_path))
+        self.assertTrue(os.path.exists(self.results + '/test-Class.csv'))
+        self.assertEqual([key[:2]], os.listdir(self.cache_path))
+
+    @mock.patch('mecoshark.processor.javaprocessor.SourcemeterParser')
+    def test_processor_uses_cached_results(self, parser):
+        cache = ResultCache(self.cache_path)
+        processor = JavaProcessor(self.path + '/out', self.repository_path, {'result_cache': cache})
+        key, cached_results = processor.find_cached_results(self.first, self.analyzer, [self.template])
+        self.assertIsNone(cached_results)
+        cache.store(key, self.results, '/dev/shm/first', self.first)
+
+        with mock.patch.object(processor, 'find_cached_results', return_value=(key, cache.lookup(key))), \
+                mock.patch.object(processor, 'execute_sourcemeter') as execute_sourcemeter:
+            processor.process('project', self.revert, 'url', None, 'DEBUG')
+
+        execute_sourcemeter.assert_not_called()
+        args, kwargs = parser.call_args
+        self.assertEqual(cache.lookup(key)[0], args[0])
+        self.assertEqual(self.revert, args[4])
+        self.assertEqual('/dev/shm/first', kwargs['analyzed_path'])
@@ -0,0 +1,119 @@
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import unittest
+
+import mock
+
+from mecoshark.processor.javaprocessor import JavaProcessor
+from mecoshark.scheduler import ResourceLimit, RevisionScheduler
+
+
+class FakeMecoSHARK(object):
+    """
+    Replaces :class:`~mecoshark.mecosharkapp.MecoSHARK` in the workers: the revision "failed" raises an error and the
+    others take the longer the earlier they come, so that they finish out of order
+    """
+    def __init__(self, input_path, output, checkouts, parser_options, **kwargs):
+        self.parser_options = parser_options
+
+    def open_context(self):
+        pass
+
+    def run_revision(self, revision):
+        if revision == 'failed':
+            raise ValueError()
+        time.sleep(0.05 * (3 - int(revision)))
+        with self.parser_options['limits']['analyzer']:
+            pass
+        return self.parser_options['parse_workers'] == 0
+
+
+class ResourceLimitTest(unittest.TestCase):
+
+    def test_limit_concurrent_use(self):
+        limit = ResourceLimit('analyzer', multiprocessing.BoundedSemaphore(2))
+        active = []
+        maximum = []
+        lock = threading.Lock()
+
+        def use():
+            with limit:
+                with lock:
+                    active.append(1)
+                    maximum.append(len(active))
+                time.sleep(0.05)
+                with lock:
+                    active.pop()
+
+        threads = [threading.Thread(target=use) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(2, max(maximum))
+        self.assertGreater(limit.wait_time, 0)
+        self.assertGreater(limit.busy_time, 0)
+
+        limit.reset()
+        self.assertEqual(0.0, limit.wait_time)
+        self.assertEqual(0.0, limit.busy_time)
+
+    def test_release_on_exception(self):
+        semaphore = multiprocessing.BoundedSemaphore(1)
+        limit = ResourceLimit('writer', semaphore)
+
+        with self.assertRaises(ValueError):
+            with limit:
+                raise ValueError()
+
+        self.assertTrue(semaphore.acquire(block=False))
+
+    def test_processor_limits(self):
+        limit = ResourceLimit('writer', multiprocessing.BoundedSemaphore(1))
+        processor = JavaProcessor('/tmp', '/tmp', {'limits': {'writer': limit}, 'batch_size': 10})
+
+        self.assertEqual({'batch_size': 10}, processor.parser_options)
+        with processor.limited('writer'):
+            self.assertFalse(limit.semaphore.acquire(block=False))
+        with processor.limited('analyzer'):
+            pass
+        self.assertGreater(limit.busy_time, 0)
+
+
+class RevisionSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.dirname(os.path.realpath(__file__)) + '/data/scheduler'
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    @mock.patch('mecoshark.scheduler.MecoSHARK', FakeMecoSHARK)
+    def test_run(self):
+        status_file = self.path + '-status.jsonl'
+        scheduler = RevisionScheduler(self.path, self.path + '/work', {'parser_options': {'parse_workers': 4}}, 3,
+                                      max_analyzers=1, status_file=status_file, checkout_mode='archive')
+
+        try:
+            results = scheduler.run(['0', 'failed', '1', '2'])
+
+            # The results are in the order of the revisions, the parse workers are disabled in the workers
+            self.assertEqual([('0', 'processed'), ('failed', 'failed'), ('1', 'processed'), ('2', 'processed')],
+                             [(result['revision'], result['status']) for result in results])
+            self.assertTrue(all(result['worker'].startswith('worker-') for result in results))
+            self.assertTrue(all('analyzer_wait' in result and 'writer_time' in result for result in results))
+
+            # The status file has a line for every revision in the order in which they finished
+            with open(status_file) as status:
+                lines = [json.loads(line) for line in status]
+            self.assertEqual({'0', 'failed', '1', '2'}, {line['revision'] for line in lines})
+            self.assertEqual(4, len(lines))
+            self.assertEqual([], [name for name in os.listdir(self.path + '/work') if name.startswith('worker-')])
+        finally:
+            os.remove(status_file)
@@ -2,15 +2,19 @@ import configparser
 import csv
 import os
 import shutil
+import threading
 import unittest
 
+import mock
 from bson import ObjectId
 from pathlib import Path
 
 from mongoengine import connect
 
+from mecoshark.resultparser.delta import DeltaBaseline
 from mecoshark.resultparser.sourcemeterparser import SourcemeterParser
-from pycoshark.mongomodels import VCSSystem, Commit, Project, File
+from pycoshark.mongomodels import VCSSystem, Commit, Project, File, CodeEntityState, CodeGroupState, CloneInstance
+from pycoshark.utils import get_code_entity_state_identifier
 
 
 class SourceMeterParserTest(unittest.TestCase):
@@ -164,6 +168,48 @@ class SourceMeterParserTest(unittest.TestCase):
         # Must not timeout
         parser.sort_for_parent(all_files)
 
+    def test_sort_for_parent_order(self):
+        rows = [
+            {'ID': '106', 'Parent': '107', 'type': 'class'},
+            {'ID': '105', 'Parent': '104', 'type': 'class'},
+            {'ID': '107', 'Parent': '104', 'type': 'package'},
+            {'ID': '104', 'Parent': '103', 'type': 'package'},
+            {'ID': '103', 'Parent': '__LogicalRoot__', 'type': 'package'},
+            {'ID': '102', 'type': 'component'},
+        ]
+
+        ordered_ids = [row['ID'] for row in SourcemeterParser.sort_for_parent(rows)]
+        self.assertEqual(['103', '102', '104', '105', '107', '106'], ordered_ids)
+
+    def test_sort_for_parent_missing_parent(self):
+        rows = [
+            {'ID': '105', 'Parent': '999', 'type': 'class'},
+            {'ID': '106', 'Parent': '105', 'type': 'method'},
+            {'ID': '103', 'Parent': '__LogicalRoot__', 'type': 'package'},
+            {'ID': '108', 'Parent': '109', 'type': 'class'},
+            {'ID': '109', 'Parent': '108', 'type': 'class'},
+        ]
+
+        # Must not timeout, rows that can not be ordered are put at the end
+        ordered_ids = [row['ID'] for row in SourcemeterParser.sort_for_parent(rows)]
+        self.assertEqual('103', ordered_ids[0])
+        self.assertCountEqual(['103', '105', '106', '108', '109'], ordered_ids)
+
+    def test_group_by_depth(self):
+        rows = [
+            {'ID': '105', 'Parent': '104', 'type': 'class'},
+            {'ID': '104', 'Parent': '103', 'type': 'package'},
+            {'ID': '103', 'Parent': '__LogicalRoot__', 'type': 'package'},
+            {'ID': '110', 'type': 'file', 'Parent': '103'},
+            {'ID': '111', 'Parent': '110', 'type': 'function'},
+            {'ID': '108', 'Parent': '999', 'type': 'class'},
+        ]
+
+        levels, unresolved = SourcemeterParser.group_by_depth(rows)
+        self.assertEqual([['103', '110'], ['104', '111'], ['105']],
+                         [[row['ID'] for row in level] for level in levels])
+        self.assertEqual(['108'], [row['ID'] for row in unresolved])
+
     def test_sanitize_long_name_file(self):
         parser = SourcemeterParser(self.out_java, self.input_path_java, "http://test.de", "2342", 'DEBUG')
         self.assertEqual('contribs/CekiGulcu/AppenderTable.java',
@@ -186,6 +232,199 @@ class SourceMeterParserTest(unittest.TestCase):
         self.assertEqual('org.apache.log4j.TempFileAppender',
                          parser.sanitize_long_name('org.apache.log4j.TempFileAppender'))
 
+    def test_stream_states(self):
+        parser = SourcemeterParser(self.out_java, self.input_path_java, "zookeeper", "http://test.de", "2342", 'DEBUG')
+        streamed_ids = [row['ID'] for row in parser.stream_states()]
+
+        self.assertEqual(['L103', 'L102', 'L100', 'L104', 'L649', 'L650', 'L651', 'L124', 'L6588', 'L5123'],
+                         streamed_ids)
+
+    def test_stream_states_waits_for_parent(self):
+        with open(os.path.join(self.out_java, 'zookeeper-Method.csv'), 'w') as method_file:
+            method_file.write('ID,Name,LongName,Parent,Path\n')
+            method_file.write('L900,m,m(),L124,/AppenderTable.java\n')
+        with open(os.path.join(self.out_java, 'zookeeper-Enum.csv'), 'w') as enum_file:
+            enum_file.write('ID,Name,LongName,Parent,Path\n')
+            enum_file.write('L901,E,m().E,L900,/AppenderTable.java\n')
+            enum_file.write('L902,F,F,L999,/AppenderTable.java\n')
+
+        parser = SourcemeterParser(self.out_java, self.input_path_java, "zookeeper", "http://test.de", "2342", 'DEBUG')
+        streamed_ids = [row['ID'] for row in parser.stream_states()]
+
+        self.assertLess(streamed_ids.index('L124'), streamed_ids.index('L900'))
+        self.assertLess(streamed_ids.index('L900'), streamed_ids.index('L901'))
+        self.assertEqual('L902', streamed_ids[-1])
+
+    def test_build_input_file_index(self):
+        input_files = ['/src/a/Foo.java', '/test/a/Foo.java', '/src/MyBar.java']
+        index = SourcemeterParser.build_input_file_index(input_files)
+
+        self.assertEqual([(0, '/src/a/Foo.java'), (1, '/test/a/Foo.java')], index['Foo.java'])
+        self.assertEqual([(2, '/src/MyBar.java')], index['MyBar.java'])
+        self.assertNotIn('Bar.java', index)
+
+    def test_get_fullpath(self):
+        parser = SourcemeterParser(self.out_java, self.input_path_java, "zookeeper", "http://test.de", "2342", 'DEBUG')
+        parser.input_files = ['/src/MyFoo.java', '/src/a/Foo.java', '/test/a/Foo.java', '/lib/xa/Foo.java']
+        parser.input_file_index = SourcemeterParser.build_input_file_index(parser.input_files)
+        parser.fullpath_cache = {}
+
+        # The first input file that ends with the long name, like a scan with endswith
+        self.assertEqual('/src/MyFoo.java', parser.get_fullpath('Foo.java'))
+        self.assertEqual('/src/MyFoo.java', parser.get_fullpath('oo.java'))
+        self.assertEqual('/src/a/Foo.java', parser.get_fullpath('a/Foo.java'))
+        self.assertEqual('/src/a/Foo.java', parser.get_fullpath('/Foo.java'))
+        self.assertEqual('/test/a/Foo.java', parser.get_fullpath('test/a/Foo.java'))
+        self.assertEqual('/lib/xa/Foo.java', parser.get_fullpath('xa/Foo.java'))
+        self.assertEqual('x/Foo.java', parser.get_fullpath('x/Foo.java'))
+        self.assertEqual('Bar.java', parser.get_fullpath('Bar.java'))
+
+    def test_find_stored_files_projected(self):
+        removed_file = File(path="src/main/java/Removed.java", vcs_system_id=self.vcs_id).save()
+        expected_files = {self.file1.path: self.file1.id, self.file2.path: self.file2.id,
+                          self.file3.path: self.file3.id}
+
+        parser = SourcemeterParser(self.out_java, self.input_path_java, "zookeeper", "http://test.de", "2342", 'DEBUG')
+        self.assertEqual(dict(expected_files, **{removed_file.path: removed_file.id}), parser.stored_files)
+
+        parser = SourcemeterParser(self.out_java, self.input_path_java, "zookeeper", "http://test.de", "2342", 'DEBUG',
+                                   restrict_file_lookup=True, file_batch_size=1)
+        self.assertEqual(expected_files, parser.stored_files)
+
+    def test_store_data(self):
+        # The csv files have the paths of the project that was analyzed for them
+        analyzed_path = '/home/fabian/Arbeit/SourceMeter-8.0.0-x64-linux/Java/Demo/apache-log4j-1.2.17'
+        for name in ('Class', 'Package', 'Component'):
+            csv_path = os.path.join(self.out_java, 'zookeeper-%s.csv' % name)
+            Path(csv_path).write_text(Path(csv_path).read_text().replace(analyzed_path, self.input_path_java))
+
+        # A method of AppenderTable, so that a code entity state has another one as parent
+        with open(os.path.join(self.out_java, 'zookeeper-Method.csv'), 'w') as method_file:
+            method_file.write('ID,Name,LongName,Parent,Component,Path,Line,Column,EndLine,EndColumn\n')
+            method_file.write('L900,m,AppenderTable.m(),L124,L103,%s/%s,70,3,80,4\n' %
+                              (self.input_path_java, self.file1.path))
+        with open(os.path.join(self.out_java, 'zookeeper-CloneClass.csv'), 'w') as clone_class_file:
+            clone_class_file.write('ID,Name\n')
+        with open(os.path.join(self.out_java, 'zookeeper-CloneInstance.csv'), 'w') as clone_instance_file:
+            clone_instance_file.write('ID,Name,Parent,Component,Path,Line,Column,EndLine,EndColumn\n')
+
+        for resolve_ids in (True, False):
+            CodeEntityState.drop_collection()
+            CodeGroupState.drop_collection()
+            CloneInstance.drop_collection()
+
+            parser = SourcemeterParser(self.out_java, self.input_path_java, "zookeeper", "http://test.de", "2342",
+                                       'DEBUG', resolve_ids=resolve_ids, batch_size=2)
+            parser.store_data()
+
+            group_states = {state.long_name: state for state in CodeGroupState.objects}
+            entity_states = {state.long_name: state for state in CodeEntityState.objects}
+            self.assertEqual(7, CodeGroupState.objects.count())
+            self.assertEqual(4, CodeEntityState.objects.count())
+            self.assertEqual(7, len({state.s_key for state in CodeGroupState.objects}))
+            self.assertEqual(4, len({state.s_key for state in CodeEntityState.objects}))
+
+            component_id = group_states['.columbus_java/log4j.ljsi'].id
+            self.assertEqual([component_id], group_states['<root_package>'].cg_parent_ids)
+            self.assertEqual([group_states['org'].id, component_id], group_states['org.apache'].cg_parent_ids)
+
+            appender_table = entity_states['AppenderTable']
+            self.assertEqual([group_states['unnamed package'].id, component_id], appender_table.cg_ids)
+            self.assertIsNone(appender_table.ce_parent_id)
+            self.assertEqual(self.file1.id, appender_table.file_id)
+            self.assertEqual(get_code_entity_state_identifier('AppenderTable', self.commit_id.id, self.file1.id),
+                             appender_table.s_key)
+            self.assertEqual([group_states['org.apache.log4j'].id, component_id],
+                             entity_states['org.apache.log4j.AsyncAppender'].cg_ids)
+
+            method = entity_states['AppenderTable.m()']
+            self.assertEqual(appender_table.id, method.ce_parent_id)
+            self.assertEqual([component_id], method.cg_ids)
+
+    def test_carried_rows_are_added_to_metric_tables_by_writer(self):
+        analyzed_path = '/home/fabian/Arbeit/SourceMeter-8.0.0-x64-linux/Java/Demo/apache-log4j-1.2.17'
+        csv_path = os.path.join(self.out_java, 'zookeeper-Class.csv')
+        Path(csv_path).write_text(Path(csv_path).read_text().replace(analyzed_path, self.input_path_java))
+
+        parser = SourcemeterParser(self.out_java, self.input_path_java, "zookeeper", "http://test.de", "2342",
+                                   'DEBUG', batch_size=1, pipeline_depth=1)
+        parser.carried_paths = {self.file1.path}
+        parser.metric_tables = mock.Mock()
+        stored_rows = []
+        carried_rows = []
+
+        def add_to_metric_tables(row, metrics_dict):
+            carried_rows.append((row['ID'], threading.current_thread()))
+
+        with mock.patch.object(parser, 'store_states', side_effect=stored_rows.extend), \
+                mock.patch.object(parser, 'add_to_metric_tables', side_effect=add_to_metric_tables):
+            parser.store_pipelined()
+
+        # The rows of the carried file are not stored, but added to the metric tables by the writer (main thread)
+        self.assertEqual([('L124', threading.main_thread())], carried_rows)
+        self.assertNotIn('L124', [row['ID'] for row in stored_rows])
+        self.assertIn('L5123', [row['ID'] for row in stored_rows])
+
+    def test_parse_pmd_file(self):
+        CodeEntityState.drop_collection()
+        s_key = get_code_entity_state_identifier(self.file1.path, self.commit_id.id, self.file1.id)
+        state = CodeEntityState(s_key=s_key, long_name=self.file1.path, commit_id=self.commit_id.id,
+                                file_id=self.file1.id, linter=[{'ln': 1, 'l_ty': 'Old', 'msg': 'old'}]).save()
+
+        pmd_path = os.path.join(self.out_java, 'zookeeper-PMD.txt')
+        with open(pmd_path, 'w') as pmd_file:
+            pmd_file.write('%s/%s(12):\tUnusedPrivateField:\tAvoid unused private fields\n\n' %
+                           (self.input_path_java, self.file1.path))
+            pmd_file.write('%s/%s(15):\tEmptyCatchBlock:\tAvoid empty catch blocks\n' %
+                           (self.input_path_java, self.file1.path))
+            pmd_file.write('%s/%s(3):\tSystemPrintln:\tSystem.out.println is used\n' %
+                           (self.input_path_java, self.file2.path))
+
+        parser = SourcemeterParser(self.out_java, self.input_path_java, "zookeeper", "http://test.de", "2342", 'DEBUG')
+        parser.parse_pmd_file(pmd_path)
+
+        self.assertEqual([{'ln': 12, 'l_ty': 'UnusedPrivateField', 'msg': 'Avoid unused private fields'},
+                          {'ln': 15, 'l_ty': 'EmptyCatchBlock', 'msg': 'Avoid empty catch blocks'}],
+                         CodeEntityState.objects.get(id=state.id).linter)
+        self.assertEqual(1, CodeEntityState.objects.count())
+
+    def test_parse_pmd_file_skips_inherited_states(self):
+        CodeEntityState.drop_collection()
+        parent_commit = Commit(revision_hash="2341", vcs_system_id=self.vcs_id).save()
+        s_key = get_code_entity_state_identifier(self.file1.path, parent_commit.id, self.file1.id)
+        linter = [{'ln': 12, 'l_ty': 'UnusedPrivateField', 'msg': 'Avoid unused private fields'}]
+        state = CodeEntityState(s_key=s_key, long_name=self.file1.path, commit_id=parent_commit.id,
+                                file_id=self.file1.id, linter=linter).save()
+
+        pmd_path = os.path.join(self.out_java, 'zookeeper-PMD.txt')
+        with open(pmd_path, 'w') as pmd_file:
+            pmd_file.write('%s/%s(12):\tUnusedPrivateField:\tAvoid unused private fields\n' %
+                           (self.input_path_java, self.file1.path))
+
+        parser = SourcemeterParser(self.out_java, self.input_path_java, "zookeeper", "http://test.de", "2342", 'DEBUG')
+        parser.delta_baseline = DeltaBaseline([parent_commit.id])
+        parser.delta_baseline.entity_states = {(self.file1.path, self.file1.id): {
+            '_id': state.id, 'long_name': self.file1.path, 'file_id': self.file1.id, 'ce_type': 'file', 'metrics': {},
+            'start_line': None, 'end_line': None, 'start_column': None, 'end_column': None, 'linter': linter}}
+        parser.delta_file_warnings = parser.read_pmd_file(pmd_path)
+
+        # The file state is inherited, as its warnings did not change, and the state of the parent is not updated
+        fields = {'long_name': self.file1.path, 'file_id': self.file1.id, 'ce_type': 'file', 'metrics': {},
+                  'start_line': None, 'end_line': None, 'start_column': None, 'end_column': None,
+                  'linter': parser.delta_file_warnings[self.file1.path]}
+        self.assertEqual(state.id, parser.delta_baseline.match_entity_state('F0', fields, None, []))
+        parser.stored_file_states['F0'] = state.id
+        parser.file_state_keys[get_code_entity_state_identifier(self.file1.path, parser.commit_id,
+                                                                self.file1.id)] = 'F0'
+
+        with mock.patch.object(CodeEntityState._get_collection().__class__, 'bulk_write') as bulk_write:
+            parser.parse_pmd_file(pmd_path)
+        bulk_write.assert_not_called()
+        self.assertEqual(linter, CodeEntityState.objects.get(id=state.id).linter)
+
+        # A file state whose warnings changed is written for the commit
+        self.assertIsNone(parser.delta_baseline.match_entity_state('F0', dict(fields, linter=[]), None, []))
+
     def test_sanitize_metrics_dictionary_components(self):
         parser = SourcemeterParser(self.out_java, self.input_path_java, "http://test.de", "2342", 'DEBUG')
         expected_output_component_1 = {'TNA': 1517.0, 'TNFI': 363.0, 'TLOC': 70281.0, 'CEG': 0.0, 'TNDI': 99.0,